@@ -0,0 +1,15 @@
+"""Benchmark suite for the catalog, vendors and booking views.
+
+``python -m benchmarks`` creates a throwaway test database, seeds it with a
+synthetic dataset (see ``benchmarks.dataset``), requests every page and JSON
+API through the Django test client and records the SQL query count, wall
+time and peak memory of each one. It exits with status 1 when a view goes
+over its query budget (``benchmarks.scenarios``) or regresses beyond the
+threshold against ``benchmarks/baseline.json``.
+
+Timings depend on the machine: refresh the baseline with
+``--update-baseline`` when moving the suite to other hardware.
+
+``python -m benchmarks.templates`` compares the template time per request of
+the template profiles (see ``foodsave.bundle``).
+"""
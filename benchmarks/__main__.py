@@ -0,0 +1,79 @@
+"""Command line entry point: ``python -m benchmarks --help``"""
+import argparse
+import os
+import sys
+from pathlib import Path
+
+DEFAULT_BASELINE = Path(__file__).with_name('baseline.json')
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks', description=__doc__)
+    parser.add_argument('--vendors', type=int, default=10)
+    parser.add_argument('--branches', type=int, default=3, help='Branches per vendor')
+    parser.add_argument('--items', type=int, default=20, help='Items per branch')
+    parser.add_argument('--offers', type=int, default=2, help='Offers per item')
+    parser.add_argument('--images', type=int, default=2, help='Images per item')
+    parser.add_argument('--orders', type=int, default=20, help='Orders of the benchmark customer')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--repeat', type=int, default=5, help='Timed runs per scenario')
+    parser.add_argument('--only', nargs='*', help='Scenario names to run')
+    parser.add_argument('--threshold', type=float, default=0.5,
+                        help='Allowed relative regression of time and memory against the baseline')
+    parser.add_argument('--baseline', type=Path, default=DEFAULT_BASELINE)
+    parser.add_argument('--update-baseline', action='store_true', help='Store these results as the new baseline')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'foodsave.settings')
+    import django
+    django.setup()
+
+    from django.db import connection
+    from django.test.utils import override_settings, setup_test_environment
+
+    from .dataset import DatasetConfig, seed_dataset
+    from .runner import check, load_baseline, measure, save_baseline
+    from .scenarios import SCENARIOS
+
+    config = DatasetConfig(args.vendors, args.branches, args.items, args.offers, args.images, args.orders, args.seed)
+    scenarios = [scenario for scenario in SCENARIOS if not args.only or scenario.name in args.only]
+
+    baseline = load_baseline(args.baseline)
+    if baseline and baseline['dataset'] != config.as_dict():
+        print('Baseline was recorded with another dataset; comparing query budgets only')
+        baseline = None
+    baseline_results = baseline['results'] if baseline else {}
+
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(verbosity=0)
+    results = []
+    failed = False
+    try:
+        # A private cache, so the run starts cold and never touches shared caches;
+        # no request sampling, which would add its own work and metrics files
+        caches = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'benchmarks'}}
+        with override_settings(CACHES=caches, PERF_SAMPLE_RATE=0):
+            data = seed_dataset(config)
+            print(f'{"scenario":<22} {"status":>6} {"queries":>8} {"budget":>7} {"ms":>9} {"peak KiB":>9}')
+            for scenario in scenarios:
+                result = measure(scenario, data, args.repeat)
+                results.append(result)
+                failures = check(result, scenario, baseline_results.get(scenario.name), args.threshold)
+                failed = failed or bool(failures)
+                print(f'{result.name:<22} {result.status:>6} {result.queries:>8} {result.budget:>7} '
+                      f'{result.time_ms:>9.2f} {result.peak_kb:>9.1f}'
+                      + (f'  FAIL: {"; ".join(failures)}' if failures else ''))
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    if args.update_baseline:
+        save_baseline(args.baseline, config, results)
+        print(f'Baseline written to {args.baseline}')
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
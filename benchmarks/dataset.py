@@ -0,0 +1,129 @@
+"""Synthetic, deterministic dataset for the benchmark suite"""
+import random
+from dataclasses import asdict, dataclass
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+
+from booking.models import Order, OrderItem
+from booking.order_numbers import new_order_number
+from catalog.models import Category, Item, ItemImage, Offer
+from catalog.search import get_search_backend
+from catalog.views import CatalogView, catalog_queryset
+from foodsave.pagination import CursorPaginator
+from vendors.geo import grid_cell
+from vendors.models import Branch, Vendor
+
+PASSWORD = 'benchmark'
+
+CITY_CENTER = (41.311, 69.279)
+
+CATEGORIES = [
+    ('Молочные продукты', 'dairy'),
+    ('Хлеб и выпечка', 'bakery'),
+    ('Мясо и птица', 'meat'),
+    ('Овощи и фрукты', 'vegetables'),
+    ('Готовые блюда', 'dishes'),
+    ('Напитки', 'drinks'),
+    ('Десерты', 'desserts'),
+    ('Бакалея', 'grocery'),
+]
+
+TITLES = ['Молоко', 'Кефир', 'Сыр', 'Хлеб', 'Багет', 'Курица', 'Говядина', 'Яблоки', 'Плов', 'Лагман',
+          'Сок', 'Чай', 'Торт', 'Печенье', 'Рис', 'Макароны']
+
+BATCH_SIZE = 1000
+
+
+@dataclass
+class DatasetConfig:
+    vendors: int = 10
+    branches: int = 3   # per vendor
+    items: int = 20     # per branch
+    offers: int = 2     # per item
+    images: int = 2     # per item
+    orders: int = 20    # of the benchmark customer
+    seed: int = 42
+
+    def as_dict(self):
+        return asdict(self)
+
+
+def seed_dataset(config):
+    """Create the dataset; returns the objects scenarios refer to by name"""
+    rnd = random.Random(config.seed)
+    User = get_user_model()
+    password = make_password(PASSWORD)
+    owner = User.objects.create(username='bench-owner', password=password)
+    merchant = User.objects.create(username='bench-merchant', password=password)
+    customer = User.objects.create(username='bench-customer', password=password)
+    staff = User.objects.create(username='bench-staff', password=password, is_staff=True, is_superuser=True)
+
+    categories = Category.objects.bulk_create([Category(name=name, slug=slug) for name, slug in CATEGORIES])
+
+    # The benchmark owner has the first vendor; dashboards stay realistic in size
+    vendors = Vendor.objects.bulk_create([
+        Vendor(owner=owner if index == 0 else merchant, type=rnd.choice(['store', 'restaurant', 'cafe']),
+               name=f'Vendor {index}', rating=round(rnd.uniform(3, 5), 1))
+        for index in range(config.vendors)
+    ])
+
+    branches = []
+    for vendor in vendors:
+        for index in range(config.branches):
+            latitude = CITY_CENTER[0] + rnd.gauss(0, 0.05)
+            longitude = CITY_CENTER[1] + rnd.gauss(0, 0.07)
+            branches.append(Branch(vendor=vendor, name=f'{vendor.name} #{index}', address=f'Street {index}',
+                                   phone='+998700000000', latitude=latitude, longitude=longitude,
+                                   geo_cell=grid_cell(latitude, longitude)))
+    branches = Branch.objects.bulk_create(branches, batch_size=BATCH_SIZE)
+
+    items = Item.objects.bulk_create([
+        Item(vendor_id=branch.vendor_id, branch=branch, category=rnd.choice(categories),
+             title=f'{rnd.choice(TITLES)} {branch.pk}-{index}', description='Описание товара ' * 5,
+             tags=rnd.sample(['halal', 'vegetarian', 'organic', 'local'], 2))
+        for branch in branches for index in range(config.items)
+    ], batch_size=BATCH_SIZE)
+
+    today = date.today()
+    Offer.objects.bulk_create([
+        Offer(item=item, branch_id=item.branch_id, original_price=Decimal(rnd.randint(5, 200) * 1000),
+              discount_percent=rnd.choice([10, 20, 30, 50, 70]), quantity=rnd.choice([0, 1000]),
+              start_date=today - timedelta(days=rnd.randint(0, 3)), end_date=today + timedelta(days=rnd.randint(1, 5)))
+        for item in items for index in range(config.offers)
+    ], batch_size=BATCH_SIZE)
+
+    ItemImage.objects.bulk_create([
+        ItemImage(item=item, image=f'item_images/benchmark-{index}.jpg', is_primary=index == 0, order=index)
+        for item in items for index in range(config.images)
+    ], batch_size=BATCH_SIZE)
+
+    # bulk_create skips the signals that maintain card data and the search index
+    Item.objects.all().refresh_card_data()
+    get_search_backend().rebuild()
+
+    offers = list(Offer.objects.filter(quantity=0)[:max(config.orders, 1)])
+    orders = Order.objects.bulk_create([
+        Order(user=customer, order_number=new_order_number(), total_amount=Decimal('0.00'),
+              delivery_type='pickup', payment_method='cash')
+        for _ in range(config.orders)
+    ])
+    OrderItem.objects.bulk_create([
+        OrderItem(order=order, offer=offer, quantity=1, price=offer.current_price.quantize(Decimal('0.01')))
+        for order in orders for offer in rnd.sample(offers, min(3, len(offers)))
+    ], batch_size=BATCH_SIZE)
+
+    first_item = items[0]
+    first_page = CursorPaginator(catalog_queryset(), CatalogView.paginate_by).page()
+    return {
+        'users': {'owner': owner, 'customer': customer, 'staff': staff},
+        'vendor': vendors[0],
+        'item': first_item,
+        'category': categories[0],
+        'catalog_cursor': first_page.next_cursor,
+        'order': orders[0] if orders else None,
+        # Offers of unlimited quantity can be reserved on every repetition
+        'cart_offers': offers[:3],
+    }
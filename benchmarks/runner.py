@@ -0,0 +1,110 @@
+"""Measurement and baseline comparison for the benchmark suite"""
+import json
+import statistics
+import time
+import tracemalloc
+from dataclasses import asdict, dataclass
+
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+
+from .dataset import PASSWORD
+
+# Differences below these are noise, whatever the relative threshold says
+MIN_TIME_SLACK_MS = 2.0
+MIN_MEMORY_SLACK_KB = 64.0
+
+
+@dataclass
+class Result:
+    name: str
+    status: int
+    queries: int
+    budget: int
+    time_ms: float
+    peak_kb: float
+
+
+def make_client(data, user):
+    client = Client()
+    if user is not None:
+        client.login(username=data['users'][user].username, password=PASSWORD)
+    return client
+
+
+def send(client, scenario, data):
+    path = scenario.url(data)
+    if scenario.method == 'get':
+        return client.get(path)
+    payload = scenario.payload(data) if scenario.payload else {}
+    if scenario.form:
+        return client.post(path, payload)
+    return client.post(path, json.dumps(payload), content_type='application/json')
+
+
+def measure(scenario, data, repeat):
+    """Run a scenario ``repeat`` times for timings and once more under tracemalloc.
+
+    ``queries`` is the highest count of all runs, so the first run against
+    cold caches counts; the time is the median.
+    """
+    client = make_client(data, scenario.user)
+    timings = []
+    queries = 0
+    status = None
+    for _ in range(repeat):
+        if scenario.prepare:
+            scenario.prepare(client, data)
+        with CaptureQueriesContext(connection) as captured:
+            started = time.perf_counter()
+            response = send(client, scenario, data)
+            timings.append((time.perf_counter() - started) * 1000)
+        queries = max(queries, len(captured.captured_queries))
+        status = response.status_code
+
+    if scenario.prepare:
+        scenario.prepare(client, data)
+    tracemalloc.start()
+    try:
+        send(client, scenario, data)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    return Result(scenario.name, status, queries, scenario.budget, round(statistics.median(timings), 2),
+                  round(peak / 1024, 1))
+
+
+def check(result, scenario, baseline, threshold):
+    """Failure messages for a result; ``baseline`` is the stored result of the same scenario or None"""
+    failures = []
+    if result.status not in scenario.expected_status:
+        failures.append(f'status {result.status}, expected {scenario.expected_status}')
+    if result.queries > result.budget:
+        failures.append(f'{result.queries} queries, budget {result.budget}')
+    if baseline:
+        if result.queries > baseline['queries']:
+            failures.append(f"{result.queries} queries, baseline {baseline['queries']}")
+        limit = baseline['time_ms'] * (1 + threshold)
+        if result.time_ms > limit and result.time_ms - baseline['time_ms'] > MIN_TIME_SLACK_MS:
+            failures.append(f"{result.time_ms:.1f} ms, baseline {baseline['time_ms']:.1f} ms")
+        limit = baseline['peak_kb'] * (1 + threshold)
+        if result.peak_kb > limit and result.peak_kb - baseline['peak_kb'] > MIN_MEMORY_SLACK_KB:
+            failures.append(f"{result.peak_kb:.0f} KiB peak, baseline {baseline['peak_kb']:.0f} KiB")
+    return failures
+
+
+def load_baseline(path):
+    try:
+        with open(path) as baseline_file:
+            return json.load(baseline_file)
+    except FileNotFoundError:
+        return None
+
+
+def save_baseline(path, config, results):
+    with open(path, 'w') as baseline_file:
+        json.dump({'dataset': config.as_dict(), 'results': {result.name: asdict(result) for result in results}},
+                  baseline_file, indent=2, ensure_ascii=False)
+        baseline_file.write('\n')
@@ -0,0 +1,86 @@
+"""Requests measured by the benchmark suite and their query budgets.
+
+A budget is the most SQL queries a request may run with the benchmark
+dataset, cold caches included. Pages and APIs that load lists must stay
+within it however large the dataset is, so budgets are set from the
+constant query counts, not from any particular data size. Full renders of
+conditional pages include the freshness aggregate that lets revalidations
+stop at one query (catalog.conditional).
+"""
+import json
+from dataclasses import dataclass
+from typing import Callable, Optional
+
+from django.urls import reverse
+
+
+@dataclass
+class Scenario:
+    name: str
+    url: Callable          # data -> path
+    budget: int
+    user: Optional[str] = None
+    method: str = 'get'
+    payload: Optional[Callable] = None   # data -> dict sent as JSON (or form data for forms)
+    form: bool = False
+    prepare: Optional[Callable] = None   # (client, data) -> None, run before each request, not measured
+    expected_status: tuple = (200,)
+
+
+def fill_cart(client, data):
+    for offer in data['cart_offers']:
+        client.post(reverse('booking:add_to_cart'), json.dumps({'offer_id': offer.pk, 'quantity': 1}),
+                    content_type='application/json')
+
+
+SCENARIOS = [
+    # catalog
+    Scenario('catalog', lambda data: reverse('catalog:catalog'), budget=3),
+    Scenario('catalog_products', lambda data: reverse('catalog:catalog') + '?type=products', budget=3),
+    Scenario('catalog_page_2', lambda data: reverse('catalog:catalog') + f"?cursor={data['catalog_cursor']}", budget=3),
+    Scenario('api_catalog_page',
+             lambda data: reverse('catalog:api_catalog_page') + f"?cursor={data['catalog_cursor']}", budget=2),
+    Scenario('category', lambda data: reverse('catalog:category', args=[data['category'].slug]), budget=5),
+    Scenario('item_detail', lambda data: reverse('catalog:item_detail', args=[data['item'].pk]), budget=4),
+    Scenario('search', lambda data: reverse('catalog:search') + '?q=молоко', budget=3),
+    Scenario('map', lambda data: reverse('catalog:map') + '?lat=41.311&lng=69.279', budget=3),
+    Scenario('api_v1_items', lambda data: reverse('catalog:api_v1', args=['items']), budget=4),
+    Scenario('api_v1_offers', lambda data: reverse('catalog:api_v1', args=['offers']), budget=5),
+    Scenario('api_suggest', lambda data: reverse('catalog:api_suggest') + '?q=мол', budget=3),
+    Scenario('api_nearby_offers',
+             lambda data: reverse('catalog:api_nearby_offers') + '?lat=41.311&lng=69.279&radius=5', budget=2),
+    Scenario('api_recommendations', lambda data: reverse('catalog:api_recommendations'), budget=1),
+    Scenario('api_quick_sets', lambda data: reverse('catalog:api_quick_sets'), budget=1),
+    Scenario('api_cache_stats', lambda data: reverse('catalog:api_cache_stats'), budget=2, user='staff'),
+    Scenario('api_custom_sets', lambda data: reverse('catalog:api_custom_sets'), budget=0),
+    Scenario('api_save_custom_set', lambda data: reverse('catalog:api_save_custom_set'), budget=4, method='post',
+             payload=lambda data: {'name': 'Benchmark', 'items': [data['item'].pk]}),
+
+    # vendors
+    Scenario('vendor_list', lambda data: reverse('vendors:vendor_list'), budget=2),
+    Scenario('vendor_detail', lambda data: reverse('vendors:vendor_detail', args=[data['vendor'].pk]), budget=5),
+    Scenario('vendor_dashboard', lambda data: reverse('vendors:vendor_dashboard'), budget=7, user='owner'),
+    Scenario('add_branch', lambda data: reverse('vendors:add_branch', args=[data['vendor'].pk]), budget=4,
+             user='owner'),
+    Scenario('add_item', lambda data: reverse('vendors:add_item', args=[data['vendor'].pk]), budget=6, user='owner'),
+    Scenario('manage_items', lambda data: reverse('vendors:manage_items', args=[data['vendor'].pk]), budget=7,
+             user='owner'),
+    Scenario('add_offer', lambda data: reverse('vendors:add_offer', args=[data['item'].pk]), budget=7, user='owner'),
+    Scenario('add_vendor', lambda data: reverse('vendors:add_vendor'), budget=4, user='staff'),
+
+    # booking
+    Scenario('cart', lambda data: reverse('booking:cart'), budget=5, user='customer', prepare=fill_cart),
+    Scenario('checkout_page', lambda data: reverse('booking:checkout'), budget=5, user='customer', prepare=fill_cart),
+    Scenario('checkout', lambda data: reverse('booking:checkout'), budget=9, user='customer', method='post',
+             form=True, prepare=fill_cart, expected_status=(302,),
+             payload=lambda data: {'delivery_type': 'pickup', 'payment_method': 'cash'}),
+    Scenario('order_list', lambda data: reverse('booking:order_list'), budget=5, user='customer'),
+    Scenario('order_detail', lambda data: reverse('booking:order_detail', args=[data['order'].pk]), budget=5,
+             user='customer'),
+    Scenario('api_cart', lambda data: reverse('booking:cart_api'), budget=4, user='customer', prepare=fill_cart),
+    Scenario('api_cart_add', lambda data: reverse('booking:add_to_cart'), budget=12, user='customer', method='post',
+             payload=lambda data: {'offer_id': data['cart_offers'][0].pk, 'quantity': 1}),
+    Scenario('api_cart_remove', lambda data: reverse('booking:remove_from_cart'), budget=8, user='customer',
+             method='post', prepare=fill_cart,
+             payload=lambda data: {'offer_id': data['cart_offers'][0].pk}),
+]
@@ -0,0 +1,160 @@
+"""Template render time per request: ``python -m benchmarks.templates --help``
+
+Requests the HTML pages of the benchmark suite under three template
+profiles and reports the median time spent loading and rendering templates
+per request, and the response size:
+
+* ``uncached``   - templates are loaded and compiled on every request
+* ``default``    - the source templates through Django's implicit cached
+  loader, with template debug data (the development profile)
+* ``production`` - the template bundle (``manage.py build_templates``, built
+  into a temporary directory here) through the cached loader, no debug data
+
+Each page is requested once before timing, so cached profiles show what a
+warm worker process spends.
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from django.template.backends.django import DjangoTemplates, Template
+
+# Seconds spent loading and rendering templates in the current request
+RENDER_SECONDS = [0.0]
+
+
+class TimedTemplate(Template):
+    def render(self, context=None, request=None):
+        started = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            RENDER_SECONDS[0] += time.perf_counter() - started
+
+
+class TimedTemplates(DjangoTemplates):
+    """``DjangoTemplates`` adding the time spent loading and rendering templates to ``RENDER_SECONDS``"""
+
+    def get_template(self, template_name):
+        started = time.perf_counter()
+        try:
+            return TimedTemplate(super().get_template(template_name).template, self)
+        finally:
+            RENDER_SECONDS[0] += time.perf_counter() - started
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.templates', description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--vendors', type=int, default=10)
+    parser.add_argument('--branches', type=int, default=3, help='Branches per vendor')
+    parser.add_argument('--items', type=int, default=20, help='Items per branch')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--repeat', type=int, default=20, help='Timed requests per page and profile')
+    parser.add_argument('--only', nargs='*', help='Scenario names to run')
+    return parser.parse_args(argv)
+
+
+def profiles(bundle_dir):
+    from django.conf import settings
+
+    from foodsave.bundle import source_dirs
+
+    plain = ['django.template.loaders.filesystem.Loader', 'django.template.loaders.app_directories.Loader']
+    cached = [('django.template.loaders.cached.Loader', plain)]
+    sources = source_dirs()
+
+    def templates(dirs, loaders, debug):
+        return [{
+            # This module, also when run as __main__
+            'BACKEND': f'{__name__}.TimedTemplates',
+            'DIRS': dirs,
+            'OPTIONS': {
+                'context_processors': settings.TEMPLATES[0]['OPTIONS']['context_processors'],
+                'loaders': loaders,
+                'debug': debug,
+            },
+        }]
+
+    return {
+        'uncached': templates(sources, plain, True),
+        'default': templates(sources, cached, True),
+        'production': templates([Path(bundle_dir) / 'templates', *sources], cached, False),
+    }
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'foodsave.settings')
+    import django
+    django.setup()
+
+    from django.core.cache import cache
+    from django.db import connection
+    from django.test.utils import override_settings, setup_test_environment
+
+    from foodsave.bundle import build, source_dirs
+    from .dataset import DatasetConfig, seed_dataset
+    from .runner import make_client, send
+    from .scenarios import SCENARIOS
+
+    config = DatasetConfig(args.vendors, args.branches, args.items, seed=args.seed)
+    scenarios = [
+        scenario for scenario in SCENARIOS
+        if scenario.method == 'get' and not scenario.name.startswith('api_')
+        and (not args.only or scenario.name in args.only)
+    ]
+
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(verbosity=0)
+    failed = False
+    try:
+        caches = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'benchmarks'}}
+        with override_settings(CACHES=caches, PERF_SAMPLE_RATE=0), tempfile.TemporaryDirectory() as bundle_dir:
+            build(bundle_dir, source_dirs())
+            data = seed_dataset(config)
+            results = {}
+            for profile, templates in profiles(bundle_dir).items():
+                with override_settings(TEMPLATES=templates):
+                    cache.clear()
+                    for scenario in scenarios:
+                        results[scenario.name, profile] = measure(scenario, data, args.repeat, make_client, send)
+
+            print(f'{"scenario":<18} {"uncached ms":>12} {"default ms":>11} {"production ms":>14} '
+                  f'{"KiB default":>12} {"KiB production":>15}')
+            totals = dict.fromkeys(('uncached', 'default', 'production'), 0.0)
+            for scenario in scenarios:
+                row = {profile: results[scenario.name, profile] for profile in totals}
+                for profile, (milliseconds, size, status) in row.items():
+                    totals[profile] += milliseconds
+                    failed = failed or status not in scenario.expected_status
+                print(f'{scenario.name:<18} {row["uncached"][0]:>12.2f} {row["default"][0]:>11.2f} '
+                      f'{row["production"][0]:>14.2f} {row["default"][1] / 1024:>12.1f} '
+                      f'{row["production"][1] / 1024:>15.1f}')
+            print(f'{"total":<18} {totals["uncached"]:>12.2f} {totals["default"]:>11.2f} '
+                  f'{totals["production"]:>14.2f}')
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+    return 1 if failed else 0
+
+
+def measure(scenario, data, repeat, make_client, send):
+    """Median template time (ms) of ``repeat`` requests after a warm-up one, response size and status"""
+    client = make_client(data, scenario.user)
+    timings = []
+    for attempt in range(repeat + 1):
+        if scenario.prepare:
+            scenario.prepare(client, data)
+        RENDER_SECONDS[0] = 0.0
+        response = send(client, scenario, data)
+        if attempt:
+            timings.append(RENDER_SECONDS[0] * 1000)
+    return statistics.median(timings), len(response.content), response.status_code
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,7 +1,8 @@
 from django.contrib import admin
 from django.utils.html import format_html
 from django.utils import timezone
-from .models import Order, OrderItem
+from .models import Cart, Order, OrderItem, Reservation
+from .order_numbers import new_order_number
 
 
 class OrderItemInline(admin.TabularInline):
@@ -48,8 +49,7 @@ class OrderAdmin(admin.ModelAdmin):
     def save_model(self, request, obj, form, change):
         if not obj.order_number:
             # Generate order number if not exists
-            import uuid
-            obj.order_number = f"ORD-{uuid.uuid4().hex[:8].upper()}"
+            obj.order_number = new_order_number()
         super().save_model(request, obj, form, change)
     
     actions = ['mark_confirmed', 'mark_preparing', 'mark_ready', 'mark_delivered', 'mark_cancelled']
@@ -102,3 +102,19 @@ class OrderItemAdmin(admin.ModelAdmin):
         if obj:  # editing an existing object
             return ('order', 'offer')
         return ()
+
+
+class ReservationInline(admin.TabularInline):
+    model = Reservation
+    extra = 0
+    fields = ('offer', 'quantity', 'holds_stock', 'expires_at')
+    readonly_fields = ('offer', 'quantity', 'holds_stock', 'expires_at')
+    can_delete = False
+
+
+@admin.register(Cart)
+class CartAdmin(admin.ModelAdmin):
+    list_display = ('id', 'user', 'created_at', 'updated_at')
+    search_fields = ('user__username', 'user__email')
+    ordering = ('-updated_at',)
+    inlines = [ReservationInline]
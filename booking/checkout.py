@@ -0,0 +1,87 @@
+"""Checkout of a server-side cart.
+
+``place_order`` turns the reservations of a cart into an order with a fixed
+number of queries however many lines the cart has: one to load and lock the
+reservations with their offers, one insert for the order, one
+``bulk_create`` for its items and one delete for the consumed reservations.
+The reserved units were already taken from stock when they were added to
+the cart, so no offer row is locked by checkout.
+"""
+from decimal import ROUND_HALF_UP, Decimal
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import OrderItem, Reservation
+
+CENT = Decimal('0.01')
+
+DELIVERY_FEE = Decimal(str(getattr(settings, 'BOOKING_DELIVERY_FEE', '5.00')))
+
+
+class CheckoutError(Exception):
+    """The cart can not be turned into an order"""
+
+
+def line_price(offer):
+    """Unit price of an offer rounded to cents"""
+    return offer.current_price.quantize(CENT, rounding=ROUND_HALF_UP)
+
+
+def delivery_fee(delivery_type):
+    return DELIVERY_FEE if delivery_type == 'delivery' else Decimal('0.00')
+
+
+def summarize(reservations, delivery_type='delivery'):
+    """Order lines as (reservation, unit price) pairs plus subtotal, delivery fee and total"""
+    lines = [(reservation, line_price(reservation.offer)) for reservation in reservations]
+    subtotal = sum((price * reservation.quantity for reservation, price in lines), Decimal('0.00'))
+    fee = delivery_fee(delivery_type)
+    return lines, subtotal, fee, subtotal + fee
+
+
+def cart_reservations(cart):
+    """Reservations of a cart with everything checkout needs from their offers"""
+    if cart is None:
+        return Reservation.objects.none()
+    return cart.reservations.select_related('offer__item__vendor').order_by('created_at', 'id')
+
+
+def validate_offer(offer):
+    today = timezone.now().date()
+    item = offer.item
+    # sold_out is expected here: the last units may be the ones this cart holds
+    if (not offer.is_active or offer.status not in ('available', 'sold_out') or offer.start_date > today
+            or (offer.end_date and offer.end_date < today) or not item.is_active or not item.vendor.is_active):
+        raise CheckoutError(f'«{item.title}» больше недоступно')
+
+
+def place_order(cart, order, expected_subtotal=None):
+    """Save ``order`` with the lines of ``cart`` and empty the cart; returns the order.
+
+    ``expected_subtotal`` is the amount the customer saw; the order is
+    refused if prices changed since.
+    """
+    with transaction.atomic():
+        # Only reservation rows are locked, so the sweeper can not release them meanwhile
+        reservations = list(cart_reservations(cart).select_for_update(of=('self',)))
+        if not reservations:
+            raise CheckoutError('Корзина пуста')
+        for reservation in reservations:
+            validate_offer(reservation.offer)
+
+        lines, subtotal, fee, total = summarize(reservations, order.delivery_type)
+        if expected_subtotal is not None and expected_subtotal != subtotal:
+            raise CheckoutError('Цены изменились, проверьте заказ')
+
+        order.delivery_fee = fee
+        order.total_amount = total
+        order.save()
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, offer=reservation.offer, quantity=reservation.quantity, price=price)
+            for reservation, price in lines
+        ])
+        # The reserved units are sold now, so they are not given back to stock
+        Reservation.objects.filter(pk__in=[reservation.pk for reservation in reservations]).delete()
+    return order
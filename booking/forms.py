@@ -10,6 +10,9 @@ User = get_user_model()
 
 class CheckoutForm(forms.ModelForm):
     """Form for checkout process"""
+
+    # Items subtotal the customer saw, to refuse the order if prices changed
+    expected_subtotal = forms.DecimalField(required=False, decimal_places=2, widget=forms.HiddenInput)
     
     class Meta:
         model = Order
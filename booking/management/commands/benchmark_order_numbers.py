@@ -0,0 +1,98 @@
+import multiprocessing
+import time
+import uuid
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction
+
+from booking.models import Order
+from booking.order_numbers import OrderNumberGenerator, default_node_id, is_valid_order_number
+
+
+class Rollback(Exception):
+    pass
+
+
+def generate(count, barrier, results):
+    """Worker process: claim a node id as any process would, then generate ``count`` numbers"""
+    generator = OrderNumberGenerator(default_node_id())
+    connections.close_all()
+    barrier.wait()
+    started = time.perf_counter()
+    numbers = [generator() for _ in range(count)]
+    results.put((generator.node_id, time.perf_counter() - started, numbers))
+
+
+class Command(BaseCommand):
+    help = 'Measure order number generation, uniqueness and order insert throughput'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--count', type=int, default=1000000, help='Order numbers to generate')
+        parser.add_argument('--nodes', type=int, default=4, help='Worker processes generating at the same time')
+        parser.add_argument('--inserts', type=int, default=20000, help='Orders to insert (rolled back afterwards)')
+
+    def handle(self, *args, **options):
+        count = options['count']
+        nodes = max(1, options['nodes'])
+
+        # Generation: separate processes with their own node ids, over the same milliseconds
+        node_ids, elapsed, batches = self.generate_in_processes(count // nodes, nodes)
+        numbers = [number for batch in batches for number in batch]
+        collisions = len(numbers) - len(set(numbers))
+        monotonic = all(batch == sorted(batch) and len(set(batch)) == len(batch) for batch in batches)
+        invalid = sum(not is_valid_order_number(number) for number in numbers[:100000])
+        self.stdout.write(
+            f'generated {len(numbers)} numbers in {nodes} processes (node ids {sorted(node_ids)}) '
+            f'in {elapsed:.2f}s ({len(numbers) / elapsed:,.0f}/s): {collisions} collisions, '
+            f'monotonic per node: {monotonic}, invalid check characters: {invalid}'
+        )
+
+        inserts = options['inserts']
+        if inserts:
+            time_ordered = self.insert_rate(inserts, OrderNumberGenerator(default_node_id()))
+            random_numbers = self.insert_rate(inserts, lambda: f'ORD-{uuid.uuid4().hex[:16].upper()}')
+            self.stdout.write(
+                f'inserted {inserts} orders: time-ordered {time_ordered:,.0f}/s, random {random_numbers:,.0f}/s'
+            )
+
+        if collisions or not monotonic or invalid:
+            raise CommandError('Order number check failed')
+        self.stdout.write(self.style.SUCCESS('Order numbers OK'))
+
+    def generate_in_processes(self, per_node, nodes):
+        """Node ids, slowest generation time and numbers of ``nodes`` forked processes started together"""
+        context = multiprocessing.get_context('fork')
+        barrier = context.Barrier(nodes)
+        results = context.Queue()
+        # Forked children must not share the parent's database connections
+        connections.close_all()
+        workers = [context.Process(target=generate, args=(per_node, barrier, results)) for _ in range(nodes)]
+        for worker in workers:
+            worker.start()
+        # Read before joining: a worker exits only once its numbers are taken from the queue
+        node_ids, timings, batches = zip(*(results.get() for _ in workers))
+        for worker in workers:
+            worker.join()
+        return node_ids, max(timings), batches
+
+    def insert_rate(self, count, next_number, batch_size=500):
+        """Orders per second inserted in batches; everything is rolled back"""
+        User = get_user_model()
+        elapsed = 0.0
+        try:
+            with transaction.atomic():
+                user = User.objects.create(username=f'benchmark-{uuid.uuid4().hex}')
+                for offset in range(0, count, batch_size):
+                    orders = [
+                        Order(user=user, order_number=next_number(), total_amount=0,
+                              delivery_type='pickup', payment_method='cash')
+                        for _ in range(min(batch_size, count - offset))
+                    ]
+                    started = time.perf_counter()
+                    Order.objects.bulk_create(orders)
+                    elapsed += time.perf_counter() - started
+                raise Rollback
+        except Rollback:
+            pass
+        return count / elapsed if elapsed else 0.0
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from booking.reservations import SWEEP_BATCH_SIZE, release_expired
+
+
+class Command(BaseCommand):
+    help = 'Give the units of expired cart reservations back to their offers'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=SWEEP_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        released = release_expired(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Released {released} reservations'))
@@ -41,6 +41,12 @@ class Order(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            # Keyset pages of a customer's orders (foodsave.pagination)
+            models.Index(fields=['user', '-created_at', '-id'], name='booking_order_user_new_idx'),
+        ]
+
     def __str__(self):
         return f"Order {self.order_number}"
 
@@ -51,4 +57,45 @@ class OrderItem(models.Model):
     price = models.DecimalField(max_digits=10, decimal_places=2)
     
     def __str__(self):
-        return f"{self.offer.item.title} x{self.quantity}"
\ No newline at end of file
+        return f"{self.offer.item.title} x{self.quantity}"
+
+class Cart(models.Model):
+    """Server-side cart of a user, or of an anonymous session (``user`` is empty)"""
+    user = models.OneToOneField(User, on_delete=models.CASCADE, null=True, blank=True, related_name='cart')
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Cart {self.user or f'#{self.pk} (anonymous)'}"
+
+
+class Reservation(models.Model):
+    """Units of an offer held for a cart until ``expires_at``.
+
+    ``holds_stock`` is false for offers with unlimited quantity, which are
+    never decremented and so are never given back.
+    """
+    cart = models.ForeignKey(Cart, on_delete=models.CASCADE, related_name='reservations')
+    offer = models.ForeignKey(Offer, on_delete=models.CASCADE, related_name='reservations')
+    quantity = models.PositiveIntegerField()
+    holds_stock = models.BooleanField(default=True)
+    expires_at = models.DateTimeField(db_index=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['cart', 'offer'], name='booking_reservation_cart_offer_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.offer_id} x{self.quantity} until {self.expires_at:%H:%M}"
+
+
+class OrderNodeClaim(models.Model):
+    """Order number node id handed out to a process: the claim number modulo 2048 (see ``order_numbers``)"""
+    hostname = models.CharField(max_length=255)
+    pid = models.PositiveIntegerField()
+    claimed_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Claim #{self.pk} ({self.hostname}:{self.pid})"
@@ -0,0 +1,125 @@
+"""Time-ordered order numbers.
+
+An order number is ``ORD-`` followed by 13 Crockford base32 characters and a
+check character, e.g. ``ORD-0MHCGXEWKRM00Z``. The 65 encoded bits are the
+milliseconds since ``EPOCH_MS`` (42 bits), a node id (11 bits) and a per
+millisecond sequence (12 bits), so numbers from one node never repeat and
+sort in creation order, and new rows land at the right edge of the unique
+index instead of at random positions. The check character (Luhn mod 32)
+catches mistyped numbers in support requests.
+
+Every process needs its own node id. ``BOOKING_ORDER_NODE_ID`` (0-2047)
+sets it per worker; otherwise each process claims one from the database
+(``OrderNodeClaim``) when it makes its first number. Claims are numbered by
+the database, so ids go round in turn and two live processes only share one
+if the older has outlived 2047 later process starts.
+"""
+import os
+import socket
+import threading
+import time
+
+from django.conf import settings
+
+from .models import OrderNodeClaim
+
+ALPHABET = '0123456789ABCDEFGHJKMNPQRSTVWXYZ'
+CODES = {char: value for value, char in enumerate(ALPHABET)}
+
+PREFIX = 'ORD-'
+BODY_LENGTH = 13
+
+# 2024-01-01T00:00:00Z; 42 bits of milliseconds last until 2163
+EPOCH_MS = 1704067200000
+
+NODE_BITS = 11
+SEQUENCE_BITS = 12
+MAX_NODE = (1 << NODE_BITS) - 1
+MAX_SEQUENCE = (1 << SEQUENCE_BITS) - 1
+
+
+def check_character(payload):
+    """Luhn mod 32 check character of a base32 string"""
+    factor = 2
+    total = 0
+    for char in reversed(payload):
+        addend = factor * CODES[char]
+        factor = 3 - factor
+        total += addend // 32 + addend % 32
+    return ALPHABET[-total % 32]
+
+
+def is_valid_order_number(value):
+    body = value[len(PREFIX):]
+    if not value.startswith(PREFIX) or len(body) != BODY_LENGTH + 1 or any(char not in CODES for char in body):
+        return False
+    return check_character(body[:-1]) == body[-1]
+
+
+def encode(number, length=BODY_LENGTH):
+    chars = []
+    for _ in range(length):
+        number, value = divmod(number, 32)
+        chars.append(ALPHABET[value])
+    return ''.join(reversed(chars))
+
+
+def default_node_id():
+    """``BOOKING_ORDER_NODE_ID``, or the next id claimed from the database"""
+    configured = getattr(settings, 'BOOKING_ORDER_NODE_ID', None)
+    if configured is not None:
+        return int(configured)
+    claim = OrderNodeClaim.objects.create(hostname=socket.gethostname()[:255], pid=os.getpid())
+    return claim.pk & MAX_NODE
+
+
+class OrderNumberGenerator:
+    """Monotonic generator for one node.
+
+    Within a millisecond the sequence counts up; when it runs out, or the
+    clock steps backwards, the generator keeps counting from the last
+    millisecond it used instead of repeating a value.
+    """
+
+    def __init__(self, node_id, clock=time.time_ns):
+        if not 0 <= node_id <= MAX_NODE:
+            raise ValueError(f'node_id must be between 0 and {MAX_NODE}')
+        self.node_id = node_id
+        self.clock = clock
+        self.last_ms = -1
+        self.sequence = 0
+        self.lock = threading.Lock()
+
+    def next_value(self):
+        with self.lock:
+            now_ms = self.clock() // 1_000_000 - EPOCH_MS
+            if now_ms > self.last_ms:
+                self.last_ms = now_ms
+                self.sequence = 0
+            elif self.sequence < MAX_SEQUENCE:
+                self.sequence += 1
+            else:
+                self.last_ms += 1
+                self.sequence = 0
+            return (self.last_ms << (NODE_BITS + SEQUENCE_BITS)) | (self.node_id << SEQUENCE_BITS) | self.sequence
+
+    def __call__(self):
+        body = encode(self.next_value())
+        return f'{PREFIX}{body}{check_character(body)}'
+
+
+_generator = None
+_generator_pid = None
+_generator_lock = threading.Lock()
+
+
+def new_order_number():
+    """Next order number of this process"""
+    global _generator, _generator_pid
+    # A forked worker must not continue its parent's node and sequence
+    if _generator is None or _generator_pid != os.getpid():
+        with _generator_lock:
+            if _generator is None or _generator_pid != os.getpid():
+                _generator = OrderNumberGenerator(default_node_id())
+                _generator_pid = os.getpid()
+    return _generator()
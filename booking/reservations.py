@@ -0,0 +1,214 @@
+"""Server-side carts and stock reservations.
+
+Adding an offer to a cart takes the units from ``Offer.quantity`` with a
+single conditional ``UPDATE ... WHERE quantity >= n``: the database checks and
+decrements the stock in one statement, so concurrent buyers of the last unit
+cannot both succeed and no row is read and locked beforehand. The taken units
+are recorded as a ``Reservation`` that lives for ``BOOKING_RESERVATION_TTL``
+seconds after the last cart activity; ``release_expired`` (run by the
+``release_reservations`` command) gives expired units back in bulk.
+
+``Offer.quantity == 0`` means unlimited, so an offer whose last unit is taken
+is also marked ``sold_out``; offers with unlimited quantity are reserved
+without touching the stock.
+"""
+from collections import Counter
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, Q, Value, When
+from django.utils import timezone
+
+from catalog.caching import invalidate_tags
+from catalog.models import Item, Offer
+from .models import Cart, Reservation
+
+RESERVATION_TTL = getattr(settings, 'BOOKING_RESERVATION_TTL', 15 * 60)
+
+SWEEP_BATCH_SIZE = 1000
+
+SESSION_CART_KEY = 'cart_id'
+
+
+class ReservationError(Exception):
+    """The requested units can not be reserved"""
+
+
+def expiry_time(now=None):
+    return (now or timezone.now()) + timedelta(seconds=RESERVATION_TTL)
+
+
+def get_cart(request, create=True):
+    """Cart of the current user or anonymous session, or None when ``create`` is false and there is none.
+
+    An anonymous cart is remembered in the session, which survives login, so
+    it is handed over to the user on their first request after logging in.
+    """
+    user = request.user if request.user.is_authenticated else None
+    cart_id = request.session.get(SESSION_CART_KEY)
+
+    if user is not None:
+        cart = Cart.objects.filter(user=user).first()
+        if cart is None and cart_id is not None:
+            if Cart.objects.filter(pk=cart_id, user__isnull=True).update(user=user):
+                cart = Cart.objects.get(pk=cart_id)
+        if cart is None and create:
+            cart = Cart.objects.create(user=user)
+        if cart_id is not None:
+            del request.session[SESSION_CART_KEY]
+        return cart
+
+    cart = Cart.objects.filter(pk=cart_id, user__isnull=True).first() if cart_id is not None else None
+    if cart is None and create:
+        cart = Cart.objects.create()
+        request.session[SESSION_CART_KEY] = cart.pk
+    return cart
+
+
+def cart_item_ids(request):
+    """Sorted ids of the items in the current cart, looked up once per request"""
+    if not hasattr(request, '_cart_item_ids'):
+        cart = get_cart(request, create=False)
+        item_ids = cart.reservations.values_list('offer__item_id', flat=True) if cart is not None else []
+        request._cart_item_ids = sorted(set(item_ids))
+    return request._cart_item_ids
+
+
+def refresh_offer_items(offer_ids):
+    """Update catalog card data and caches after offers sold out or came back"""
+    Item.objects.filter(offers__pk__in=offer_ids).distinct().refresh_card_data()
+    invalidate_tags('offer', 'item')
+
+
+def take_stock(offer_id, quantity):
+    """Decrement the stock of a live offer; returns False for unlimited offers.
+
+    Raises ``ReservationError`` when fewer than ``quantity`` units are left.
+    """
+    today = timezone.now().date()
+    live = Offer.objects.filter(
+        Q(end_date__isnull=True) | Q(end_date__gte=today),
+        pk=offer_id,
+        is_active=True,
+        status='available',
+        start_date__lte=today,
+    )
+    now = timezone.now()
+    if live.filter(quantity__gt=quantity).update(quantity=F('quantity') - quantity, updated_at=now):
+        return True
+    # Taking the last units also marks the offer sold out, since 0 means unlimited
+    if live.filter(quantity=quantity).update(quantity=0, status='sold_out', updated_at=now):
+        refresh_offer_items([offer_id])
+        return True
+    if live.filter(quantity=0).exists():
+        return False
+    raise ReservationError('Недостаточно товара')
+
+
+def give_back(quantities):
+    """Return reserved units to their offers in one UPDATE; ``quantities`` maps offer id to units"""
+    if not quantities:
+        return
+    revived = list(Offer.objects.filter(pk__in=quantities, status='sold_out', quantity=0).values_list('pk', flat=True))
+    Offer.objects.filter(pk__in=quantities).update(
+        quantity=F('quantity') + Case(
+            *[When(pk=offer_id, then=Value(units)) for offer_id, units in quantities.items()],
+            default=Value(0),
+        ),
+        # Only offers sold out by reservations come back; manual sold-out flags stay
+        status=Case(When(status='sold_out', quantity=0, then=Value('available')), default=F('status')),
+        updated_at=timezone.now(),
+    )
+    if revived:
+        refresh_offer_items(revived)
+
+
+def reserve(cart, offer_id, quantity=1):
+    """Reserve ``quantity`` more units of an offer and extend the cart's reservations"""
+    if quantity < 1:
+        raise ReservationError('Неверное количество')
+    now = timezone.now()
+    with transaction.atomic():
+        holds_stock = take_stock(offer_id, quantity)
+        updated = cart.reservations.filter(offer_id=offer_id).update(quantity=F('quantity') + quantity)
+        if not updated:
+            Reservation.objects.create(
+                cart=cart, offer_id=offer_id, quantity=quantity, holds_stock=holds_stock, expires_at=expiry_time(now)
+            )
+        cart.reservations.update(expires_at=expiry_time(now))
+        Cart.objects.filter(pk=cart.pk).update(updated_at=now)
+
+
+def release(cart, offer_id=None, quantity=None):
+    """Give back ``quantity`` units of an offer, its whole line, or the whole cart when ``offer_id`` is None"""
+    reservations = cart.reservations.all()
+    if offer_id is not None:
+        reservations = reservations.filter(offer_id=offer_id)
+    with transaction.atomic():
+        rows = list(reservations.select_for_update().values_list('pk', 'offer_id', 'quantity', 'holds_stock'))
+        if quantity is not None and len(rows) == 1 and quantity < rows[0][2]:
+            pk, offer_id, reserved, holds_stock = rows[0]
+            Reservation.objects.filter(pk=pk).update(quantity=F('quantity') - quantity)
+            returned = {offer_id: quantity} if holds_stock else {}
+        else:
+            Reservation.objects.filter(pk__in=[row[0] for row in rows]).delete()
+            returned = {offer_id: reserved for pk, offer_id, reserved, holds_stock in rows if holds_stock}
+        give_back(returned)
+
+
+def release_expired(now=None, batch_size=SWEEP_BATCH_SIZE):
+    """Delete expired reservations and give their units back; returns the number released"""
+    now = now or timezone.now()
+    released = 0
+    while True:
+        with transaction.atomic():
+            # Rows locked by a concurrent checkout or cart update are left for the next run
+            rows = list(
+                Reservation.objects.filter(expires_at__lte=now)
+                .select_for_update(skip_locked=True)
+                .values_list('pk', 'offer_id', 'quantity', 'holds_stock')[:batch_size]
+            )
+            if not rows:
+                break
+            Reservation.objects.filter(pk__in=[row[0] for row in rows]).delete()
+            quantities = Counter()
+            for pk, offer_id, reserved, holds_stock in rows:
+                if holds_stock:
+                    quantities[offer_id] += reserved
+            give_back(quantities)
+        released += len(rows)
+
+    # Anonymous carts that stayed empty for a whole reservation period are abandoned
+    Cart.objects.filter(
+        user__isnull=True, reservations__isnull=True, updated_at__lte=now - timedelta(seconds=RESERVATION_TTL)
+    ).delete()
+    return released
+
+
+def cart_data(cart):
+    """JSON-ready contents of a cart with Decimal totals rendered as floats"""
+    lines = []
+    total = Decimal('0')
+    if cart is not None:
+        reservations = cart.reservations.select_related('offer__item__vendor').order_by('created_at', 'id')
+        for reservation in reservations:
+            offer = reservation.offer
+            price = offer.current_price
+            line_total = price * reservation.quantity
+            total += line_total
+            lines.append({
+                'offer_id': offer.id,
+                'item_id': offer.item_id,
+                'title': offer.item.title,
+                'vendor_name': offer.item.vendor.name,
+                'image_url': offer.item.primary_image_url,
+                'quantity': reservation.quantity,
+                'original_price': float(offer.original_price),
+                'current_price': float(price),
+                'discount_percent': int(offer.discount_percent),
+                'total': float(line_total),
+                'expires_at': reservation.expires_at.isoformat(),
+            })
+    return {'items': lines, 'total': float(total)}
@@ -1,3 +1,295 @@
-from django.test import TestCase
+import json
+from datetime import date, timedelta
+from decimal import Decimal
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from catalog.models import Item, Offer
+from vendors.models import Branch, Vendor
+from .checkout import CheckoutError, place_order
+from .models import Cart, Order, OrderItem, OrderNodeClaim, Reservation
+from .order_numbers import (ALPHABET, MAX_SEQUENCE, PREFIX, OrderNumberGenerator, check_character, default_node_id,
+                            is_valid_order_number)
+from .reservations import ReservationError, release, release_expired, reserve, take_stock
+
+
+class BookingTestData:
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        cls.owner = User.objects.create_user('owner', password='secret')
+        cls.customer = User.objects.create_user('customer', password='secret')
+        cls.staff = User.objects.create_user('staff', password='secret', is_staff=True, is_superuser=True)
+        vendor = Vendor.objects.create(owner=cls.owner, type='store', name='Vendor')
+        cls.branch = Branch.objects.create(vendor=vendor, name='Branch', address='Address', phone='1',
+                                           latitude=41.3, longitude=69.2)
+        cls.item = Item.objects.create(vendor=vendor, branch=cls.branch, title='Молоко')
+        cls.offer = cls.make_offer(quantity=2)
+        cls.unlimited = cls.make_offer(quantity=0)
+
+    @classmethod
+    def make_offer(cls, quantity, price='10.00', discount=0):
+        return Offer.objects.create(item=cls.item, branch=cls.branch, original_price=Decimal(price),
+                                    discount_percent=discount, quantity=quantity, start_date=date.today())
+
+    def post_json(self, name, payload):
+        return self.client.post(reverse(name), json.dumps(payload), content_type='application/json')
+
+
+class ReservationTests(BookingTestData, TestCase):
+    def setUp(self):
+        self.cart = Cart.objects.create()
+
+    def test_taking_the_last_units_sells_the_offer_out(self):
+        self.assertTrue(take_stock(self.offer.pk, 2))
+        self.offer.refresh_from_db()
+        self.assertEqual((self.offer.quantity, self.offer.status), (0, 'sold_out'))
+
+    def test_units_can_not_be_reserved_twice(self):
+        reserve(self.cart, self.offer.pk, 2)
+        other = Cart.objects.create()
+        with self.assertRaises(ReservationError):
+            reserve(other, self.offer.pk, 1)
+        self.assertFalse(other.reservations.exists())
+
+    def test_reserving_more_than_the_stock_fails_without_taking_any(self):
+        with self.assertRaises(ReservationError):
+            reserve(self.cart, self.offer.pk, 3)
+        self.offer.refresh_from_db()
+        self.assertEqual((self.offer.quantity, self.offer.status), (2, 'available'))
+
+    def test_unlimited_offers_keep_their_stock(self):
+        reserve(self.cart, self.unlimited.pk, 5)
+        reserve(self.cart, self.unlimited.pk, 1)
+        reservation = self.cart.reservations.get()
+        self.assertEqual((reservation.quantity, reservation.holds_stock), (6, False))
+        release(self.cart, self.unlimited.pk)
+        self.unlimited.refresh_from_db()
+        self.assertEqual((self.unlimited.quantity, self.unlimited.status), (0, 'available'))
+
+    def test_partial_release_gives_back_the_released_units(self):
+        reserve(self.cart, self.offer.pk, 2)
+        release(self.cart, self.offer.pk, 1)
+        self.assertEqual(self.cart.reservations.get().quantity, 1)
+        self.offer.refresh_from_db()
+        self.assertEqual((self.offer.quantity, self.offer.status), (1, 'available'))
+
+        release(self.cart, self.offer.pk)
+        self.assertFalse(self.cart.reservations.exists())
+        self.offer.refresh_from_db()
+        self.assertEqual(self.offer.quantity, 2)
+
+    def test_sweeper_gives_expired_units_back(self):
+        reserve(self.cart, self.offer.pk, 2)
+        kept = Cart.objects.create()
+        reserve(kept, self.unlimited.pk, 1)
+        Reservation.objects.filter(cart=self.cart).update(expires_at=timezone.now() - timedelta(seconds=1))
+
+        self.assertEqual(release_expired(), 1)
+        self.offer.refresh_from_db()
+        self.assertEqual((self.offer.quantity, self.offer.status), (2, 'available'))
+        self.assertTrue(kept.reservations.exists())
+
+    def test_sweeper_leaves_manual_sold_out_flags(self):
+        reserve(self.cart, self.offer.pk, 1)
+        Offer.objects.filter(pk=self.offer.pk).update(status='sold_out')
+        Reservation.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+        release_expired()
+        self.offer.refresh_from_db()
+        self.assertEqual((self.offer.quantity, self.offer.status), (2, 'sold_out'))
+
+    def test_abandoned_anonymous_carts_are_deleted(self):
+        Cart.objects.filter(pk=self.cart.pk).update(updated_at=timezone.now() - timedelta(days=1))
+        release_expired()
+        self.assertFalse(Cart.objects.filter(pk=self.cart.pk).exists())
+
+
+class CartApiTests(BookingTestData, TestCase):
+    def test_add_and_remove(self):
+        response = self.post_json('booking:add_to_cart', {'offer_id': self.offer.pk, 'quantity': 2})
+        self.assertEqual(response.status_code, 200)
+        cart = response.json()['cart']
+        self.assertEqual([(line['offer_id'], line['quantity']) for line in cart['items']], [(self.offer.pk, 2)])
+        self.assertEqual(cart['total'], 20.0)
+
+        response = self.post_json('booking:add_to_cart', {'offer_id': self.offer.pk})
+        self.assertEqual(response.status_code, 409)
+
+        response = self.post_json('booking:remove_from_cart', {'offer_id': self.offer.pk})
+        self.assertEqual(response.json()['cart'], {'items': [], 'total': 0.0})
+        self.offer.refresh_from_db()
+        self.assertEqual(self.offer.quantity, 2)
+
+    def test_invalid_bodies_are_rejected(self):
+        for body in ('[]', '1', 'null', '"x"', '{', '{"offer_id": "x"}'):
+            with self.subTest(body=body):
+                for name in ('booking:add_to_cart', 'booking:remove_from_cart'):
+                    response = self.client.post(reverse(name), body, content_type='application/json')
+                    self.assertEqual(response.status_code, 400)
+
+    def test_anonymous_cart_is_handed_over_on_login(self):
+        self.post_json('booking:add_to_cart', {'offer_id': self.offer.pk})
+        self.client.login(username='customer', password='secret')
+        cart = self.client.get(reverse('booking:cart_api')).json()['cart']
+        self.assertEqual([line['offer_id'] for line in cart['items']], [self.offer.pk])
+        self.assertEqual(Cart.objects.get().user, self.customer)
+
+    def test_cart_api_hands_out_the_csrf_cookie(self):
+        response = self.client.get(reverse('booking:cart_api'))
+        self.assertIn('csrftoken', response.cookies)
+
+    def test_cart_page_renders_the_server_cart(self):
+        self.post_json('booking:add_to_cart', {'offer_id': self.offer.pk, 'quantity': 2})
+        response = self.client.get(reverse('booking:cart'))
+        cart = json.loads(response.content.decode().split('<script id="cartData" type="application/json">')[1]
+                          .split('</script>')[0])
+        self.assertEqual([(line['offer_id'], line['quantity']) for line in cart['items']], [(self.offer.pk, 2)])
+        self.assertContains(response, 'data-fee="5.00"')
+
+    def test_recommendations_skip_the_items_in_the_cart(self):
+        def recommendations():
+            response = self.client.get(reverse('catalog:api_recommendations'))
+            return response['ETag'], [entry['id'] for entry in response.json()['recommendations']]
+
+        etag, item_ids = recommendations()
+        self.assertEqual(item_ids, [self.item.pk])
+
+        self.post_json('booking:add_to_cart', {'offer_id': self.unlimited.pk})
+        cart_etag, item_ids = recommendations()
+        self.assertEqual(item_ids, [])
+        self.assertNotEqual(cart_etag, etag)
+
+        self.post_json('booking:remove_from_cart', {'offer_id': self.unlimited.pk})
+        self.assertEqual(recommendations()[1], [self.item.pk])
+
+    def test_anonymous_cart_admin_pages(self):
+        cart = Cart.objects.create()
+        self.assertEqual(str(cart), f'Cart #{cart.pk} (anonymous)')
+        self.assertEqual(str(Cart.objects.create(user=self.customer)), f'Cart {self.customer}')
+        self.client.force_login(self.staff)
+        for name in ('admin:booking_cart_change', 'admin:booking_cart_delete'):
+            with self.subTest(name=name):
+                self.assertEqual(self.client.get(reverse(name, args=[cart.pk])).status_code, 200)
+
+
+class CheckoutTests(BookingTestData, TestCase):
+    def setUp(self):
+        self.client.login(username='customer', password='secret')
+        self.discounted = self.make_offer(quantity=5, price='9.99', discount=15)
+
+    def fill_cart(self):
+        self.post_json('booking:add_to_cart', {'offer_id': self.offer.pk, 'quantity': 2})
+        self.post_json('booking:add_to_cart', {'offer_id': self.discounted.pk, 'quantity': 3})
+        return Cart.objects.get(user=self.customer)
+
+    def checkout(self, **data):
+        form = {'delivery_type': 'delivery', 'delivery_address': 'Address', 'payment_method': 'cash'}
+        return self.client.post(reverse('booking:checkout'), {**form, **data})
+
+    def test_totals_use_rounded_unit_prices_and_the_delivery_fee(self):
+        self.fill_cart()
+        response = self.client.get(reverse('booking:checkout'))
+        # 2 x 10.00 + 3 x 8.49 (9.99 - 15%)
+        self.assertEqual(response.context['subtotal'], Decimal('45.47'))
+        self.assertEqual(response.context['total'], Decimal('50.47'))
+
+        response = self.checkout(expected_subtotal='45.47')
+        self.assertRedirects(response, reverse('booking:order_list'))
+        order = Order.objects.get()
+        self.assertEqual((order.delivery_fee, order.total_amount), (Decimal('5.00'), Decimal('50.47')))
+        self.assertEqual(
+            sorted(order.items.values_list('offer_id', 'quantity', 'price')),
+            [(self.offer.pk, 2, Decimal('10.00')), (self.discounted.pk, 3, Decimal('8.49'))],
+        )
+        self.assertFalse(Reservation.objects.exists())
+
+    def test_pickup_has_no_delivery_fee(self):
+        cart = self.fill_cart()
+        order = place_order(cart, Order(user=self.customer, order_number='A1', delivery_type='pickup',
+                                        payment_method='cash'))
+        self.assertEqual((order.delivery_fee, order.total_amount), (Decimal('0.00'), Decimal('45.47')))
+
+    def test_sold_units_stay_taken(self):
+        self.fill_cart()
+        self.checkout()
+        self.offer.refresh_from_db()
+        self.assertEqual((self.offer.quantity, self.offer.status), (0, 'sold_out'))
+
+    def test_empty_cart_is_refused(self):
+        response = self.checkout()
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Корзина пуста')
+        self.assertFalse(Order.objects.exists())
+
+    def test_changed_prices_are_refused(self):
+        cart = self.fill_cart()
+        Offer.objects.filter(pk=self.offer.pk).update(discount_percent=10)
+        response = self.checkout(expected_subtotal='45.47')
+        self.assertContains(response, 'Цены изменились')
+        self.assertFalse(Order.objects.exists())
+        self.assertEqual(cart.reservations.count(), 2)
+
+    def test_unavailable_offer_rolls_the_order_back(self):
+        cart = self.fill_cart()
+        Offer.objects.filter(pk=self.discounted.pk).update(is_active=False)
+        with self.assertRaisesMessage(CheckoutError, 'больше недоступно'):
+            place_order(cart, Order(user=self.customer, order_number='A1', delivery_type='delivery',
+                                    payment_method='cash'))
+        self.assertFalse(Order.objects.exists())
+        self.assertFalse(OrderItem.objects.exists())
+        # The cart keeps its reservations and their units stay taken
+        self.assertEqual(sorted(cart.reservations.values_list('offer_id', 'quantity')),
+                         [(self.offer.pk, 2), (self.discounted.pk, 3)])
+        self.offer.refresh_from_db()
+        self.assertEqual(self.offer.quantity, 0)
+
+
+class OrderNumberTests(TestCase):
+    PAYLOAD = '0MHCGXEWKRM00'
+
+    def number(self, payload):
+        return f'{PREFIX}{payload}{check_character(payload)}'
+
+    def test_a_changed_character_is_detected(self):
+        number = self.number(self.PAYLOAD)
+        self.assertTrue(is_valid_order_number(number))
+        for position in range(len(PREFIX), len(number)):
+            for char in ALPHABET.replace(number[position], ''):
+                changed = number[:position] + char + number[position + 1:]
+                self.assertFalse(is_valid_order_number(changed), changed)
+
+    def test_swapped_neighbours_are_detected(self):
+        for position in range(len(self.PAYLOAD)):
+            for first in ALPHABET:
+                for second in ALPHABET.replace(first, ''):
+                    payload = self.PAYLOAD[:position] + first + second + self.PAYLOAD[position + 2:]
+                    number = self.number(payload[:len(self.PAYLOAD)])
+                    at = len(PREFIX) + position
+                    swapped = number[:at] + number[at + 1] + number[at] + number[at + 2:]
+                    # Like 09/90 for the decimal Luhn check, 0Z/Z0 is the one swap it can not see
+                    if {number[at], number[at + 1]} != {'0', 'Z'}:
+                        self.assertFalse(is_valid_order_number(swapped), (number, swapped))
+
+    def test_numbers_increase_within_a_node(self):
+        # The same millisecond for a whole sequence and more, then the clock steps back
+        times = [1_800_000_000_000_000_000] * (MAX_SEQUENCE + 10) + [1_799_999_999_000_000_000] * 10
+        generator = OrderNumberGenerator(7, clock=iter(times).__next__)
+        numbers = [generator() for _ in times]
+        self.assertEqual(numbers, sorted(set(numbers)))
+
+    def test_nodes_do_not_share_numbers(self):
+        clock = lambda: 1_800_000_000_000_000_000
+        first, second = OrderNumberGenerator(default_node_id(), clock), OrderNumberGenerator(default_node_id(), clock)
+        self.assertNotEqual(first.node_id, second.node_id)
+        self.assertFalse({first() for _ in range(100)} & {second() for _ in range(100)})
+
+    def test_node_ids_are_claimed_in_turn(self):
+        first, second = default_node_id(), default_node_id()
+        self.assertEqual(second, (first + 1) % 2048)
+        self.assertEqual(OrderNodeClaim.objects.count(), 2)
+        with override_settings(BOOKING_ORDER_NODE_ID=5):
+            self.assertEqual(default_node_id(), 5)
+        self.assertEqual(OrderNodeClaim.objects.count(), 2)
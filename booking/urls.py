@@ -8,4 +8,7 @@ urlpatterns = [
     path('checkout/', views.CheckoutView.as_view(), name='checkout'),
     path('order/<int:pk>/', views.OrderDetailView.as_view(), name='order_detail'),
     path('orders/', views.OrderListView.as_view(), name='order_list'),
+    path('api/cart/', views.get_cart_api, name='cart_api'),
+    path('api/cart/add/', views.add_to_cart, name='add_to_cart'),
+    path('api/cart/remove/', views.remove_from_cart, name='remove_from_cart'),
 ]
@@ -4,12 +4,18 @@ from django.contrib.auth.mixins import LoginRequiredMixin
 from django.contrib import messages
 from django.views.generic import ListView, DetailView, CreateView, TemplateView
 from django.db import transaction
+from django.db.models import Prefetch
 from django.http import JsonResponse
 from django.urls import reverse_lazy
+from django.views.decorators.csrf import ensure_csrf_cookie
 from .models import Order, OrderItem
 from .forms import CheckoutForm, OrderSearchForm
+from .order_numbers import new_order_number
+from .checkout import DELIVERY_FEE, CheckoutError, cart_reservations, place_order, summarize
+from .reservations import ReservationError, cart_data, get_cart, release, reserve
 from catalog.models import Offer
-import uuid
+from foodsave.pagination import CursorPaginationMixin
+import json
 
 
 class CartView(TemplateView):
@@ -17,7 +23,8 @@ class CartView(TemplateView):
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        # Cart will be handled via JavaScript and localStorage for now
+        context['cart'] = cart_data(get_cart(self.request, create=False))
+        context['delivery_fee'] = DELIVERY_FEE
         return context
 
 
@@ -27,22 +34,33 @@ class CheckoutView(LoginRequiredMixin, CreateView):
     template_name = 'booking/checkout.html'
     success_url = reverse_lazy('booking:order_list')
     
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        lines, subtotal, fee, total = summarize(cart_reservations(get_cart(self.request, create=False)))
+        context.update({
+            'order_lines': [(reservation, price, price * reservation.quantity) for reservation, price in lines],
+            'subtotal': subtotal,
+            'delivery_fee': fee,
+            'total': total,
+        })
+        return context
+
     def form_valid(self, form):
         form.instance.user = self.request.user
-        form.instance.order_number = f"ORD-{uuid.uuid4().hex[:8].upper()}"
-        
-        # Calculate total amount (this would normally come from cart)
-        form.instance.total_amount = 0
-        form.instance.delivery_fee = 5.00  # Fixed delivery fee for now
-        
-        with transaction.atomic():
-            response = super().form_valid(form)
-            
-            # Here you would create OrderItems from cart data
-            # For now, we'll create a placeholder
-            
-            messages.success(self.request, f'Заказ {self.object.order_number} успешно создан!')
-            return response
+        form.instance.order_number = new_order_number()
+
+        try:
+            self.object = place_order(
+                get_cart(self.request, create=False),
+                form.instance,
+                expected_subtotal=form.cleaned_data.get('expected_subtotal')
+            )
+        except CheckoutError as e:
+            form.add_error(None, str(e))
+            return self.form_invalid(form)
+
+        messages.success(self.request, f'Заказ {self.object.order_number} успешно создан!')
+        return redirect(self.get_success_url())
 
 
 class OrderDetailView(LoginRequiredMixin, DetailView):
@@ -51,14 +69,99 @@ class OrderDetailView(LoginRequiredMixin, DetailView):
     context_object_name = 'order'
     
     def get_queryset(self):
-        return Order.objects.filter(user=self.request.user).prefetch_related('items__offer__item')
+        return Order.objects.filter(user=self.request.user).prefetch_related(
+            Prefetch('items', queryset=OrderItem.objects.select_related('offer__item__vendor'))
+        )
 
 
-class OrderListView(LoginRequiredMixin, ListView):
+class OrderListView(LoginRequiredMixin, CursorPaginationMixin, ListView):
     model = Order
     template_name = 'booking/order_list.html'
     context_object_name = 'orders'
     paginate_by = 10
     
     def get_queryset(self):
-        return Order.objects.filter(user=self.request.user).order_by('-created_at')
+        return Order.objects.filter(user=self.request.user).prefetch_related(
+            Prefetch('items', queryset=OrderItem.objects.select_related('offer__item'))
+        )
+
+
+@ensure_csrf_cookie
+def get_cart_api(request):
+    """API endpoint для получения серверной корзины; выдает CSRF cookie для изменений корзины"""
+    try:
+        return JsonResponse({
+            'success': True,
+            'cart': cart_data(get_cart(request, create=False))
+        })
+    except Exception as e:
+        return JsonResponse({
+            'success': False,
+            'error': str(e)
+        }, status=500)
+
+
+def add_to_cart(request):
+    """API endpoint для добавления предложения в корзину с резервированием"""
+    if request.method != 'POST':
+        return JsonResponse({'success': False, 'error': 'Метод не поддерживается'}, status=405)
+
+    try:
+        data = json.loads(request.body)
+        if not isinstance(data, dict):
+            raise TypeError
+        offer_id = int(data.get('offer_id', 0))
+        quantity = int(data.get('quantity', 1))
+    except (ValueError, TypeError):
+        return JsonResponse({'success': False, 'error': 'Неверные данные'}, status=400)
+
+    try:
+        cart = get_cart(request)
+        reserve(cart, offer_id, quantity)
+        return JsonResponse({
+            'success': True,
+            'cart': cart_data(cart)
+        })
+    except ReservationError as e:
+        # Товар закончился или зарезервирован другими покупателями
+        return JsonResponse({
+            'success': False,
+            'error': str(e)
+        }, status=409)
+    except Exception as e:
+        return JsonResponse({
+            'success': False,
+            'error': str(e)
+        }, status=500)
+
+
+def remove_from_cart(request):
+    """API endpoint для удаления предложения из корзины (освобождает резерв)"""
+    if request.method != 'POST':
+        return JsonResponse({'success': False, 'error': 'Метод не поддерживается'}, status=405)
+
+    try:
+        data = json.loads(request.body or '{}')
+        if not isinstance(data, dict):
+            raise TypeError
+        offer_id = data.get('offer_id')
+        quantity = data.get('quantity')
+        offer_id = int(offer_id) if offer_id is not None else None
+        quantity = int(quantity) if quantity is not None else None
+    except (ValueError, TypeError):
+        return JsonResponse({'success': False, 'error': 'Неверные данные'}, status=400)
+
+    try:
+        cart = get_cart(request, create=False)
+        if cart is not None:
+            # Без offer_id корзина очищается полностью
+            release(cart, offer_id, quantity)
+        return JsonResponse({
+            'success': True,
+            'cart': cart_data(cart)
+        })
+    except Exception as e:
+        return JsonResponse({
+            'success': False,
+            'error': str(e)
+        }, status=500)
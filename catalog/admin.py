@@ -1,7 +1,9 @@
 from django.contrib import admin
 from django.utils.html import format_html
 from django.utils import timezone
-from .models import Category, Item, ItemImage, Offer
+from .caching import invalidate_tags
+from .models import Category, Item, ItemImage, Offer, QuickSet
+from .quick_sets import refresh_quick_sets
 
 
 class ItemImageInline(admin.TabularInline):
@@ -75,12 +77,14 @@ class ItemAdmin(admin.ModelAdmin):
     actions = ['activate_items', 'deactivate_items']
     
     def activate_items(self, request, queryset):
-        updated = queryset.update(is_active=True)
+        updated = queryset.update(is_active=True, updated_at=timezone.now())
+        invalidate_tags('item')
         self.message_user(request, f'{updated} items were successfully activated.')
     activate_items.short_description = "Activate selected items"
     
     def deactivate_items(self, request, queryset):
-        updated = queryset.update(is_active=False)
+        updated = queryset.update(is_active=False, updated_at=timezone.now())
+        invalidate_tags('item')
         self.message_user(request, f'{updated} items were successfully deactivated.')
     deactivate_items.short_description = "Deactivate selected items"
 
@@ -139,27 +143,70 @@ class OfferAdmin(admin.ModelAdmin):
     
     actions = ['mark_as_expired', 'mark_as_available', 'mark_as_sold_out', 'activate_offers', 'deactivate_offers']
     
+    def update_offers(self, queryset, **fields):
+        # Bulk updates skip the signals that keep Item card data in sync
+        item_ids = list(queryset.values_list('item_id', flat=True).distinct())
+        updated = queryset.update(**fields, updated_at=timezone.now())
+        Item.objects.filter(pk__in=item_ids).refresh_card_data()
+        invalidate_tags('offer', 'item')
+        return updated
+    
     def mark_as_expired(self, request, queryset):
-        updated = queryset.update(status='expired')
+        updated = self.update_offers(queryset, status='expired')
         self.message_user(request, f'{updated} offers were marked as expired.')
     mark_as_expired.short_description = "Mark selected offers as expired"
     
     def mark_as_available(self, request, queryset):
-        updated = queryset.update(status='available')
+        updated = self.update_offers(queryset, status='available')
         self.message_user(request, f'{updated} offers were marked as available.')
     mark_as_available.short_description = "Mark selected offers as available"
     
     def mark_as_sold_out(self, request, queryset):
-        updated = queryset.update(status='sold_out')
+        updated = self.update_offers(queryset, status='sold_out')
         self.message_user(request, f'{updated} offers were marked as sold out.')
     mark_as_sold_out.short_description = "Mark selected offers as sold out"
     
     def activate_offers(self, request, queryset):
-        updated = queryset.update(is_active=True)
+        updated = self.update_offers(queryset, is_active=True)
         self.message_user(request, f'{updated} offers were activated.')
     activate_offers.short_description = "Activate selected offers"
     
     def deactivate_offers(self, request, queryset):
-        updated = queryset.update(is_active=False)
+        updated = self.update_offers(queryset, is_active=False)
         self.message_user(request, f'{updated} offers were deactivated.')
     deactivate_offers.short_description = "Deactivate selected offers"
+
+
+@admin.register(QuickSet)
+class QuickSetAdmin(admin.ModelAdmin):
+    list_display = ('name', 'slug', 'order', 'max_items', 'min_discount', 'is_active', 'items_count', 'refreshed_at')
+    list_filter = ('is_active',)
+    search_fields = ('name', 'slug', 'category_keyword')
+    prepopulated_fields = {'slug': ('name',)}
+    filter_horizontal = ('categories',)
+    
+    fieldsets = (
+        ('Basic Information', {
+            'fields': ('name', 'slug', 'description', 'order', 'is_active')
+        }),
+        ('Rules', {
+            'fields': ('categories', 'category_keyword', 'tags', 'min_discount', 'max_items')
+        }),
+        ('Materialized Items', {
+            'fields': ('items_data', 'refreshed_at'),
+            'classes': ('collapse',)
+        }),
+    )
+    
+    readonly_fields = ('items_data', 'refreshed_at')
+    
+    def items_count(self, obj):
+        return len(obj.items_data)
+    items_count.short_description = "Items"
+    
+    actions = ['refresh_sets']
+    
+    def refresh_sets(self, request, queryset):
+        refreshed = refresh_quick_sets(queryset, force=True)
+        self.message_user(request, f'{len(refreshed)} quick sets were refreshed.')
+    refresh_sets.short_description = "Refresh selected quick sets"
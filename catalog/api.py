@@ -0,0 +1,274 @@
+"""Read-only catalog API, version 1 (``/catalog/api/v1/``).
+
+``items``, ``offers``, ``vendors`` and ``branches`` are listed in keyset
+pages (``?cursor=``, ``?limit=``). Rows refer to related objects by id;
+every vendor, category, branch or item they refer to is sent once per
+response in ``included``, and unit codes are resolved in
+``included['units']``::
+
+    {"success": true, "data": [{"id": 7, "vendor_id": 3, ...}],
+     "included": {"vendors": {"3": {...}}, "units": {"kg": "Kilograms"}},
+     "next_cursor": "..."}
+
+``?fields=id,title`` limits the fields of rows and ``?fields[vendors]=name``
+those of a side table (a short summary by default); a side table is only
+sent when a selected field refers to it. Responses are validated against the catalog cache tag
+versions (``catalog.conditional``), so revalidation gets a 304 before any
+query runs.
+Bodies are encoded with orjson when it is installed.
+"""
+import json
+from dataclasses import dataclass
+from typing import Callable
+
+from django.http import Http404, HttpResponse, JsonResponse
+from django.views.decorators.http import require_safe
+
+from foodsave.pagination import CursorPaginator, InvalidCursor
+from vendors.models import Branch, Vendor
+from .caching import CATALOG_TAGS
+from .conditional import conditional
+from .models import Category, Item, Offer
+
+try:
+    import orjson
+except ImportError:  # optional, only makes encoding faster
+    orjson = None
+
+API_VERSION = 1
+PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+
+def encode(payload):
+    if orjson is not None:
+        return orjson.dumps(payload)
+    return json.dumps(payload, ensure_ascii=False, separators=(',', ':')).encode()
+
+
+def money(value):
+    return float(value) if value is not None else None
+
+
+def isoformat(value):
+    return value.isoformat() if value is not None else None
+
+
+@dataclass
+class Field:
+    columns: tuple                 # model fields the value is read from
+    get: Callable                  # obj -> JSON value
+
+
+def column(name, convert=None):
+    if convert is None:
+        return Field((name,), lambda obj: getattr(obj, name))
+    return Field((name,), lambda obj: convert(getattr(obj, name)))
+
+
+@dataclass
+class Resource:
+    model: type
+    fields: dict                   # name -> Field
+    queryset: Callable             # request -> QuerySet of listed rows
+    ordering: tuple = ('-created_at', '-id')
+    summary: tuple = ()            # default fields in side tables
+
+    def parse_fields(self, value, default=None):
+        """Requested field names (``default`` or all when ``value`` is empty); raises ValueError on unknown ones"""
+        if not value:
+            return ['id', *default] if default else list(self.fields)
+        names = [name for name in value.split(',') if name]
+        unknown = set(names) - set(self.fields)
+        if unknown:
+            raise ValueError(f"Неизвестные поля: {', '.join(sorted(unknown))}. Доступны: {', '.join(self.fields)}")
+        return ['id'] + [name for name in names if name != 'id']
+
+    def columns(self, names):
+        """Model fields to load; the ordering is read for cursors even when not requested"""
+        ordering = (name.lstrip('-') for name in self.ordering)
+        return {'id', *ordering, *(column for name in names for column in self.fields[name].columns)}
+
+    def row(self, obj, names):
+        return {name: self.fields[name].get(obj) for name in names}
+
+
+def ids_filter(request):
+    if not request.GET.get('ids'):
+        return {}
+    return {'pk__in': [int(pk) for pk in request.GET['ids'].split(',') if pk]}
+
+
+def items_queryset(request):
+    queryset = Item.objects.filter(is_active=True, vendor__is_active=True, **ids_filter(request))
+    if request.GET.get('category'):
+        queryset = queryset.filter(category__slug=request.GET['category'])
+    if request.GET.get('vendor'):
+        queryset = queryset.filter(vendor_id=int(request.GET['vendor']))
+    vendor_type = request.GET.get('type')
+    if vendor_type == 'products':
+        queryset = queryset.filter(vendor__type='store')
+    elif vendor_type == 'dishes':
+        queryset = queryset.filter(vendor__type__in=['restaurant', 'cafe'])
+    return queryset
+
+
+def offers_queryset(request):
+    queryset = Offer.objects.live().filter(**ids_filter(request))
+    if request.GET.get('item'):
+        queryset = queryset.filter(item_id=int(request.GET['item']))
+    if request.GET.get('vendor'):
+        queryset = queryset.filter(item__vendor_id=int(request.GET['vendor']))
+    if request.GET.get('category'):
+        queryset = queryset.filter(item__category__slug=request.GET['category'])
+    return queryset
+
+
+def vendors_queryset(request):
+    queryset = Vendor.objects.filter(is_active=True, **ids_filter(request))
+    if request.GET.get('type'):
+        queryset = queryset.filter(type=request.GET['type'])
+    return queryset
+
+
+def branches_queryset(request):
+    queryset = Branch.objects.filter(is_active=True, vendor__is_active=True, **ids_filter(request))
+    if request.GET.get('vendor'):
+        queryset = queryset.filter(vendor_id=int(request.GET['vendor']))
+    return queryset
+
+
+RESOURCES = {
+    'items': Resource(Item, {
+        'id': column('id'),
+        'title': column('title'),
+        'description': column('description'),
+        'unit': column('unit'),
+        'vendor_id': column('vendor_id'),
+        'branch_id': column('branch_id'),
+        'category_id': column('category_id'),
+        'image_url': column('primary_image_url'),
+        'best_price': column('best_price', money),
+        'max_discount': column('max_discount'),
+        'offers_count': column('active_offers_count'),
+        'created_at': column('created_at', isoformat),
+    }, items_queryset, summary=('title', 'unit', 'vendor_id', 'category_id', 'image_url')),
+    'offers': Resource(Offer, {
+        'id': column('id'),
+        'item_id': column('item_id'),
+        'branch_id': column('branch_id'),
+        'original_price': column('original_price', money),
+        'current_price': Field(('original_price', 'discount_percent'), lambda offer: money(offer.current_price)),
+        'discount_percent': column('discount_percent'),
+        'quantity': column('quantity'),
+        'start_date': column('start_date', isoformat),
+        'end_date': column('end_date', isoformat),
+        'created_at': column('created_at', isoformat),
+    }, offers_queryset),
+    'vendors': Resource(Vendor, {
+        'id': column('id'),
+        'name': column('name'),
+        'type': column('type'),
+        'description': column('description'),
+        'logo_url': Field(('logo',), lambda vendor: vendor.logo.url if vendor.logo else None),
+        'rating': column('rating'),
+        'created_at': column('created_at', isoformat),
+    }, vendors_queryset, summary=('name', 'type', 'logo_url')),
+    'branches': Resource(Branch, {
+        'id': column('id'),
+        'vendor_id': column('vendor_id'),
+        'name': column('name'),
+        'address': column('address'),
+        'phone': column('phone'),
+        'latitude': column('latitude'),
+        'longitude': column('longitude'),
+        'opening_hours': column('opening_hours'),
+    }, branches_queryset, ordering=('-id',), summary=('vendor_id', 'name', 'address', 'latitude', 'longitude')),
+    'categories': Resource(Category, {
+        'id': column('id'),
+        'name': column('name'),
+        'slug': column('slug'),
+        'icon_url': Field(('icon',), lambda category: category.icon.url if category.icon else None),
+    }, lambda request: Category.objects.filter(is_active=True), ordering=('id',), summary=('name', 'slug')),
+}
+
+# Row fields that refer to a side table
+REFERENCES = {
+    'item_id': 'items',
+    'vendor_id': 'vendors',
+    'branch_id': 'branches',
+    'category_id': 'categories',
+}
+
+UNITS = dict(Item.UNIT_CHOICES)
+
+
+def side_tables(rows, names, table_names, included):
+    """Add the objects ``rows`` refer to, and those they refer to in turn, to ``included``"""
+    pending = [(rows, names)]
+    while pending:
+        rows, names = pending.pop()
+        if 'unit' in names:
+            units = included.setdefault('units', {})
+            for row in rows:
+                units[row['unit']] = UNITS.get(row['unit'], row['unit'])
+        for field, table in REFERENCES.items():
+            if field not in names:
+                continue
+            resource = RESOURCES[table]
+            known = included.setdefault(table, {})
+            ids = {row[field] for row in rows if row[field] is not None} - {int(pk) for pk in known}
+            if not ids:
+                continue
+            objects = resource.model._default_manager.filter(pk__in=ids).only(*resource.columns(table_names[table]))
+            new_rows = [resource.row(obj, table_names[table]) for obj in objects]
+            for row in new_rows:
+                known[str(row['id'])] = row
+            pending.append((new_rows, table_names[table]))
+    return {table: rows for table, rows in included.items() if rows}
+
+
+@require_safe
+@conditional(tags=CATALOG_TAGS, per_user=False)
+def catalog_api(request, resource):
+    """API endpoint каталога v1: страница объектов ресурса с таблицами связанных объектов"""
+    if resource not in RESOURCES:
+        raise Http404('Неизвестный ресурс')
+    try:
+        resource_def = RESOURCES[resource]
+        try:
+            names = resource_def.parse_fields(request.GET.get('fields'))
+            table_names = {
+                table: RESOURCES[table].parse_fields(request.GET.get(f'fields[{table}]'), RESOURCES[table].summary)
+                for table in REFERENCES.values()
+            }
+            limit = min(int(request.GET.get('limit', PAGE_SIZE)), MAX_PAGE_SIZE)
+            if limit <= 0:
+                raise ValueError('limit должен быть положительным')
+            queryset = resource_def.queryset(request).only(*resource_def.columns(names))
+            page = CursorPaginator(queryset, limit, resource_def.ordering).page(request.GET.get('cursor'))
+        except InvalidCursor:
+            return JsonResponse({
+                'success': False,
+                'error': 'Неверный курсор страницы'
+            }, status=400)
+        except ValueError as e:
+            return JsonResponse({
+                'success': False,
+                'error': str(e)
+            }, status=400)
+
+        rows = [resource_def.row(obj, names) for obj in page]
+        return HttpResponse(encode({
+            'success': True,
+            'version': API_VERSION,
+            'data': rows,
+            'included': side_tables(rows, names, table_names, {}),
+            'next_cursor': page.next_cursor,
+        }), content_type='application/json')
+
+    except Exception as e:
+        return JsonResponse({
+            'success': False,
+            'error': str(e)
+        }, status=500)
@@ -0,0 +1,114 @@
+"""Tag-versioned caching for catalog data.
+
+Cached values are stored under keys that embed the current version of each
+tag they depend on (``offer``, ``item``, ``category``, ``vendor``). Changing a
+model bumps its tag version from ``catalog.signals``, so every dependent key
+stops matching at once and old entries simply age out of the cache.
+
+Versions are bumped when the writing transaction commits: a reader that saw
+the new version before then could cache the old rows under it.
+
+Versions live in the ``default`` cache. The default LocMemCache is private to
+each process, so other worker processes keep serving their entries for up to
+``CATALOG_CACHE_TIMEOUT`` seconds after a change; deployments with several
+workers need a shared backend (``FOODSAVE_CACHE=file``, Redis, Memcached).
+"""
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.dispatch import Signal
+
+CACHE_TIMEOUT = getattr(settings, 'CATALOG_CACHE_TIMEOUT', 300)
+
+# Tags of everything that can change a catalog listing
+CATALOG_TAGS = ('offer', 'item', 'category', 'vendor')
+
+_MISSING = object()
+
+_stats = defaultdict(lambda: {'hits': 0, 'misses': 0})
+
+
+def tag_key(tag):
+    return f'catalog:tag:{tag}'
+
+
+def tag_versions(tags):
+    """Return a token combining the current versions of ``tags``"""
+    keys = [tag_key(tag) for tag in tags]
+    versions = cache.get_many(keys)
+    missing = {key: time.time_ns() for key in keys if key not in versions}
+    if missing:
+        # A fresh version never matches entries written before the tag was evicted
+        cache.set_many(missing, None)
+        versions.update(missing)
+    return '.'.join(str(versions[key]) for key in keys)
+
+
+# Sent with ``tags`` once their versions were bumped, i.e. after the change committed
+tags_invalidated = Signal()
+
+
+def bump_tags(tags):
+    version = time.time_ns()
+    cache.set_many({tag_key(tag): version for tag in tags}, None)
+    tags_invalidated.send(sender=None, tags=tags)
+
+
+def invalidate_tags(*tags):
+    """Bump the versions of ``tags`` once the current transaction commits (at once outside a transaction)"""
+    transaction.on_commit(lambda: bump_tags(tags))
+
+
+def versioned_key(name, tags, key=''):
+    return f'catalog:cached:{name}:{key}:{tag_versions(tags)}'
+
+
+def record_hit(name):
+    """Count a hit served from a caller's own in-process copy"""
+    _stats[name]['hits'] += 1
+
+
+def get_or_build(name, cache_key, builder, timeout=None):
+    """Return the cached value under ``cache_key``, building and storing it on a miss"""
+    value = cache.get(cache_key, _MISSING)
+    if value is _MISSING:
+        _stats[name]['misses'] += 1
+        value = builder()
+        cache.set(cache_key, value, CACHE_TIMEOUT if timeout is None else timeout)
+    else:
+        _stats[name]['hits'] += 1
+    return value
+
+
+def cached(name, tags, builder, timeout=None, key=''):
+    """Cache ``builder()`` until one of ``tags`` is invalidated or ``timeout`` passes"""
+    return get_or_build(name, versioned_key(name, tags, key), builder, timeout)
+
+
+def active_categories():
+    """Active categories for listing sidebars and filters"""
+    from .models import Category
+
+    return cached('active_categories', ('category',), lambda: list(Category.objects.filter(is_active=True)))
+
+
+def hit_ratio(hits, misses):
+    return round(hits / (hits + misses), 4) if hits + misses else None
+
+
+def cache_stats():
+    """Hit/miss counters of this process, per cached value and in total"""
+    hits = sum(counters['hits'] for counters in _stats.values())
+    misses = sum(counters['misses'] for counters in _stats.values())
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_ratio': hit_ratio(hits, misses),
+        'entries': {
+            name: {**counters, 'hit_ratio': hit_ratio(counters['hits'], counters['misses'])}
+            for name, counters in _stats.items()
+        },
+    }
@@ -0,0 +1,128 @@
+"""Conditional GET and Cache-Control for catalog pages and APIs.
+
+``conditional`` wraps a view so that a request carrying ``If-None-Match`` or
+``If-Modified-Since`` gets a 304 when nothing it shows has changed, before
+the view renders anything. Freshness comes from
+
+* a ``last_modified`` function: one aggregate over ``updated_at`` of the
+  items, offers and vendors a page shows, and/or
+* catalog cache ``tags`` (see ``catalog.caching``): their versions go into
+  the ETag and the newest version counts as a modification time, so
+  tag-only views answer 304 without a query. Tags catch what an aggregate
+  can not see, e.g. rows that left the page.
+
+The ETag also covers the path, the user and the date (live offers change at
+midnight). Responses are ``private`` for signed-in users; anonymous ones are
+``public`` and a shared cache may keep them ``CATALOG_SHARED_MAX_AGE``
+seconds. Browsers always revalidate.
+"""
+import hashlib
+from datetime import datetime, time as day_start, timezone as dt_timezone
+from functools import wraps
+
+from django.conf import settings
+from django.contrib.messages import get_messages
+from django.db.models import Max
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+
+from vendors.models import Vendor
+from .caching import tag_versions
+from .models import Item
+
+SHARED_MAX_AGE = getattr(settings, 'CATALOG_SHARED_MAX_AGE', 30)
+
+
+def latest(*values):
+    values = [value for value in values if value is not None]
+    return max(values) if values else None
+
+
+def item_last_modified(request, pk):
+    """Newest change of an item, its offers and its vendor (one query)"""
+    row = Item.objects.filter(pk=pk).aggregate(
+        item=Max('updated_at'), offer=Max('offers__updated_at'), vendor=Max('vendor__updated_at'),
+    )
+    return latest(*row.values())
+
+
+def category_last_modified(request, category_slug):
+    """Newest change of the items of a category, their offers and vendors (one query).
+
+    Deactivated items count too; items moved to another category are only
+    seen through the ``item`` tag (see ``CategoryView``).
+    """
+    row = Item.objects.filter(category__slug=category_slug).aggregate(
+        item=Max('updated_at'), offer=Max('offers__updated_at'), vendor=Max('vendor__updated_at'),
+    )
+    return latest(*row.values())
+
+
+def vendor_last_modified(request, pk):
+    """Newest change of a vendor, its items and their offers (one query)"""
+    row = Vendor.objects.filter(pk=pk).aggregate(
+        vendor=Max('updated_at'), item=Max('items__updated_at'), offer=Max('items__offers__updated_at'),
+    )
+    return latest(*row.values())
+
+
+def tags_modified(versions):
+    """Newest tag version (nanosecond timestamps) as a datetime"""
+    newest = max(int(version) for version in versions.split('.'))
+    return datetime.fromtimestamp(newest / 1e9, tz=dt_timezone.utc)
+
+
+def conditional(last_modified=None, tags=(), per_user=True, vary_on=None, private=False):
+    """Decorator adding ETag/Last-Modified validation and a Cache-Control policy.
+
+    ``per_user`` is for pages that render the signed-in user (the navbar);
+    APIs that do not can share one response between users. ``vary_on(request)``
+    returns other request state the response depends on (e.g. the session
+    cart); ``private`` forbids shared caches even for anonymous users.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            # Flash messages are shown once, by a full render
+            if request.method not in ('GET', 'HEAD') or len(get_messages(request)):
+                return view(request, *args, **kwargs)
+
+            versions = tag_versions(tags) if tags else ''
+            modified = last_modified(request, *args, **kwargs) if last_modified else None
+            if last_modified and modified is None:
+                # Missing object: let the view answer (usually 404)
+                return view(request, *args, **kwargs)
+            if versions:
+                modified = latest(modified, tags_modified(versions))
+            today = timezone.localdate()
+            modified = latest(modified, timezone.make_aware(datetime.combine(today, day_start.min)))
+
+            user = request.user.pk if per_user and request.user.is_authenticated else ''
+            source = ':'.join([
+                request.get_full_path(), str(user), today.isoformat(), modified.isoformat(), versions,
+                vary_on(request) if vary_on else '',
+            ])
+            etag = quote_etag(hashlib.md5(source.encode()).hexdigest())
+            timestamp = int(modified.timestamp())
+
+            response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+            if response is None:
+                response = view(request, *args, **kwargs)
+                if response.status_code != 200:
+                    return response
+                response.headers.setdefault('ETag', etag)
+                response.headers.setdefault('Last-Modified', http_date(timestamp))
+            else:
+                response.headers['ETag'] = etag
+                response.headers['Last-Modified'] = http_date(timestamp)
+
+            if private or user:
+                patch_cache_control(response, private=True, max_age=0, must_revalidate=True)
+            else:
+                patch_cache_control(response, public=True, max_age=0, s_maxage=SHARED_MAX_AGE, must_revalidate=True)
+            if per_user:
+                patch_vary_headers(response, ('Cookie',))
+            return response
+        return wrapper
+    return decorator
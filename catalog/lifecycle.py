@@ -0,0 +1,120 @@
+"""Offer lifecycle transitions.
+
+``run_lifecycle`` moves offers to ``expired`` once their ``end_date`` has
+passed and to ``sold_out`` when their limited stock is gone, with one
+set-based ``UPDATE`` per transition and batch, so read paths can rely on
+``status`` instead of re-checking dates. It runs from the
+``update_offer_statuses`` command or, with ``CATALOG_LIFECYCLE_INTERVAL``
+set, from a background thread that the WSGI/ASGI entry points start in each
+web process.
+
+Offers normally sell out the moment their last unit is reserved (see
+``booking.reservations``). Since ``quantity == 0`` also means unlimited, the
+sold-out pass only catches available offers at zero stock whose units are
+all held in carts, e.g. after an admin marked them available again.
+"""
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .caching import invalidate_tags
+from .models import Item, Offer
+from .quick_sets import refresh_quick_sets
+
+logger = logging.getLogger(__name__)
+
+LIFECYCLE_INTERVAL = getattr(settings, 'CATALOG_LIFECYCLE_INTERVAL', 0)
+
+BATCH_SIZE = 1000
+
+
+def transitions(today):
+    """Target status and the offers that move to it"""
+    return [
+        ('expired', Offer.objects.filter(end_date__lt=today).exclude(status='expired')),
+        ('sold_out', Offer.objects.filter(
+            Q(end_date__isnull=True) | Q(end_date__gte=today),
+            status='available',
+            quantity=0,
+            reservations__holds_stock=True,
+        )),
+    ]
+
+
+def apply_transition(offers, status, batch_size=BATCH_SIZE):
+    """Set ``status`` on ``offers`` in batches; returns the number of offers and the touched item ids"""
+    updated = 0
+    item_ids = set()
+    while True:
+        with transaction.atomic():
+            batch = list(offers.values_list('pk', 'item_id').distinct()[:batch_size])
+            if not batch:
+                break
+            # The filter is repeated so offers changed meanwhile are left alone
+            updated += offers.filter(pk__in=[pk for pk, item_id in batch]).update(status=status, updated_at=timezone.now())
+            item_ids.update(item_id for pk, item_id in batch)
+        if len(batch) < batch_size:
+            break
+    return updated, item_ids
+
+
+def run_lifecycle(today=None, batch_size=BATCH_SIZE):
+    """Apply all transitions; returns the number of offers moved per status"""
+    today = today or timezone.now().date()
+    counts = {}
+    item_ids = set()
+    for status, offers in transitions(today):
+        counts[status], touched = apply_transition(offers, status, batch_size)
+        item_ids |= touched
+
+    if item_ids:
+        # Bulk updates skip the signals that keep Item card data in sync
+        Item.objects.filter(pk__in=item_ids).refresh_card_data()
+        invalidate_tags('offer', 'item')
+    # Also picks up offers that started today, which change no row
+    refresh_quick_sets()
+    return counts
+
+
+class LifecycleScheduler(threading.Thread):
+    """Daemon thread running ``run_lifecycle`` every ``interval`` seconds"""
+
+    def __init__(self, interval):
+        super().__init__(name='offer-lifecycle', daemon=True)
+        self.interval = interval
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            started = time.monotonic()
+            try:
+                counts = run_lifecycle()
+                logger.info('Offer lifecycle: %s in %.2fs', counts, time.monotonic() - started)
+            except Exception:
+                logger.exception('Offer lifecycle run failed')
+            finally:
+                close_old_connections()
+
+    def stop(self):
+        self.stopped.set()
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def start_scheduler(interval=LIFECYCLE_INTERVAL):
+    """Start the background scheduler once per process; does nothing when ``interval`` is 0"""
+    global _scheduler
+    if not interval:
+        return None
+    with _scheduler_lock:
+        if _scheduler is None or not _scheduler.is_alive():
+            _scheduler = LifecycleScheduler(interval)
+            _scheduler.start()
+    return _scheduler
@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from foodsave.bundle import BUNDLE_DIR, MIN_LINES, build, stale_templates
+
+
+class Command(BaseCommand):
+    help = 'Build the template bundle: large inline <style>/<script> blocks moved into hashed static files'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--min-lines', type=int, default=MIN_LINES,
+                            help='Smallest inline block moved out, in lines')
+        parser.add_argument('--check', action='store_true',
+                            help='Only fail if the bundle is missing or older than the source templates')
+
+    def handle(self, *args, **options):
+        if options['check']:
+            stale = stale_templates()
+            if stale is None:
+                raise CommandError(f'No template bundle in {BUNDLE_DIR}')
+            if stale:
+                raise CommandError(f'Template bundle is out of date for: {", ".join(stale)}')
+            self.stdout.write(self.style.SUCCESS('Template bundle is up to date'))
+            return
+
+        rewritten = build(min_lines=options['min_lines'])
+        total = 0
+        for name, assets in sorted(rewritten.items()):
+            size = sum(len(asset.content.encode()) for asset in assets)
+            total += size
+            self.stdout.write(f'{name}: {len(assets)} blocks, {size / 1024:.1f} KiB moved out')
+        self.stdout.write(self.style.SUCCESS(
+            f'Template bundle written to {BUNDLE_DIR}: {len(rewritten)} templates, {total / 1024:.1f} KiB of assets; '
+            'run collectstatic to publish them'
+        ))
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from catalog.models import Item
+
+
+class Command(BaseCommand):
+    help = 'Recompute denormalized item card data (primary image, best price, discounts, offer counts)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Items refreshed per batch')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        item_ids = list(Item.objects.order_by('id').values_list('id', flat=True))
+        refreshed = 0
+        for start in range(0, len(item_ids), batch_size):
+            refreshed += Item.objects.filter(pk__in=item_ids[start:start + batch_size]).refresh_card_data()
+        self.stdout.write(self.style.SUCCESS(f'Card data refreshed for {refreshed} items'))
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from catalog.search import get_search_backend
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the catalog full-text search index from scratch'
+
+    def handle(self, *args, **options):
+        backend = get_search_backend()
+        backend.create_index()
+        backend.rebuild()
+        self.stdout.write(self.style.SUCCESS(f'Search index rebuilt ({type(backend).__name__})'))
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from catalog.quick_sets import refresh_quick_sets
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the materialized items of all active quick sets'
+
+    def handle(self, *args, **options):
+        for quick_set in refresh_quick_sets(force=True):
+            self.stdout.write(f'{quick_set.slug}: {len(quick_set.items_data)} items')
+        self.stdout.write(self.style.SUCCESS('Quick sets refreshed'))
@@ -0,0 +1,314 @@
+"""Generate a production-scale synthetic dataset for performance work.
+
+Rows are written with ``bulk_create`` in chunks of ``--batch-size``. Every
+chunk draws from its own ``random.Random`` seeded with ``--seed``, the phase
+and the chunk number, so the same options always produce the same data,
+however the chunks are spread over ``--workers`` processes.
+
+Phases run in dependency order (users, vendors, branches, items, offers
+with images and card data, orders, notifications); the chunks of a phase run
+in parallel when ``--workers`` is above 1. SQLite allows one writer at a
+time, so it always loads with one worker.
+"""
+import multiprocessing
+import random
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections, transaction
+
+from booking.models import Order, OrderItem
+from booking.order_numbers import new_order_number
+from catalog.caching import invalidate_tags
+from catalog.models import Category, Item, ItemImage, Offer
+from catalog.search import get_search_backend
+from notifications.models import Notification
+from vendors.geo import grid_cell
+from vendors.models import Branch, Vendor
+
+# (name, latitude, longitude, share of vendors and users)
+CITIES = [
+    ('Tashkent', 41.311, 69.279, 0.55),
+    ('Samarkand', 39.654, 66.975, 0.15),
+    ('Namangan', 40.998, 71.672, 0.1),
+    ('Andijan', 40.783, 72.344, 0.1),
+    ('Bukhara', 39.768, 64.455, 0.1),
+]
+DISTRICTS_PER_CITY = 12
+
+CATEGORIES = [
+    ('Молочные продукты', 'dairy'), ('Хлеб и выпечка', 'bakery'), ('Мясо и птица', 'meat'),
+    ('Овощи и фрукты', 'vegetables'), ('Готовые блюда', 'dishes'), ('Напитки', 'drinks'),
+    ('Десерты', 'desserts'), ('Бакалея', 'grocery'),
+]
+TITLES = ['Молоко', 'Кефир', 'Сыр', 'Творог', 'Хлеб', 'Лепёшка', 'Багет', 'Курица', 'Говядина', 'Яблоки',
+          'Помидоры', 'Плов', 'Лагман', 'Самса', 'Сок', 'Чай', 'Торт', 'Печенье', 'Рис', 'Макароны']
+NOTIFICATION_TYPES = [choice for choice, label in Notification.TYPE_CHOICES]
+
+# Offers orders are drawn from; keeps the order phase from loading every offer
+ORDER_OFFER_POOL = 100000
+
+# Per-phase inputs, set in the parent before worker processes are forked
+_shared = {}
+
+
+def chunk_random(seed, phase, index):
+    return random.Random(f'{seed}:{phase}:{index}')
+
+
+def pick_city(rnd):
+    return rnd.choices(CITIES, weights=[city[3] for city in CITIES])[0]
+
+
+def point_in_city(rnd, city):
+    """A point in one of the city's districts, so branches form realistic clusters"""
+    district = random.Random(f'{city[0]}:{rnd.randrange(DISTRICTS_PER_CITY)}')
+    latitude = city[1] + district.gauss(0, 0.04) + rnd.gauss(0, 0.006)
+    longitude = city[2] + district.gauss(0, 0.05) + rnd.gauss(0, 0.008)
+    return latitude, longitude
+
+
+def load_users(seed, index, start, count):
+    rnd = chunk_random(seed, 'users', index)
+    users = []
+    for number in range(start, start + count):
+        latitude, longitude = point_in_city(rnd, pick_city(rnd))
+        users.append(get_user_model()(
+            username=f"{_shared['prefix']}{number}", password=_shared['password'],
+            first_name=rnd.choice(['Азиз', 'Дилноза', 'Тимур', 'Мадина', 'Руслан', 'Нигора']),
+            role='vendor' if number % _shared['vendor_every'] == 0 else 'customer',
+            latitude=latitude, longitude=longitude,
+        ))
+    get_user_model().objects.bulk_create(users)
+    return len(users)
+
+
+def load_vendors(seed, index, start, count):
+    rnd = chunk_random(seed, 'vendors', index)
+    owners = _shared['owners']
+    vendors = [
+        Vendor(owner_id=owners[number % len(owners)], type=rnd.choice(['store', 'restaurant', 'cafe']),
+               name=f"{_shared['vendor_prefix']}{number}", rating=round(rnd.uniform(3, 5), 1))
+        for number in range(start, start + count)
+    ]
+    Vendor.objects.bulk_create(vendors)
+    return len(vendors)
+
+
+def load_branches(seed, index, vendor_ids):
+    rnd = chunk_random(seed, 'branches', index)
+    branches = []
+    for vendor_id in vendor_ids:
+        city = pick_city(rnd)
+        for number in range(_shared['branches']):
+            latitude, longitude = point_in_city(rnd, city)
+            branches.append(Branch(
+                vendor_id=vendor_id, name=f'{city[0]} #{number + 1}', address=f'{city[0]}, street {rnd.randint(1, 300)}',
+                phone=f'+99890{rnd.randint(1000000, 9999999)}', latitude=latitude, longitude=longitude,
+                geo_cell=grid_cell(latitude, longitude),
+            ))
+    Branch.objects.bulk_create(branches)
+    return len(branches)
+
+
+def load_items(seed, index, branches):
+    rnd = chunk_random(seed, 'items', index)
+    categories = _shared['categories']
+    items = [
+        Item(vendor_id=vendor_id, branch_id=branch_id, category_id=rnd.choice(categories),
+             title=f'{rnd.choice(TITLES)} {rnd.choice(["", "свежий", "домашний", "фермерский"])}'.strip(),
+             description='Свежий продукт по сниженной цене. ' * rnd.randint(1, 4),
+             unit=rnd.choice(['pcs', 'kg', 'portion', 'liter']),
+             tags=rnd.sample(['halal', 'vegetarian', 'organic', 'local'], rnd.randint(0, 2)))
+        for branch_id, vendor_id in branches for _ in range(_shared['items'])
+    ]
+    Item.objects.bulk_create(items)
+    return len(items)
+
+
+def load_offers(seed, index, items):
+    rnd = chunk_random(seed, 'offers', index)
+    today = date.today()
+    offers = []
+    images = []
+    for item_id, branch_id in items:
+        for _ in range(_shared['offers']):
+            start = today - timedelta(days=rnd.randint(0, 10))
+            offers.append(Offer(
+                item_id=item_id, branch_id=branch_id, original_price=Decimal(rnd.randint(5, 300) * 1000),
+                discount_percent=rnd.choice([10, 15, 20, 30, 40, 50, 70]),
+                quantity=rnd.choice([0, 0, 5, 10, 50]), start_date=start,
+                end_date=start + timedelta(days=rnd.randint(1, 14)) if rnd.random() < 0.8 else None,
+            ))
+        images.extend(
+            ItemImage(item_id=item_id, image=f'item_images/load-{rnd.randint(1, 500)}.jpg', is_primary=number == 0,
+                      order=number)
+            for number in range(_shared['images'])
+        )
+    with transaction.atomic():
+        Offer.objects.bulk_create(offers)
+        ItemImage.objects.bulk_create(images)
+        # bulk_create skips the signals that maintain the denormalized card columns
+        Item.objects.filter(pk__in=[item_id for item_id, branch_id in items]).refresh_card_data()
+    return len(offers)
+
+
+def load_orders(seed, index, start, count):
+    rnd = chunk_random(seed, 'orders', index)
+    customers = _shared['customers']
+    offers = _shared['offers']
+    orders = [
+        Order(user_id=rnd.choice(customers), order_number=new_order_number(), total_amount=Decimal('0.00'),
+              delivery_type=rnd.choice(['delivery', 'pickup']), payment_method=rnd.choice(['card', 'cash']),
+              status=rnd.choice(['pending', 'confirmed', 'delivered', 'delivered', 'cancelled']))
+        for _ in range(count)
+    ]
+    lines = []
+    for order in orders:
+        for offer_id, price in rnd.sample(offers, min(rnd.randint(1, 4), len(offers))):
+            quantity = rnd.randint(1, 3)
+            lines.append((order, offer_id, quantity, price))
+            order.total_amount += price * quantity
+        if order.delivery_type == 'delivery':
+            order.delivery_fee = Decimal('5.00')
+            order.total_amount += order.delivery_fee
+    with transaction.atomic():
+        Order.objects.bulk_create(orders)
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, offer_id=offer_id, quantity=quantity, price=price)
+            for order, offer_id, quantity, price in lines
+        ])
+    return len(orders)
+
+
+def load_notifications(seed, index, start, count):
+    rnd = chunk_random(seed, 'notifications', index)
+    users = _shared['users']
+    notifications = []
+    for _ in range(count):
+        notification_type = rnd.choice(NOTIFICATION_TYPES)
+        notifications.append(Notification(
+            user_id=rnd.choice(users), notification_type=notification_type, title=notification_type.replace('_', ' '),
+            message='Уведомление о вашем заказе или новом предложении.', is_read=rnd.random() < 0.6,
+        ))
+    Notification.objects.bulk_create(notifications)
+    return len(notifications)
+
+
+def run_chunk(task):
+    function, args = task
+    return function(*args)
+
+
+def close_connections():
+    # Forked workers must not share the parent's database connection
+    connections.close_all()
+
+
+class Command(BaseCommand):
+    help = 'Generate a large deterministic dataset with bulk inserts for performance work'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10000)
+        parser.add_argument('--vendors', type=int, default=500)
+        parser.add_argument('--branches', type=int, default=3, help='Branches per vendor')
+        parser.add_argument('--items', type=int, default=20, help='Items per branch')
+        parser.add_argument('--offers', type=int, default=2, help='Offers per item')
+        parser.add_argument('--images', type=int, default=1, help='Images per item')
+        parser.add_argument('--orders', type=int, default=20000)
+        parser.add_argument('--notifications', type=int, default=50000)
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--workers', type=int, default=1, help='Processes per phase (not with SQLite)')
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--skip-search-index', action='store_true', help='Do not rebuild the search index')
+
+    def handle(self, *args, **options):
+        self.seed = options['seed']
+        self.batch_size = options['batch_size']
+        self.workers = options['workers']
+        if self.workers > 1 and connection.vendor == 'sqlite':
+            self.stdout.write(self.style.WARNING('SQLite allows a single writer; loading with one worker'))
+            self.workers = 1
+
+        prefix = f'load{self.seed}-'
+        User = get_user_model()
+        if User.objects.filter(username__startswith=prefix).exists():
+            raise CommandError(f'Data for seed {self.seed} is already loaded; use another --seed')
+
+        _shared.update({
+            'prefix': prefix,
+            'vendor_prefix': f'Load {self.seed} vendor ',
+            'password': make_password(None),  # unusable: load users never log in
+            'vendor_every': max(1, options['users'] // max(1, options['vendors'])),
+            'branches': options['branches'],
+            'items': options['items'],
+            'offers': options['offers'],
+            'images': options['images'],
+        })
+        started = time.monotonic()
+
+        self.run_phase('users', load_users, self.ranges(options['users']))
+        users = User.objects.filter(username__startswith=prefix).order_by('pk')
+        _shared['users'] = list(users.values_list('pk', flat=True))
+        _shared['owners'] = list(users.filter(role='vendor').values_list('pk', flat=True)) or _shared['users']
+        _shared['customers'] = list(users.filter(role='customer').values_list('pk', flat=True)) or _shared['users']
+
+        if options['vendors']:
+            for name, slug in CATEGORIES:
+                Category.objects.get_or_create(slug=slug, defaults={'name': name})
+            _shared['categories'] = list(Category.objects.values_list('pk', flat=True))
+            self.run_phase('vendors', load_vendors, self.ranges(options['vendors']))
+
+            vendors = Vendor.objects.filter(name__startswith=_shared['vendor_prefix']).order_by('pk')
+            self.run_phase('branches', load_branches, self.slices(list(vendors.values_list('pk', flat=True)),
+                                                                   options['branches']))
+            branches = Branch.objects.filter(vendor__in=vendors).order_by('pk')
+            self.run_phase('items', load_items, self.slices(list(branches.values_list('pk', 'vendor_id')),
+                                                             options['items']))
+            items = Item.objects.filter(vendor__in=vendors).order_by('pk')
+            self.run_phase('offers', load_offers, self.slices(list(items.values_list('pk', 'branch_id')),
+                                                               options['offers'] + options['images']))
+
+            offers = Offer.objects.filter(item__vendor__in=vendors).values_list('pk', 'original_price', 'discount_percent')
+            _shared['offers'] = [
+                (pk, Offer.price_after_discount(price, discount).quantize(Decimal('0.01')))
+                for pk, price, discount in offers.order_by('pk')[:ORDER_OFFER_POOL]
+            ]
+            if _shared['offers']:
+                self.run_phase('orders', load_orders, self.ranges(options['orders']))
+
+        self.run_phase('notifications', load_notifications, self.ranges(options['notifications']))
+
+        invalidate_tags('offer', 'item', 'category', 'vendor')
+        if options['vendors'] and not options['skip_search_index']:
+            phase_started = time.monotonic()
+            get_search_backend().rebuild()
+            self.stdout.write(f'search index: rebuilt in {time.monotonic() - phase_started:.1f}s')
+        self.stdout.write(self.style.SUCCESS(f'Seed {self.seed} loaded in {time.monotonic() - started:.1f}s'))
+
+    def ranges(self, total):
+        """(start, count) arguments covering ``total`` rows in batches"""
+        return [(start, min(self.batch_size, total - start)) for start in range(0, total, self.batch_size)]
+
+    def slices(self, parents, rows_per_parent):
+        """Parent rows split so that each chunk creates about one batch of children"""
+        per_chunk = max(1, self.batch_size // max(1, rows_per_parent))
+        return [(parents[start:start + per_chunk],) for start in range(0, len(parents), per_chunk)]
+
+    def run_phase(self, name, function, chunks):
+        started = time.monotonic()
+        tasks = [(function, (self.seed, index, *chunk)) for index, chunk in enumerate(chunks)]
+        if self.workers > 1 and len(tasks) > 1:
+            connections.close_all()
+            context = multiprocessing.get_context('fork')
+            with context.Pool(self.workers, initializer=close_connections) as pool:
+                created = sum(pool.imap_unordered(run_chunk, tasks))
+        else:
+            created = sum(run_chunk(task) for task in tasks)
+        elapsed = time.monotonic() - started
+        rate = created / elapsed if elapsed else 0
+        self.stdout.write(f'{name}: {created} rows in {elapsed:.1f}s ({rate:,.0f}/s)')
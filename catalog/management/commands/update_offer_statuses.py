@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from catalog.lifecycle import BATCH_SIZE, run_lifecycle
+
+
+class Command(BaseCommand):
+    help = 'Move offers past their end date to expired and offers without stock to sold out'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        counts = run_lifecycle(batch_size=options['batch_size'])
+        for status, count in counts.items():
+            self.stdout.write(f'{status}: {count} offers')
+        self.stdout.write(self.style.SUCCESS('Offer statuses updated'))
@@ -0,0 +1,60 @@
+# Generated by Django 5.2.18 on 2026-10-18 05:11
+
+from decimal import Decimal
+
+from django.db import migrations, models
+
+
+def populate_card_data(apps, schema_editor):
+    Item = apps.get_model('catalog', 'Item')
+    ItemImage = apps.get_model('catalog', 'ItemImage')
+    Offer = apps.get_model('catalog', 'Offer')
+
+    items = {item.pk: item for item in Item.objects.only('id')}
+    for image in ItemImage.objects.order_by('-is_primary', 'order', 'id'):
+        item = items[image.item_id]
+        if not item.primary_image_url and image.image:
+            item.primary_image_url = image.image.url
+    for offer in Offer.objects.filter(is_active=True, status='available'):
+        item = items[offer.item_id]
+        price = offer.original_price
+        if offer.discount_percent > 0:
+            price = price * (1 - Decimal(str(offer.discount_percent)) / 100)
+        price = price.quantize(Decimal('0.01'))
+        item.best_price = price if item.best_price is None else min(item.best_price, price)
+        item.max_discount = max(item.max_discount, offer.discount_percent)
+        item.active_offers_count += 1
+    Item.objects.bulk_update(
+        items.values(), ['primary_image_url', 'best_price', 'max_discount', 'active_offers_count'], batch_size=500
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0002_item_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='item',
+            name='active_offers_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='item',
+            name='best_price',
+            field=models.DecimalField(blank=True, decimal_places=2, editable=False, max_digits=10, null=True),
+        ),
+        migrations.AddField(
+            model_name='item',
+            name='max_discount',
+            field=models.FloatField(default=0.0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='item',
+            name='primary_image_url',
+            field=models.CharField(blank=True, editable=False, max_length=255),
+        ),
+        migrations.RunPython(populate_card_data, migrations.RunPython.noop),
+    ]
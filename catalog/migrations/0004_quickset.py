@@ -0,0 +1,70 @@
+# Generated by Django 5.2.18 on 2026-10-18 05:15
+
+from django.db import migrations, models
+
+
+DEFAULT_QUICK_SETS = [
+    {
+        'slug': 'dairy',
+        'name': '🥛 Молочные продукты',
+        'description': 'Молоко, сыр, йогурт',
+        'category_keyword': 'молоко',
+        'max_items': 3,
+        'order': 1,
+    },
+    {
+        'slug': 'bakery',
+        'name': '🍞 Хлебобулочные',
+        'description': 'Хлеб, булочки, выпечка',
+        'category_keyword': 'хлеб',
+        'max_items': 3,
+        'order': 2,
+    },
+    {
+        'slug': 'popular',
+        'name': '🔥 Горячие предложения',
+        'description': 'Самые выгодные скидки',
+        'max_items': 4,
+        'order': 3,
+    },
+]
+
+
+def create_default_quick_sets(apps, schema_editor):
+    QuickSet = apps.get_model('catalog', 'QuickSet')
+    for quick_set in DEFAULT_QUICK_SETS:
+        QuickSet.objects.get_or_create(slug=quick_set['slug'], defaults=quick_set)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0003_item_card_data'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QuickSet',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('slug', models.SlugField(unique=True)),
+                ('name', models.CharField(max_length=100)),
+                ('description', models.CharField(blank=True, max_length=200)),
+                ('category_keyword', models.CharField(blank=True, max_length=100)),
+                ('tags', models.JSONField(blank=True, default=list)),
+                ('min_discount', models.FloatField(default=0.0)),
+                ('max_items', models.PositiveIntegerField(default=3)),
+                ('order', models.PositiveIntegerField(default=0)),
+                ('is_active', models.BooleanField(default=True)),
+                ('items_data', models.JSONField(blank=True, default=list, editable=False)),
+                ('source_version', models.CharField(blank=True, editable=False, max_length=100)),
+                ('refreshed_at', models.DateTimeField(blank=True, editable=False, null=True)),
+                ('categories', models.ManyToManyField(blank=True, related_name='quick_sets', to='catalog.category')),
+            ],
+            options={
+                'ordering': ['order', 'id'],
+                'indexes': [models.Index(fields=['is_active', 'order'], name='catalog_quickset_active_idx')],
+            },
+        ),
+        migrations.RunPython(create_default_quick_sets, migrations.RunPython.noop),
+    ]
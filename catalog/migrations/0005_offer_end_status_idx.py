@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 05:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0004_quickset'),
+        ('vendors', '0002_branch_geo_cell'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='offer',
+            index=models.Index(fields=['end_date', 'status'], name='catalog_offer_end_status_idx'),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-18 05:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0005_offer_end_status_idx'),
+        ('vendors', '0002_branch_geo_cell'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='item',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['-created_at'], name='catalog_item_active_new_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='item',
+            index=models.Index(fields=['vendor', '-created_at'], name='catalog_item_vendor_new_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='offer',
+            index=models.Index(fields=['item', 'status', 'is_active'], name='catalog_offer_item_stat_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='offer',
+            index=models.Index(condition=models.Q(('is_active', True), ('status', 'available')), fields=['-discount_percent', '-created_at'], name='catalog_offer_live_disc_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='offer',
+            index=models.Index(condition=models.Q(('is_active', True), ('status', 'available')), fields=['-created_at'], name='catalog_offer_live_new_idx'),
+        ),
+    ]
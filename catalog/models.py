@@ -1,4 +1,7 @@
+from decimal import Decimal
+
 from django.db import models
+from django.utils import timezone
 
 # Create your models here.
 from vendors.models import Vendor, Branch
@@ -21,6 +24,82 @@ class Category(models.Model):
     def __str__(self):
         return self.name
 
+# Condition of the partial indexes that serve OfferQuerySet.live()
+LIVE_CONDITION = models.Q(is_active=True, status='available')
+
+
+class OfferQuerySet(models.QuerySet):
+    def available(self):
+        """Offers that are switched on and not sold out or expired"""
+        return self.filter(is_active=True, status='available')
+
+    def live(self, today=None):
+        """Available offers that have started, of active items and vendors.
+
+        Matches the partial indexes in ``Offer.Meta``, whose condition is
+        ``available()``.
+        """
+        return self.available().filter(
+            item__is_active=True,
+            item__vendor__is_active=True,
+            start_date__lte=today or timezone.now().date(),
+        )
+
+
+class ItemQuerySet(models.QuerySet):
+    def with_card_data(self, counts=True):
+        """Load everything an item card renders in a fixed number of queries.
+
+        Sets ``active_offers`` (best discount first) on each item, plus
+        ``offers_count`` and ``images_count`` annotations when ``counts`` is
+        true. The primary image comes from ``Item.primary_image_url``.
+        """
+        queryset = self.select_related('vendor', 'category', 'branch').prefetch_related(
+            models.Prefetch('offers', queryset=Offer.objects.available().order_by(*Offer.CARD_ORDERING), to_attr='active_offers'),
+        )
+        if counts:
+            queryset = queryset.annotate(
+                offers_count=models.Count('offers', distinct=True),
+                images_count=models.Count('images', distinct=True),
+            )
+        return queryset
+
+    def refresh_card_data(self):
+        """Recompute the denormalized card columns of the selected items.
+
+        Reads all offers and images of the items in two queries and writes
+        the results back with ``bulk_update``; returns the number of items.
+        """
+        items = list(self.only('id'))
+        item_ids = [item.pk for item in items]
+
+        image_urls = {}
+        for image in ItemImage.objects.filter(item_id__in=item_ids).order_by(*ItemImage.CARD_ORDERING):
+            image_urls.setdefault(image.item_id, image.image.url if image.image else '')
+
+        offer_stats = {}
+        offers = Offer.objects.available().filter(item_id__in=item_ids)
+        for item_id, original_price, discount_percent in offers.values_list('item_id', 'original_price', 'discount_percent'):
+            price = Offer.price_after_discount(original_price, discount_percent)
+            best_price, max_discount, count = offer_stats.get(item_id, (price, discount_percent, 0))
+            offer_stats[item_id] = (min(best_price, price), max(max_discount, discount_percent), count + 1)
+
+        # Card data is part of what item pages show (see catalog.conditional)
+        now = timezone.now()
+        for item in items:
+            item.updated_at = now
+            item.primary_image_url = image_urls.get(item.pk, '')
+            item.best_price, item.max_discount, item.active_offers_count = offer_stats.get(item.pk, (None, 0.0, 0))
+            if item.best_price is not None:
+                item.best_price = item.best_price.quantize(Decimal('0.01'))
+
+        self.model.objects.bulk_update(
+            items, ['primary_image_url', 'best_price', 'max_discount', 'active_offers_count', 'updated_at'],
+            batch_size=500
+        )
+        return len(items)
+
+
 class Item(models.Model):
     UNIT_CHOICES = [
         ('pcs', 'Pieces'),
@@ -37,18 +116,45 @@ class Item(models.Model):
     unit = models.CharField(max_length=20, choices=UNIT_CHOICES, default='pcs')
     tags = models.JSONField(default=list)  # ["halal", "vegetarian", ...]
     is_active = models.BooleanField(default=True)
+    # Denormalized card data, maintained by ItemQuerySet.refresh_card_data()
+    primary_image_url = models.CharField(max_length=255, blank=True, editable=False)
+    best_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True, editable=False)
+    max_discount = models.FloatField(default=0.0, editable=False)
+    active_offers_count = models.PositiveIntegerField(default=0, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = ItemQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Keyset pages of the catalog and of categories (foodsave.pagination)
+            models.Index(fields=['-created_at', '-id'], condition=models.Q(is_active=True),
+                         name='catalog_item_active_new_idx'),
+            models.Index(fields=['category', '-created_at', '-id'], condition=models.Q(is_active=True),
+                         name='catalog_item_cat_new_idx'),
+            models.Index(fields=['vendor', '-created_at'], name='catalog_item_vendor_new_idx'),
+        ]
+
     def __str__(self):
         return self.title
 
+    @property
+    def best_offer(self):
+        """Available offer with the highest discount"""
+        offers = getattr(self, 'active_offers', None)
+        if offers is None:
+            offers = self.offers.available().order_by(*Offer.CARD_ORDERING)[:1]
+        return offers[0] if offers else None
+
 class ItemImage(models.Model):
     item = models.ForeignKey(Item, on_delete=models.CASCADE, related_name='images')
     image = models.ImageField(upload_to='item_images/')
     is_primary = models.BooleanField(default=False)
     order = models.PositiveIntegerField(default=0)
 
+    CARD_ORDERING = ('-is_primary', 'order', 'id')
+
 class Offer(models.Model):
     STATUS_CHOICES = [
         ('available', 'Available'),
@@ -56,6 +162,8 @@ class Offer(models.Model):
         ('sold_out', 'Sold Out'),
         ('expired', 'Expired'),
     ]
+
+    CARD_ORDERING = ('-discount_percent', 'id')
     
     item = models.ForeignKey(Item, on_delete=models.CASCADE, related_name='offers')
     branch = models.ForeignKey(Branch, on_delete=models.CASCADE, related_name='offers')
@@ -68,25 +176,76 @@ class Offer(models.Model):
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='available')
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+
+    objects = OfferQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Offer lifecycle scans for offers past their end date
+            models.Index(fields=['end_date', 'status'], name='catalog_offer_end_status_idx'),
+            # Card prefetch: available offers of a page of items
+            models.Index(fields=['item', 'status', 'is_active'], name='catalog_offer_item_stat_idx'),
+            # Live offers in the orderings of recommendation pools and quick sets
+            models.Index(
+                fields=['-discount_percent', '-created_at'], condition=LIVE_CONDITION, name='catalog_offer_live_disc_idx'
+            ),
+            models.Index(
+                fields=['-created_at'], condition=LIVE_CONDITION, name='catalog_offer_live_new_idx'
+            ),
+        ]
     
+    @staticmethod
+    def price_after_discount(original_price, discount_percent):
+        if discount_percent > 0:
+            discount_decimal = Decimal(str(discount_percent))
+            return original_price * (1 - discount_decimal / 100)
+        return original_price
+
     @property
     def current_price(self):
         """Calculate current price with discount"""
-        if self.discount_percent > 0:
-            from decimal import Decimal
-            discount_decimal = Decimal(str(self.discount_percent))
-            return self.original_price * (1 - discount_decimal / 100)
-        return self.original_price
+        return self.price_after_discount(self.original_price, self.discount_percent)
 
     def __str__(self):
         return f"{self.item.title} - {self.discount_percent}% off"
 
     @property
     def is_expired(self):
-        from django.utils import timezone
         if self.end_date:
             return timezone.now().date() > self.end_date
         return False
 
 
 
+
+
+class QuickSet(models.Model):
+    """A configurable group of offers shown as a quick set in the cart.
+
+    An offer matches when it passes every rule that is set: one of
+    ``categories`` or a category name containing ``category_keyword``, at
+    least one of ``tags`` and ``min_discount``. The best ``max_items``
+    matches are materialized into ``items_data`` by ``catalog.quick_sets``.
+    """
+    slug = models.SlugField(unique=True)
+    name = models.CharField(max_length=100)
+    description = models.CharField(max_length=200, blank=True)
+    categories = models.ManyToManyField(Category, blank=True, related_name='quick_sets')
+    category_keyword = models.CharField(max_length=100, blank=True)
+    tags = models.JSONField(default=list, blank=True)
+    min_discount = models.FloatField(default=0.0)
+    max_items = models.PositiveIntegerField(default=3)
+    order = models.PositiveIntegerField(default=0)
+    is_active = models.BooleanField(default=True)
+    items_data = models.JSONField(default=list, blank=True, editable=False)
+    source_version = models.CharField(max_length=100, blank=True, editable=False)
+    refreshed_at = models.DateTimeField(null=True, blank=True, editable=False)
+
+    class Meta:
+        ordering = ['order', 'id']
+        indexes = [
+            models.Index(fields=['is_active', 'order'], name='catalog_quickset_active_idx'),
+        ]
+
+    def __str__(self):
+        return self.name
@@ -0,0 +1,190 @@
+"""Materialized quick sets.
+
+``refresh_quick_sets`` reads the best live offers for all quick sets in one
+query (the loosest discount and category rules of the sets applied by
+the database), hands each offer to every set still short of items and stores
+the matching items on the set itself, so the API serves them with one query
+and never rebuilds anything. A set remembers the ``source_version`` it was
+built from (catalog tag versions, date and its own rules) and is skipped
+while that is current.
+
+Catalog changes mark the sets stale once they are committed (the
+``tags_invalidated`` signal of ``catalog.caching``); the first request of
+the process to finish after that refreshes them, after its response went
+out, and concurrent requests leave it to that one. Offers starting on a new
+day change nothing in the database, so ``run_lifecycle`` (the
+``update_offer_statuses`` command or the lifecycle thread) refreshes the sets
+that are out of date on every run; ``manage.py refresh_quick_sets`` rebuilds
+all of them on demand.
+"""
+import hashlib
+import logging
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import prefetch_related_objects
+from django.utils import timezone
+
+from .caching import CATALOG_TAGS, tag_versions
+from .models import Category, Offer, QuickSet
+
+logger = logging.getLogger(__name__)
+
+PLACEHOLDER_IMAGE = '/static/images/placeholder.jpg'
+
+# Most offers read per refreshed set: bounds sets whose tags rarely match
+SCAN_LIMIT = getattr(settings, 'CATALOG_QUICK_SET_SCAN_LIMIT', 2000)
+
+STALE_KEY = 'catalog:quick_sets:stale'
+REFRESH_LOCK_KEY = 'catalog:quick_sets:refreshing'
+REFRESH_LOCK_SECONDS = 60
+
+
+def catalog_version():
+    """Token that changes with catalog data and with the date (offers start daily)"""
+    return f'{timezone.now().date()}:{tag_versions(CATALOG_TAGS)}'
+
+
+def source_version(quick_set, catalog_version):
+    """Token of what a set is built from: ``catalog_version`` and the set's rules"""
+    rules = (
+        sorted(category.pk for category in quick_set.categories.all()),
+        quick_set.category_keyword.lower(),
+        sorted(str(tag).lower() for tag in quick_set.tags),
+        quick_set.min_discount,
+        quick_set.max_items,
+    )
+    return hashlib.sha1(repr((catalog_version, rules)).encode()).hexdigest()
+
+
+class QuickSetRules:
+    """Rule matcher and result collector for one quick set"""
+
+    def __init__(self, quick_set, keyword_category_ids=()):
+        self.quick_set = quick_set
+        self.category_ids = {category.pk for category in quick_set.categories.all()} | set(keyword_category_ids)
+        self.restricts_category = bool(self.category_ids or quick_set.category_keyword)
+        self.tags = {str(tag).lower() for tag in quick_set.tags}
+        self.item_ids = set()
+        self.items = []
+
+    @property
+    def is_full(self):
+        return len(self.items) >= self.quick_set.max_items
+
+    def matches(self, offer):
+        if offer.discount_percent < self.quick_set.min_discount:
+            return False
+        if self.restricts_category and offer.item.category_id not in self.category_ids:
+            return False
+        return not self.tags or bool(self.tags & {str(tag).lower() for tag in offer.item.tags or []})
+
+    def offer(self, offer):
+        if self.is_full or offer.item_id in self.item_ids or not self.matches(offer):
+            return
+        self.item_ids.add(offer.item_id)
+        self.items.append({
+            'id': offer.item.id,
+            'offer_id': offer.id,
+            'title': offer.item.title,
+            'vendor_name': offer.item.vendor.name,
+            'current_price': float(offer.current_price),
+            'original_price': float(offer.original_price),
+            'discount_percent': int(offer.discount_percent),
+            'image_url': offer.item.primary_image_url or PLACEHOLDER_IMAGE
+        })
+
+
+def keyword_categories(quick_sets):
+    """``{keyword: category ids}``; matched in Python, as SQLite only folds the case of ASCII"""
+    keywords = {quick_set.category_keyword.lower() for quick_set in quick_sets if quick_set.category_keyword}
+    if not keywords:
+        return {}
+    categories = list(Category.objects.values_list('pk', 'name'))
+    return {keyword: {pk for pk, name in categories if keyword in name.lower()} for keyword in keywords}
+
+
+def collect_offers(collectors):
+    """Hand the best live offers to the collectors in one query, until all are full"""
+    offers = Offer.objects.live().filter(
+        discount_percent__gte=min(collector.quick_set.min_discount for collector in collectors)
+    )
+    if all(collector.restricts_category for collector in collectors):
+        offers = offers.filter(item__category_id__in=set().union(*(c.category_ids for c in collectors)))
+    offers = offers.select_related('item', 'item__vendor').order_by('-discount_percent', '-created_at')
+
+    pending = collectors
+    for offer in offers[:SCAN_LIMIT * len(collectors)].iterator(chunk_size=100):
+        for collector in pending:
+            collector.offer(offer)
+        pending = [collector for collector in pending if not collector.is_full]
+        if not pending:
+            break
+
+
+def refresh_quick_sets(quick_sets=None, force=False):
+    """Rebuild the materialized items of ``quick_sets`` (all active sets by default).
+
+    Sets built from the current catalog data and rules are skipped unless
+    ``force`` is set. Returns the refreshed sets.
+    """
+    if quick_sets is None:
+        quick_sets = QuickSet.objects.filter(is_active=True)
+    quick_sets = list(quick_sets)
+    prefetch_related_objects(quick_sets, 'categories')
+    current = catalog_version()
+    versions = {quick_set.pk: source_version(quick_set, current) for quick_set in quick_sets}
+    quick_sets = [
+        quick_set for quick_set in quick_sets if force or quick_set.source_version != versions[quick_set.pk]
+    ]
+    if not quick_sets:
+        return []
+
+    keywords = keyword_categories(quick_sets)
+    collectors = [
+        QuickSetRules(quick_set, keywords.get(quick_set.category_keyword.lower(), ()))
+        for quick_set in quick_sets
+    ]
+    collect_offers(collectors)
+
+    now = timezone.now()
+    for collector in collectors:
+        collector.quick_set.items_data = collector.items
+        collector.quick_set.source_version = versions[collector.quick_set.pk]
+        collector.quick_set.refreshed_at = now
+    with transaction.atomic():
+        QuickSet.objects.bulk_update(quick_sets, ['items_data', 'source_version', 'refreshed_at'])
+    return quick_sets
+
+
+def mark_stale():
+    cache.set(STALE_KEY, True, None)
+
+
+def refresh_if_stale():
+    """Refresh the sets if a change marked them stale, unless another request is already at it"""
+    if not cache.get(STALE_KEY) or not cache.add(REFRESH_LOCK_KEY, True, REFRESH_LOCK_SECONDS):
+        return False
+    try:
+        # Changes made during the refresh mark the sets stale again for the next request
+        cache.delete(STALE_KEY)
+        refresh_quick_sets()
+    except Exception:
+        mark_stale()
+        logger.exception('Quick set refresh failed')
+        return False
+    finally:
+        cache.delete(REFRESH_LOCK_KEY)
+    return True
+
+
+def get_quick_sets_data():
+    """Active quick sets with their materialized items (one query)"""
+    quick_sets = QuickSet.objects.filter(is_active=True).values('slug', 'name', 'description', 'items_data')
+    return [{
+        'id': quick_set['slug'],
+        'name': quick_set['name'],
+        'description': quick_set['description'],
+        'items': quick_set['items_data']
+    } for quick_set in quick_sets if quick_set['items_data']]
@@ -0,0 +1,120 @@
+"""Cached candidate pools for the recommendations API.
+
+Each vendor-type segment (``products``, ``dishes`` or everything) has a pool
+of live offers, already serialized and sorted by discount. Pools are kept in
+the tag-versioned catalog cache for up to ``POOL_TTL`` seconds and memoized
+per process while their cache key is current, so a request only picks from a
+list in memory: high-discount picks are read from
+the head of the pool, random picks are drawn by index and cart items are
+skipped without touching the database.
+"""
+import random
+import threading
+import time
+
+from django.conf import settings
+
+from .caching import CATALOG_TAGS, get_or_build, record_hit, versioned_key
+
+POOL_TTL = getattr(settings, 'CATALOG_RECOMMENDATION_POOL_TTL', 300)
+POOL_SIZE = getattr(settings, 'CATALOG_RECOMMENDATION_POOL_SIZE', 500)
+
+HIGH_DISCOUNT_PERCENT = 20
+HIGH_DISCOUNT_PICKS = 10
+RANDOM_PICKS = 10
+MAX_RECOMMENDATIONS = 12
+
+SEGMENT_VENDOR_TYPES = {
+    'products': ['store'],
+    'dishes': ['restaurant', 'cafe'],
+}
+
+_local_pools = {}  # segment -> (cache_key, expires_at, pool)
+_lock = threading.Lock()
+
+
+def serialize_offer(offer):
+    item = offer.item
+
+    # Определяем тип бейджа
+    badge_type = 'discount'
+    badge_text = f'-{int(offer.discount_percent)}%'
+
+    if offer.discount_percent >= 50:
+        badge_type = 'hot'
+        badge_text = 'ГОРЯЧЕЕ'
+
+    return {
+        'id': item.id,
+        'offer_id': offer.id,
+        'title': item.title or 'Без названия',
+        'vendor_name': item.vendor.name if item.vendor else 'Неизвестный продавец',
+        'original_price': float(offer.original_price),
+        'current_price': float(offer.current_price),
+        'discount_percent': int(offer.discount_percent),
+        'image_url': item.primary_image_url,
+        'badge_type': badge_type,
+        'badge_text': badge_text,
+        'unit': dict(item.UNIT_CHOICES).get(item.unit, item.unit),
+        'category': item.category.name if item.category else '',
+        'description': (item.description[:100] + '...') if item.description and len(item.description) > 100 else (item.description or '')
+    }
+
+
+def build_pool(segment):
+    """Query the live offers of a segment, best discount first"""
+    from .models import Offer
+
+    offers = Offer.objects.live().select_related(
+        'item',
+        'item__vendor',
+        'item__category'
+    )
+    if segment in SEGMENT_VENDOR_TYPES:
+        offers = offers.filter(item__vendor__type__in=SEGMENT_VENDOR_TYPES[segment])
+
+    return [serialize_offer(offer) for offer in offers.order_by('-discount_percent', '-created_at')[:POOL_SIZE]]
+
+
+def get_pool(segment):
+    """Return the candidate pool of a segment, rebuilding it when stale"""
+    cache_key = versioned_key('recommendation_pool', CATALOG_TAGS, segment)
+    now = time.monotonic()
+    entry = _local_pools.get(segment)
+    if entry is not None and entry[0] == cache_key and entry[1] > now:
+        record_hit('recommendation_pool')
+        return entry[2]
+
+    with _lock:
+        pool = get_or_build('recommendation_pool', cache_key, lambda: build_pool(segment), POOL_TTL)
+        _local_pools[segment] = (cache_key, now + POOL_TTL, pool)
+        return pool
+
+
+def recommend(exclude_item_ids=(), segment='all', limit=MAX_RECOMMENDATIONS):
+    """Pick recommendations: top discounts first, then random picks for variety"""
+    pool = get_pool(segment if segment in SEGMENT_VENDOR_TYPES else 'all')
+    exclude_item_ids = set(exclude_item_ids)
+    seen_items = set()
+    recommendations = []
+
+    def take(entry):
+        if entry['id'] in exclude_item_ids or entry['id'] in seen_items:
+            return
+        seen_items.add(entry['id'])
+        recommendations.append(entry)
+
+    # 1. Товары с высокой скидкой (пул отсортирован по скидке)
+    for entry in pool:
+        if entry['discount_percent'] < HIGH_DISCOUNT_PERCENT or len(seen_items) >= HIGH_DISCOUNT_PICKS:
+            break
+        take(entry)
+
+    # 2. Случайные товары для разнообразия
+    picks = min(len(pool), RANDOM_PICKS + len(exclude_item_ids) + len(seen_items))
+    for index in random.sample(range(len(pool)), picks):
+        if len(recommendations) >= limit:
+            break
+        take(pool[index])
+
+    return recommendations[:limit]
@@ -0,0 +1,249 @@
+"""Full-text search index for catalog items.
+
+Each backend keeps a side table with one search document per item (title,
+description and vendor name) and answers ranked prefix queries from it. The
+table is kept in sync by the signal handlers in ``catalog.signals``.
+
+The backend is chosen with ``settings.CATALOG_SEARCH_BACKEND`` (a dotted path);
+by default SQLite uses FTS5, PostgreSQL uses a tsvector table with a GIN index
+and any other database falls back to plain ``icontains`` lookups.
+"""
+import re
+
+from django.conf import settings
+from django.db import connections, DEFAULT_DB_ALIAS
+from django.db.models import Q
+from django.utils.module_loading import import_string
+
+WORD_RE = re.compile(r'\w+')
+
+# Upper bound on ranked ids returned for one query
+SEARCH_MAX_RESULTS = 1000
+
+# Ids per statement when (re)indexing
+INDEX_BATCH_SIZE = 500
+
+
+def search_terms(query):
+    """Split a user query into lowercase words usable as prefix terms"""
+    return WORD_RE.findall(query.lower())[:10]
+
+
+class SearchBackend:
+    """Base class for item search backends"""
+
+    def __init__(self, connection):
+        self.connection = connection
+
+    def create_index(self):
+        pass
+
+    def drop_index(self):
+        pass
+
+    def rebuild(self):
+        pass
+
+    def index_items(self, item_ids):
+        pass
+
+    def remove_items(self, item_ids):
+        pass
+
+    def search(self, query, limit=SEARCH_MAX_RESULTS):
+        """Return ids of active items matching ``query``, best match first"""
+        raise NotImplementedError
+
+    def _batches(self, item_ids):
+        item_ids = list(item_ids)
+        for start in range(0, len(item_ids), INDEX_BATCH_SIZE):
+            yield item_ids[start:start + INDEX_BATCH_SIZE]
+
+
+class SimpleSearchBackend(SearchBackend):
+    """Unindexed ``icontains`` search, used when no full-text engine is available"""
+
+    def search(self, query, limit=SEARCH_MAX_RESULTS):
+        from .models import Item
+
+        return list(Item.objects.filter(
+            Q(title__icontains=query) |
+            Q(description__icontains=query) |
+            Q(vendor__name__icontains=query),
+            is_active=True
+        ).values_list('id', flat=True)[:limit])
+
+
+class SQLiteFTSBackend(SearchBackend):
+    """SQLite FTS5 table keyed by item id (rowid), ranked with bm25"""
+
+    table = 'catalog_item_fts'
+
+    # bm25 column weights: title, description, vendor_name
+    weights = (10.0, 1.0, 5.0)
+
+    def create_index(self):
+        with self.connection.cursor() as cursor:
+            cursor.execute(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {self.table} "
+                "USING fts5(title, description, vendor_name, tokenize='unicode61 remove_diacritics 2')"
+            )
+
+    def drop_index(self):
+        with self.connection.cursor() as cursor:
+            cursor.execute(f"DROP TABLE IF EXISTS {self.table}")
+
+    def rebuild(self):
+        with self.connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {self.table}")
+            cursor.execute(
+                f"INSERT INTO {self.table} (rowid, title, description, vendor_name) "
+                "SELECT i.id, i.title, i.description, v.name "
+                "FROM catalog_item i JOIN vendors_vendor v ON v.id = i.vendor_id"
+            )
+
+    def index_items(self, item_ids):
+        with self.connection.cursor() as cursor:
+            for batch in self._batches(item_ids):
+                placeholders = ', '.join(['%s'] * len(batch))
+                cursor.execute(f"DELETE FROM {self.table} WHERE rowid IN ({placeholders})", batch)
+                cursor.execute(
+                    f"INSERT INTO {self.table} (rowid, title, description, vendor_name) "
+                    "SELECT i.id, i.title, i.description, v.name "
+                    "FROM catalog_item i JOIN vendors_vendor v ON v.id = i.vendor_id "
+                    f"WHERE i.id IN ({placeholders})",
+                    batch
+                )
+
+    def remove_items(self, item_ids):
+        with self.connection.cursor() as cursor:
+            for batch in self._batches(item_ids):
+                placeholders = ', '.join(['%s'] * len(batch))
+                cursor.execute(f"DELETE FROM {self.table} WHERE rowid IN ({placeholders})", batch)
+
+    def search(self, query, limit=SEARCH_MAX_RESULTS):
+        terms = search_terms(query)
+        if not terms:
+            return []
+        match = ' '.join(f'"{term}"*' for term in terms)
+        weights = ', '.join(str(weight) for weight in self.weights)
+        with self.connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT f.rowid FROM {self.table} f "
+                "JOIN catalog_item i ON i.id = f.rowid "
+                f"WHERE {self.table} MATCH %s AND i.is_active "
+                f"ORDER BY bm25({self.table}, {weights}), f.rowid "
+                "LIMIT %s",
+                [match, limit]
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+
+class PostgresSearchBackend(SearchBackend):
+    """PostgreSQL tsvector table with a GIN index, ranked with ts_rank"""
+
+    table = 'catalog_item_search'
+    config = 'simple'
+
+    document_sql = (
+        "setweight(to_tsvector('{config}', i.title), 'A') || "
+        "setweight(to_tsvector('{config}', v.name), 'A') || "
+        "setweight(to_tsvector('{config}', i.description), 'B')"
+    )
+
+    def create_index(self):
+        with self.connection.cursor() as cursor:
+            cursor.execute(
+                f"CREATE TABLE IF NOT EXISTS {self.table} "
+                "(item_id bigint PRIMARY KEY, document tsvector NOT NULL)"
+            )
+            cursor.execute(
+                f"CREATE INDEX IF NOT EXISTS {self.table}_document_idx "
+                f"ON {self.table} USING GIN (document)"
+            )
+
+    def drop_index(self):
+        with self.connection.cursor() as cursor:
+            cursor.execute(f"DROP TABLE IF EXISTS {self.table}")
+
+    def _upsert_sql(self, where=''):
+        document = self.document_sql.format(config=self.config)
+        return (
+            f"INSERT INTO {self.table} (item_id, document) "
+            f"SELECT i.id, {document} "
+            f"FROM catalog_item i JOIN vendors_vendor v ON v.id = i.vendor_id {where} "
+            "ON CONFLICT (item_id) DO UPDATE SET document = EXCLUDED.document"
+        )
+
+    def rebuild(self):
+        with self.connection.cursor() as cursor:
+            cursor.execute(f"TRUNCATE {self.table}")
+            cursor.execute(self._upsert_sql())
+
+    def index_items(self, item_ids):
+        with self.connection.cursor() as cursor:
+            for batch in self._batches(item_ids):
+                cursor.execute(self._upsert_sql('WHERE i.id = ANY(%s)'), [batch])
+
+    def remove_items(self, item_ids):
+        with self.connection.cursor() as cursor:
+            for batch in self._batches(item_ids):
+                cursor.execute(f"DELETE FROM {self.table} WHERE item_id = ANY(%s)", [batch])
+
+    def search(self, query, limit=SEARCH_MAX_RESULTS):
+        terms = search_terms(query)
+        if not terms:
+            return []
+        tsquery = ' & '.join(f'{term}:*' for term in terms)
+        with self.connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT s.item_id FROM {self.table} s "
+                "JOIN catalog_item i ON i.id = s.item_id, "
+                f"to_tsquery('{self.config}', %s) q "
+                "WHERE s.document @@ q AND i.is_active "
+                "ORDER BY ts_rank(s.document, q) DESC, s.item_id "
+                "LIMIT %s",
+                [tsquery, limit]
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+
+DEFAULT_BACKENDS = {
+    'sqlite': 'catalog.search.SQLiteFTSBackend',
+    'postgresql': 'catalog.search.PostgresSearchBackend',
+}
+
+
+def get_search_backend(connection=None):
+    """Return the configured search backend for ``connection``"""
+    if connection is None:
+        connection = connections[DEFAULT_DB_ALIAS]
+    path = getattr(settings, 'CATALOG_SEARCH_BACKEND', None) or DEFAULT_BACKENDS.get(
+        connection.vendor, 'catalog.search.SimpleSearchBackend'
+    )
+    return import_string(path)(connection)
+
+
+class RankedResults:
+    """Lazy sequence of objects following a ranked list of ids.
+
+    Slicing loads only the requested ids, so paginating search results costs
+    one query per page regardless of how many items matched.
+    """
+
+    def __init__(self, ids, queryset):
+        self.ids = list(ids)
+        self.queryset = queryset
+
+    def __len__(self):
+        return len(self.ids)
+
+    def count(self):
+        return len(self.ids)
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            ids = self.ids[key]
+            objects = self.queryset.in_bulk(ids)
+            return [objects[pk] for pk in ids if pk in objects]
+        return self.queryset.get(pk=self.ids[key])
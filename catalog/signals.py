@@ -0,0 +1,141 @@
+import threading
+
+from django.db import transaction
+from django.core.signals import request_finished
+from django.db.models.signals import m2m_changed, post_save, post_delete
+from django.dispatch import receiver
+
+from vendors.models import Branch, Vendor
+from .models import Category, Item, ItemImage, Offer, QuickSet
+from .caching import invalidate_tags, tags_invalidated
+from .quick_sets import mark_stale, refresh_if_stale
+from .search import get_search_backend
+from .suggest import category_entry, item_entry, patch, vendor_entry
+
+
+@receiver(post_save, sender=Item)
+def index_item(sender, instance, **kwargs):
+    """Keep the search index entry of an item up to date"""
+    get_search_backend().index_items([instance.pk])
+
+
+@receiver(post_delete, sender=Item)
+def unindex_item(sender, instance, **kwargs):
+    get_search_backend().remove_items([instance.pk])
+
+
+@receiver(post_save, sender=Vendor)
+def reindex_vendor_items(sender, instance, created, **kwargs):
+    """Vendor names are part of item search documents"""
+    if not created:
+        get_search_backend().index_items(instance.items.values_list('id', flat=True))
+
+
+def update_suggestion(instance, entry):
+    """Patch the suggestion index once the change is committed"""
+    args = entry(instance)
+    if instance.is_active:
+        transaction.on_commit(lambda: patch('add', *args))
+    else:
+        transaction.on_commit(lambda: patch('remove', *args[:2]))
+
+
+@receiver(post_save, sender=Item)
+def update_item_suggestion(sender, instance, **kwargs):
+    update_suggestion(instance, item_entry)
+
+
+@receiver(post_save, sender=Vendor)
+def update_vendor_suggestion(sender, instance, **kwargs):
+    update_suggestion(instance, vendor_entry)
+
+
+@receiver(post_save, sender=Category)
+def update_category_suggestion(sender, instance, **kwargs):
+    update_suggestion(instance, category_entry)
+
+
+@receiver(post_delete, sender=Item)
+@receiver(post_delete, sender=Vendor)
+@receiver(post_delete, sender=Category)
+def remove_suggestion(sender, instance, **kwargs):
+    kind, pk = sender._meta.model_name, instance.pk
+    transaction.on_commit(lambda: patch('remove', kind, pk))
+
+
+class CardDataBatch:
+    """Items whose card data changed in one transaction, refreshed once it commits"""
+
+    def __init__(self, item_ids, savepoint_ids):
+        self.item_ids = set(item_ids)
+        self.savepoint_ids = savepoint_ids
+        self.done = False
+
+    def __call__(self):
+        self.done = True
+        Item.objects.filter(pk__in=self.item_ids).refresh_card_data()
+
+
+# The latest batch of each thread. Changes join it while they are made in the
+# same (sub)transaction; a batch whose hook left run_on_commit without running
+# was rolled back
+_card_data = threading.local()
+
+
+@receiver(post_save, sender=Offer)
+@receiver(post_delete, sender=Offer)
+@receiver(post_save, sender=ItemImage)
+@receiver(post_delete, sender=ItemImage)
+def refresh_item_card_data(sender, instance, **kwargs):
+    """Offers and images feed the denormalized card columns on Item.
+
+    The items are collected per transaction and refreshed together once it
+    commits, so deleting an item with its offers and images, or saving many
+    offers, costs one refresh.
+    """
+    connection = transaction.get_connection()
+    batch = getattr(_card_data, 'batch', None)
+    if (batch is not None and not batch.done and batch.savepoint_ids == connection.savepoint_ids
+            and any(hook is batch for _, hook, _ in connection.run_on_commit)):
+        batch.item_ids.add(instance.item_id)
+    else:
+        batch = _card_data.batch = CardDataBatch([instance.item_id], list(connection.savepoint_ids))
+        transaction.on_commit(batch)
+
+
+CACHE_TAGS = {
+    Offer: ('offer',),
+    Item: ('item',),
+    ItemImage: ('item',),
+    Category: ('category',),
+    Vendor: ('vendor',),
+    Branch: ('vendor',),
+}
+
+
+def invalidate_cached_data(sender, **kwargs):
+    invalidate_tags(*CACHE_TAGS[sender])
+
+
+for model in CACHE_TAGS:
+    post_save.connect(invalidate_cached_data, sender=model, dispatch_uid=f'invalidate_cache_{model._meta.label}')
+    post_delete.connect(invalidate_cached_data, sender=model, dispatch_uid=f'invalidate_cache_{model._meta.label}')
+
+
+@receiver(tags_invalidated)
+def quick_sets_stale(sender, **kwargs):
+    """Catalog changes were committed: the materialized quick sets may be out of date"""
+    mark_stale()
+
+
+@receiver(post_save, sender=QuickSet)
+@receiver(post_delete, sender=QuickSet)
+@receiver(m2m_changed, sender=QuickSet.categories.through)
+def quick_set_rules_changed(sender, **kwargs):
+    transaction.on_commit(mark_stale)
+
+
+@receiver(request_finished)
+def refresh_stale_quick_sets(sender, **kwargs):
+    """Rebuild stale quick sets after a response went out, not while a client waits"""
+    refresh_if_stale()
@@ -0,0 +1,193 @@
+"""In-memory prefix index for search-as-you-type suggestions.
+
+Item titles, vendor names and category names are stored as normalized keys in
+a sorted list; a prefix lookup is a ``bisect`` plus a short forward scan, so
+per-keystroke requests never touch the database. The index is built with a
+single sort on first use in a process and patched by the signal handlers in
+``catalog.signals`` once changes are committed. So that other worker
+processes pick up changes too, an index older than
+``CATALOG_SUGGEST_REBUILD_SECONDS`` is rebuilt in a background thread while
+requests keep reading the current one.
+"""
+import bisect
+import threading
+import time
+from itertools import chain
+
+from django.conf import settings
+from django.db import connection
+from django.urls import reverse
+
+from .search import WORD_RE
+
+# Hard cap on the number of keys held in memory
+MAX_ENTRIES = getattr(settings, 'CATALOG_SUGGEST_MAX_ENTRIES', 100000)
+REBUILD_SECONDS = getattr(settings, 'CATALOG_SUGGEST_REBUILD_SECONDS', 600)
+
+MAX_KEY_LENGTH = 64
+MAX_WORDS = 6
+
+# Keys inspected per lookup before giving up on filling the limit
+SCAN_LIMIT = 200
+
+KIND_ORDER = {'category': 0, 'vendor': 1, 'item': 2}
+
+
+def normalize(text):
+    return ' '.join(WORD_RE.findall(text.lower()))
+
+
+def suggestion_keys(text):
+    """Keys under which ``text`` is found: the full text and each later word onwards"""
+    words = WORD_RE.findall(text.lower())[:MAX_WORDS]
+    return [' '.join(words[i:])[:MAX_KEY_LENGTH] for i in range(len(words))]
+
+
+class PrefixIndex:
+    """Sorted array of (key, kind, id) with per-object payloads"""
+
+    def __init__(self, max_entries=MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.keys = []
+        self.entries = {}  # (kind, id) -> (payload, keys)
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.keys)
+
+    def add(self, kind, pk, text, url):
+        """Insert or replace an object; returns False when the index is full"""
+        keys = suggestion_keys(text)
+        with self.lock:
+            self._remove((kind, pk))
+            if len(self.keys) + len(keys) > self.max_entries:
+                return False
+            for key in keys:
+                bisect.insort(self.keys, (key, kind, pk))
+            self.entries[(kind, pk)] = ({'type': kind, 'id': pk, 'text': text, 'url': url}, keys)
+            return True
+
+    def load(self, entries):
+        """Fill the index from ``(kind, id, text, url)`` tuples until it is full, sorting once"""
+        keys = []
+        objects = {}
+        for kind, pk, text, url in entries:
+            entry_keys = suggestion_keys(text)
+            if len(keys) + len(entry_keys) > self.max_entries:
+                break
+            keys.extend((key, kind, pk) for key in entry_keys)
+            objects[(kind, pk)] = ({'type': kind, 'id': pk, 'text': text, 'url': url}, entry_keys)
+        keys.sort()
+        with self.lock:
+            self.keys, self.entries = keys, objects
+
+    def remove(self, kind, pk):
+        with self.lock:
+            self._remove((kind, pk))
+
+    def _remove(self, entry_key):
+        entry = self.entries.pop(entry_key, None)
+        if entry is None:
+            return
+        for key in entry[1]:
+            position = bisect.bisect_left(self.keys, (key, *entry_key))
+            if position < len(self.keys) and self.keys[position] == (key, *entry_key):
+                del self.keys[position]
+
+    def lookup(self, prefix, limit=10):
+        prefix = normalize(prefix)
+        if not prefix:
+            return []
+        matches = {}
+        with self.lock:
+            position = bisect.bisect_left(self.keys, (prefix,))
+            for key, kind, pk in self.keys[position:position + SCAN_LIMIT]:
+                if not key.startswith(prefix):
+                    break
+                payload, keys = self.entries[(kind, pk)]
+                # Objects whose full name starts with the prefix rank first
+                rank = (key != keys[0], KIND_ORDER[kind], len(payload['text']))
+                if (kind, pk) not in matches or rank < matches[(kind, pk)][0]:
+                    matches[(kind, pk)] = (rank, payload)
+        return [payload for rank, payload in sorted(matches.values(), key=lambda match: match[0])[:limit]]
+
+
+def item_entry(item):
+    return 'item', item.pk, item.title, reverse('catalog:item_detail', args=[item.pk])
+
+
+def vendor_entry(vendor):
+    return 'vendor', vendor.pk, vendor.name, reverse('vendors:vendor_detail', args=[vendor.pk])
+
+
+def category_entry(category):
+    return 'category', category.pk, category.name, reverse('catalog:category', args=[category.slug])
+
+
+def build_index(max_entries=MAX_ENTRIES):
+    from vendors.models import Vendor
+    from .models import Category, Item
+
+    index = PrefixIndex(max_entries)
+    index.load(chain(
+        (category_entry(category) for category in Category.objects.filter(is_active=True).only('id', 'name', 'slug')),
+        (vendor_entry(vendor) for vendor in Vendor.objects.filter(is_active=True).only('id', 'name')),
+        # Newest items win when the cap is reached
+        (item_entry(item) for item in Item.objects.filter(is_active=True).only('id', 'title')
+         .order_by('-created_at').iterator()),
+    ))
+    return index
+
+
+_index = None
+_built_at = 0
+_build_lock = threading.Lock()
+# Changes committed while a rebuild runs, replayed on the new index
+_patch_lock = threading.Lock()
+_pending = None
+
+
+def rebuild():
+    """Build a fresh index and swap it in, keeping changes committed during the build"""
+    global _index, _built_at, _pending
+    with _patch_lock:
+        _pending = []
+    try:
+        index = build_index()
+    except BaseException:
+        with _patch_lock:
+            _pending = None
+        raise
+    with _patch_lock:
+        for method, args in _pending:
+            getattr(index, method)(*args)
+        _index, _built_at, _pending = index, time.monotonic(), None
+    return index
+
+
+def _rebuild_in_background():
+    try:
+        rebuild()
+    finally:
+        connection.close()
+        _build_lock.release()
+
+
+def get_suggest_index():
+    """Return the process-wide index; only the first use in a process waits for a build"""
+    if _index is None:
+        with _build_lock:
+            if _index is None:
+                rebuild()
+    elif time.monotonic() - _built_at > REBUILD_SECONDS and _build_lock.acquire(blocking=False):
+        threading.Thread(target=_rebuild_in_background, name='suggest-index', daemon=True).start()
+    return _index
+
+
+def patch(method, *args):
+    """Apply ``add`` or ``remove`` to the index of this process, if it has been built"""
+    with _patch_lock:
+        if _pending is not None:
+            _pending.append((method, args))
+        if _index is not None:
+            getattr(_index, method)(*args)
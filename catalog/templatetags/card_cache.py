@@ -0,0 +1,52 @@
+"""``{% cardcache item "name" %}...{% endcardcache %}``: cached item card HTML.
+
+The key holds the item's ``updated_at`` and the versions of the ``vendor``
+and ``category`` tags. Saving or deleting an item, one of its offers or
+images refreshes its card data (``catalog.signals``), which moves
+``updated_at``; vendor and category changes bump their tags. Old fragments
+are never looked up again and expire after ``CATALOG_CARD_CACHE_TIMEOUT``.
+Hits and misses are counted per ``name`` in ``cache_stats()``.
+
+The fragment must depend on nothing but the item: keep per-request or
+per-loop values (user, ``forloop``) outside the block.
+"""
+from django import template
+from django.conf import settings
+
+from catalog.caching import get_or_build, tag_versions
+
+register = template.Library()
+
+CARD_TIMEOUT = getattr(settings, 'CATALOG_CARD_CACHE_TIMEOUT', 60 * 60)
+CARD_TAGS = ('vendor', 'category')
+
+
+def card_key(name, item, versions):
+    return f'catalog:card:{name}:{item.pk}:{item.updated_at.timestamp()}:{versions}'
+
+
+class CardCacheNode(template.Node):
+    def __init__(self, nodelist, item, name):
+        self.nodelist = nodelist
+        self.item = item
+        self.name = name
+
+    def render(self, context):
+        item = self.item.resolve(context)
+        name = self.name.resolve(context)
+        # One tag lookup per template render, not per card
+        versions = context.render_context.get(self)
+        if versions is None:
+            versions = context.render_context[self] = tag_versions(CARD_TAGS)
+        return get_or_build(f'card:{name}', card_key(name, item, versions),
+                            lambda: self.nodelist.render(context), CARD_TIMEOUT)
+
+
+@register.tag
+def cardcache(parser, token):
+    bits = token.split_contents()
+    if len(bits) != 3:
+        raise template.TemplateSyntaxError(f"'{bits[0]}' takes an item and a fragment name")
+    nodelist = parser.parse(('endcardcache',))
+    parser.delete_first_token()
+    return CardCacheNode(nodelist, parser.compile_filter(bits[1]), parser.compile_filter(bits[2]))
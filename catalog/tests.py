@@ -1,3 +1,1136 @@
-from django.test import TestCase
+import io
+import json
+import math
+import random
+import shutil
+import tempfile
+import threading
+from datetime import date, timedelta
+from decimal import Decimal
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.template.loader import render_to_string
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from booking.models import Cart, Reservation
+from foodsave import bundle, perf
+from foodsave.db import check_database_tuning
+from foodsave.nplusone import NPlusOneAssertionsMixin, NPlusOneError, assert_no_n_plus_one
+from foodsave.pagination import CursorPaginator, InvalidCursor
+from vendors.models import Branch, Vendor
+from . import api, lifecycle, quick_sets, recommendations, suggest, views
+from .caching import bump_tags, cache_stats, tag_versions
+from .search import SQLiteFTSBackend, get_search_backend
+from .models import Category, Item, ItemImage, Offer, QuickSet
+from .views import find_nearest_items
+
+
+class OfferLiveTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        owner = get_user_model().objects.create_user('owner', password='secret')
+        cls.vendor = Vendor.objects.create(owner=owner, type='store', name='Vendor')
+        branch = Branch.objects.create(vendor=cls.vendor, name='Branch', address='Address', phone='1',
+                                       latitude=41.3, longitude=69.2)
+        cls.item = Item.objects.create(vendor=cls.vendor, branch=branch, title='Item')
+        today = date.today()
+
+        def offer(**fields):
+            values = {'item': cls.item, 'branch': branch, 'original_price': Decimal('100.00'), 'start_date': today}
+            values.update(fields)
+            return Offer.objects.create(**values)
+
+        cls.live = offer(discount_percent=30)
+        cls.inactive = offer(is_active=False)
+        cls.sold_out = offer(status='sold_out')
+        cls.upcoming = offer(start_date=today + timedelta(days=1))
+
+    def test_live_filters_offers_items_and_vendors(self):
+        self.assertEqual(list(Offer.objects.live()), [self.live])
+
+        Item.objects.filter(pk=self.item.pk).update(is_active=False)
+        self.assertFalse(Offer.objects.live().exists())
+
+        Item.objects.filter(pk=self.item.pk).update(is_active=True)
+        Vendor.objects.filter(pk=self.vendor.pk).update(is_active=False)
+        self.assertFalse(Offer.objects.live().exists())
+
+    def explain(self, queryset):
+        if connection.vendor == 'postgresql':
+            # Test tables are tiny: make the planner show whether the index is usable at all
+            with connection.cursor() as cursor:
+                cursor.execute('SET LOCAL enable_seqscan = off')
+        return queryset.explain()
+
+    def test_live_by_discount_uses_partial_index(self):
+        plan = self.explain(Offer.objects.live().order_by('-discount_percent', '-created_at')[:10])
+        self.assertIn('catalog_offer_live_disc_idx', plan)
+
+    def test_live_by_newest_uses_partial_index(self):
+        plan = self.explain(Offer.objects.live().order_by('-created_at')[:10])
+        self.assertIn('catalog_offer_live_new_idx', plan)
+
+    def test_card_prefetch_uses_item_status_index(self):
+        plan = self.explain(Offer.objects.available().filter(item_id__in=[self.item.pk]))
+        self.assertIn('catalog_offer_item_stat_idx', plan)
+
+
+class NPlusOneTests(NPlusOneAssertionsMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        owner = get_user_model().objects.create_user('owner', password='secret')
+        cls.category = Category.objects.create(name='Молоко', slug='milk')
+        for v in range(3):
+            vendor = Vendor.objects.create(owner=owner, type='store', name=f'Vendor {v}')
+            for b in range(2):
+                branch = Branch.objects.create(vendor=vendor, name=f'Branch {b}', address='Address', phone='1',
+                                               latitude=41.3 + v / 100, longitude=69.2 + b / 100)
+                for i in range(3):
+                    item = Item.objects.create(vendor=vendor, branch=branch, category=cls.category,
+                                               title=f'Молоко {v}-{b}-{i}')
+                    ItemImage.objects.create(item=item, image='item_images/test.jpg', is_primary=True)
+                    Offer.objects.create(item=item, branch=branch, original_price=Decimal('100.00'),
+                                         discount_percent=10 * i, quantity=5, start_date=date.today())
+        cls.item = Item.objects.first()
+
+    def test_catalog_views(self):
+        urls = [
+            reverse('catalog:catalog'),
+            reverse('catalog:category', args=[self.category.slug]),
+            reverse('catalog:search') + '?q=молоко',
+            reverse('catalog:item_detail', args=[self.item.pk]),
+            # The ring scan repeats by design and is listed in NPLUSONE_IGNORE
+            reverse('catalog:map') + '?lat=41.3&lng=69.2',
+        ]
+        for url in urls:
+            with self.subTest(url=url), self.assertNoNPlusOne():
+                self.assertEqual(self.client.get(url).status_code, 200)
+
+    def test_detects_lazy_relation_in_template_and_code(self):
+        from django.template import Context, Template
+
+        template = Template('{% for item in items %}{{ item.vendor.name }}{% endfor %}')
+        with self.assertRaisesMessage(NPlusOneError, 'vendors_vendor'):
+            with assert_no_n_plus_one():
+                template.render(Context({'items': Item.objects.all()}))
+
+        with self.assertRaisesMessage(NPlusOneError, 'catalog/tests.py'):
+            with assert_no_n_plus_one():
+                [item.branch.name for item in Item.objects.all()]
+
+
+class CursorPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        owner = get_user_model().objects.create_user('owner', password='secret')
+        vendor = Vendor.objects.create(owner=owner, type='store', name='Vendor')
+        branch = Branch.objects.create(vendor=vendor, name='Branch', address='Address', phone='1',
+                                       latitude=41.3, longitude=69.2)
+        for i in range(30):
+            Item.objects.create(vendor=vendor, branch=branch, title=f'Item {i}')
+        # Ties on created_at are broken by id
+        Item.objects.filter(pk__in=Item.objects.order_by('pk').values('pk')[:10]).update(
+            created_at=Item.objects.order_by('pk').first().created_at
+        )
+        cls.expected = list(Item.objects.order_by('-created_at', '-id'))
+
+    def test_walks_forward_and_back_without_gaps(self):
+        paginator = CursorPaginator(Item.objects.all(), 7)
+        pages = [paginator.page()]
+        while pages[-1].has_next():
+            pages.append(paginator.page(pages[-1].next_cursor))
+        self.assertEqual([item for page in pages for item in page], self.expected)
+        self.assertEqual([page.number for page in pages], [1, 2, 3, 4, 5])
+
+        page = pages[-1]
+        while page.has_previous():
+            page = paginator.page(page.previous_cursor)
+            self.assertEqual(list(page), list(pages[page.number - 1]))
+        self.assertEqual(page.number, 1)
+
+    def test_page_skips_count_and_offset(self):
+        paginator = CursorPaginator(Item.objects.all(), 7)
+        cursor = paginator.page().next_cursor
+        with self.assertNumQueries(1) as captured:
+            paginator.page(cursor)
+        self.assertNotIn('OFFSET', captured.captured_queries[0]['sql'])
+        self.assertEqual(paginator.count, 30)
+
+    def test_invalid_cursor(self):
+        paginator = CursorPaginator(Item.objects.all(), 7)
+        for cursor in ('garbage', 'W10', 'W1siYSIsIjEiXSwwLDJd'):
+            with self.subTest(cursor=cursor), self.assertRaises(InvalidCursor):
+                paginator.page(cursor)
+        self.assertEqual(self.client.get(reverse('catalog:catalog') + '?cursor=garbage').status_code, 404)
+        self.assertEqual(self.client.get(reverse('catalog:api_catalog_page') + '?cursor=garbage').status_code, 400)
+
+    def test_infinite_scroll_api(self):
+        cursor = None
+        seen = 0
+        while True:
+            response = self.client.get(reverse('catalog:api_catalog_page'), {'cursor': cursor} if cursor else {})
+            data = response.json()
+            self.assertTrue(data['success'])
+            seen += data['count']
+            cursor = data['next_cursor']
+            if not cursor:
+                break
+        self.assertEqual(seen, 30)
+
+
+class CatalogApiTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        owner = get_user_model().objects.create_user('owner', password='secret')
+        category = Category.objects.create(name='Молоко', slug='milk')
+        vendor = Vendor.objects.create(owner=owner, type='store', name='Vendor')
+        branch = Branch.objects.create(vendor=vendor, name='Branch', address='Address', phone='1',
+                                       latitude=41.3, longitude=69.2)
+        for i in range(3):
+            item = Item.objects.create(vendor=vendor, branch=branch, category=category, title=f'Item {i}', unit='kg')
+            Offer.objects.create(item=item, branch=branch, original_price=Decimal('100.00'), discount_percent=10,
+                                 start_date=date.today())
+        cls.vendor = vendor
+
+    def get(self, resource, **params):
+        return self.client.get(reverse('catalog:api_v1', args=[resource]), params)
+
+    def test_side_tables_hold_each_related_object_once(self):
+        with self.assertNumQueries(5):
+            data = json.loads(self.get('offers').content)
+        self.assertEqual(len(data['data']), 3)
+        self.assertEqual(list(data['included']['vendors']), [str(self.vendor.pk)])
+        self.assertEqual(len(data['included']['items']), 3)
+        self.assertEqual(data['included']['units'], {'kg': 'Kilograms'})
+        self.assertNotIn('vendor_name', data['data'][0])
+
+    def test_sparse_fields(self):
+        data = json.loads(self.get('offers', fields='current_price', **{'fields[items]': 'title'}).content)
+        self.assertEqual(data['data'][0].keys(), {'id', 'current_price'})
+        self.assertEqual(data['included'], {})
+
+        data = json.loads(self.get('offers', fields='item_id', **{'fields[items]': 'title'}).content)
+        self.assertEqual(list(data['included']), ['items'])
+        self.assertEqual(next(iter(data['included']['items'].values())).keys(), {'id', 'title'})
+
+        self.assertEqual(self.get('items', fields='title,secret').status_code, 400)
+
+    def test_etag(self):
+        response = self.get('items')
+        etag = response['ETag']
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('catalog:api_v1', args=['items']), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            Item.objects.first().save()
+            # Tag versions move only when the change is committed
+            response = self.client.get(reverse('catalog:api_v1', args=['items']), HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 304)
+        self.assertTrue(callbacks)
+        response = self.client.get(reverse('catalog:api_v1', args=['items']), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_encoders_agree(self):
+        payload = {'data': [{'id': 1, 'title': 'Молоко', 'price': 9.5, 'end_date': None}], 'included': {'units': {}}}
+        fast = api.encode(payload)
+        with mock.patch.object(api, 'orjson', None):
+            self.assertEqual(json.loads(api.encode(payload)), json.loads(fast))
+
+
+class ConditionalGetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        owner = get_user_model().objects.create_user('owner', password='secret')
+        cls.category = Category.objects.create(name='Молоко', slug='milk')
+        vendor = Vendor.objects.create(owner=owner, type='store', name='Vendor')
+        branch = Branch.objects.create(vendor=vendor, name='Branch', address='Address', phone='1',
+                                       latitude=41.3, longitude=69.2)
+        cls.item = Item.objects.create(vendor=vendor, branch=branch, category=cls.category, title='Item')
+        cls.offer = Offer.objects.create(item=cls.item, branch=branch, original_price=Decimal('100.00'),
+                                         quantity=5, start_date=date.today())
+        cls.owner = owner
+
+    def test_revalidation_costs_one_query(self):
+        url = reverse('catalog:item_detail', args=[self.item.pk])
+        response = self.client.get(url)
+        self.assertIn('public', response['Cache-Control'])
+        with self.assertNumQueries(1):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+        with self.assertNumQueries(1):
+            response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_changes_invalidate(self):
+        from booking.reservations import take_stock
+
+        for url in (reverse('catalog:item_detail', args=[self.item.pk]),
+                    reverse('catalog:category', args=[self.category.slug])):
+            etag = self.client.get(url)['ETag']
+            take_stock(self.offer.pk, 1)
+            with self.subTest(url=url):
+                self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_items_leaving_a_category_invalidate_it(self):
+        url = reverse('catalog:category', args=[self.category.slug])
+        newest = Item.objects.create(vendor=self.item.vendor, branch=self.item.branch, category=self.category,
+                                     title='Newest')
+        other = Category.objects.create(name='Сыр', slug='cheese')
+        changes = {
+            'deactivated': lambda item: setattr(item, 'is_active', False),
+            'moved': lambda item: setattr(item, 'category', other),
+        }
+        for name, change in changes.items():
+            Item.objects.filter(pk=self.item.pk).update(is_active=True, category=self.category)
+            Item.objects.filter(pk=newest.pk).update(updated_at=timezone.now())
+            response = self.client.get(url)
+            self.assertContains(response, 'Item</h6>')
+            item = Item.objects.get(pk=self.item.pk)
+            change(item)
+            with self.captureOnCommitCallbacks(execute=True):
+                item.save()
+            # The item is older than the newest one left in the category
+            Item.objects.filter(pk=item.pk).update(updated_at=newest.updated_at - timedelta(days=1))
+            with self.subTest(name):
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'],
+                                           HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+                self.assertEqual(response.status_code, 200)
+                self.assertNotContains(response, 'Item</h6>')
+
+    def test_signed_in_users_get_private_responses(self):
+        url = reverse('catalog:item_detail', args=[self.item.pk])
+        anonymous = self.client.get(url)['ETag']
+        self.client.force_login(self.owner)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=anonymous)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('private', response['Cache-Control'])
+
+    def test_tag_validated_api_answers_without_queries(self):
+        url = reverse('catalog:api_nearby_offers') + '?lat=41.3&lng=69.2&radius=5'
+        etag = self.client.get(url)['ETag']
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+
+class CardDataTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        owner = get_user_model().objects.create_user('owner', password='secret')
+        vendor = Vendor.objects.create(owner=owner, type='store', name='Vendor')
+        cls.branch = Branch.objects.create(vendor=vendor, name='Branch', address='Address', phone='1',
+                                           latitude=41.3, longitude=69.2)
+        cls.item = Item.objects.create(vendor=vendor, branch=cls.branch, title='Молоко')
+
+    def card(self):
+        self.item.refresh_from_db()
+        return self.item.best_price, self.item.max_discount, self.item.active_offers_count
+
+    def card_image(self):
+        self.item.refresh_from_db()
+        return self.item.primary_image_url
+
+    def make_offer(self, price, discount):
+        return Offer.objects.create(item=self.item, branch=self.branch, original_price=Decimal(price),
+                                    discount_percent=discount, start_date=date.today())
+
+    def test_offer_changes_update_the_card(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            offer = self.make_offer('10.00', 10)
+        self.assertEqual(self.card(), (Decimal('9.00'), 10, 1))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            cheaper = self.make_offer('10.00', 50)
+        self.assertEqual(self.card(), (Decimal('5.00'), 50, 2))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            cheaper.discount_percent = 20
+            cheaper.save()
+        self.assertEqual(self.card(), (Decimal('8.00'), 20, 2))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            cheaper.delete()
+            offer.delete()
+        self.assertEqual(self.card(), (None, 0, 0))
+
+    def test_image_changes_update_the_card(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            second = ItemImage.objects.create(item=self.item, image='items/second.jpg', order=2)
+        self.assertEqual(self.card_image(), '/media/items/second.jpg')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            first = ItemImage.objects.create(item=self.item, image='items/first.jpg', order=1)
+        self.assertEqual(self.card_image(), '/media/items/first.jpg')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            first.order = 3
+            first.save()
+        self.assertEqual(self.card_image(), '/media/items/second.jpg')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            second.delete()
+            first.delete()
+        self.assertEqual(self.card_image(), '')
+
+    def test_changes_are_applied_once_per_transaction(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            offers = [self.make_offer('10.00', discount) for discount in (10, 20, 30)]
+            ItemImage.objects.create(item=self.item, image='items/first.jpg')
+        # Nothing is written before the commit
+        self.assertEqual(self.card(), (None, 0, 0))
+        # One refresh: the item, its images, its offers and the update
+        with self.assertNumQueries(4):
+            for callback in callbacks:
+                callback()
+        self.assertEqual(self.card(), (Decimal('7.00'), 30, 3))
+
+        with CaptureQueriesContext(connection) as queries, self.captureOnCommitCallbacks(execute=True):
+            for offer in offers:
+                offer.delete()
+        self.assertEqual(len([query for query in queries if query['sql'].startswith('UPDATE "catalog_item"')]), 1)
+        self.assertEqual(self.card(), (None, 0, 0))
+
+
+    def test_rolled_back_changes_start_a_new_batch(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            with self.assertRaises(ValueError), transaction.atomic():
+                self.make_offer('10.00', 50)
+                raise ValueError
+            self.make_offer('10.00', 10)
+        self.assertEqual(self.card(), (Decimal('9.00'), 10, 1))
+
+
+class CardCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        owner = get_user_model().objects.create_user('owner', password='secret')
+        cls.vendor = Vendor.objects.create(owner=owner, type='store', name='Vendor')
+        branch = Branch.objects.create(vendor=cls.vendor, name='Branch', address='Address', phone='1',
+                                       latitude=41.3, longitude=69.2)
+        for i in range(4):
+            item = Item.objects.create(vendor=cls.vendor, branch=branch, title=f'Item {i}')
+            Offer.objects.create(item=item, branch=branch, original_price=Decimal('100.00'), discount_percent=10,
+                                 start_date=date.today())
+
+    def setUp(self):
+        cache.clear()
+
+    def card_counts(self):
+        counters = cache_stats()['entries'].get('card:catalog', {'hits': 0, 'misses': 0})
+        return counters['hits'], counters['misses']
+
+    def render(self):
+        hits, misses = self.card_counts()
+        content = self.client.get(reverse('catalog:catalog')).content.decode()
+        new_hits, new_misses = self.card_counts()
+        return content, new_hits - hits, new_misses - misses
+
+    def test_cards_are_reused_until_their_item_changes(self):
+        first, hits, misses = self.render()
+        self.assertEqual((hits, misses), (0, 4))
+        second, hits, misses = self.render()
+        self.assertEqual((hits, misses), (4, 0))
+        self.assertEqual(first, second)
+
+        offer = Offer.objects.first()
+        offer.discount_percent = 35
+        with self.captureOnCommitCallbacks(execute=True):
+            offer.save()
+        content, hits, misses = self.render()
+        self.assertEqual((hits, misses), (3, 1))
+        self.assertIn('-35%', content)
+
+    def test_vendor_changes_invalidate_all_cards(self):
+        self.render()
+        self.vendor.name = 'Renamed'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.vendor.save()
+        content, hits, misses = self.render()
+        self.assertEqual((hits, misses), (0, 4))
+        self.assertIn('Renamed', content)
+
+
+class TemplateBundleTests(TestCase):
+    SOURCE = (
+        "{% extends 'base.html' %}\n"
+        "{% block extra_css %}<style>\n" + "p { color: red; }\n" * 3 + "</style>{% endblock %}\n"
+        "{% block content %}<p>{{ value }}</p>{% endblock %}\n"
+        "{% block extra_js %}<script>\nvar value = '{{ value }}';\n" + "value += 1;\n" * 3 + "</script>"
+        "<script>\nvar small = 1;\n</script><script>\n" + "console.log(1);\n" * 3 + "</script>{% endblock %}\n"
+    )
+
+    def setUp(self):
+        self.source_dir = Path(tempfile.mkdtemp())
+        self.bundle_dir = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.source_dir)
+        self.addCleanup(shutil.rmtree, self.bundle_dir)
+        (self.source_dir / 'pages').mkdir()
+        (self.source_dir / 'pages' / 'page.html').write_text(self.SOURCE)
+
+    def test_large_static_blocks_are_moved_to_hashed_assets(self):
+        text, assets = bundle.extract('pages/page.html', self.SOURCE, min_lines=3)
+        self.assertEqual([asset.path.rsplit('.', 2)[0] for asset in assets], ['bundle/pages/page', 'bundle/pages/page'])
+        self.assertEqual([asset.path.rsplit('.', 1)[1] for asset in assets], ['css', 'js'])
+        self.assertTrue(text.startswith("{% extends 'base.html' %}\n{% load static %}\n"))
+        self.assertIn(f"<link rel=\"stylesheet\" href=\"{{% static '{assets[0].path}' %}}\">", text)
+        self.assertIn(f"<script src=\"{{% static '{assets[1].path}' %}}\"></script>", text)
+        # Template syntax and small blocks stay inline
+        self.assertIn("var value = '{{ value }}';", text)
+        self.assertIn('var small = 1;', text)
+        self.assertEqual(assets[1].content, 'console.log(1);\n' * 3)
+
+    def test_hashes_follow_the_content(self):
+        _, assets = bundle.extract('pages/page.html', self.SOURCE, min_lines=3)
+        _, same = bundle.extract('pages/page.html', self.SOURCE, min_lines=3)
+        _, changed = bundle.extract('pages/page.html', self.SOURCE.replace('red', 'blue'), min_lines=3)
+        self.assertEqual([asset.path for asset in assets], [asset.path for asset in same])
+        self.assertNotEqual(assets[0].path, changed[0].path)
+        self.assertEqual(assets[1].path, changed[1].path)
+
+    def test_bundle_is_stale_when_a_source_template_changes(self):
+        self.assertIsNone(bundle.stale_templates(self.bundle_dir, [self.source_dir]))
+        rewritten = bundle.build(self.bundle_dir, [self.source_dir], min_lines=3)
+        self.assertEqual(list(rewritten), ['pages/page.html'])
+        for asset in rewritten['pages/page.html']:
+            self.assertTrue((self.bundle_dir / 'static' / asset.path).exists())
+        self.assertEqual(bundle.stale_templates(self.bundle_dir, [self.source_dir]), [])
+
+        (self.source_dir / 'pages' / 'page.html').write_text(self.SOURCE.replace('red', 'blue'))
+        (self.source_dir / 'other.html').write_text('<p></p>')
+        self.assertEqual(bundle.stale_templates(self.bundle_dir, [self.source_dir]), ['other.html', 'pages/page.html'])
+
+    def test_production_profile_renders_the_bundle(self):
+        rewritten = bundle.build(self.bundle_dir, bundle.source_dirs() + [self.source_dir], min_lines=3)
+        cart_assets = [asset.path for asset in rewritten['booking/cart.html']]
+        templates = [{
+            'BACKEND': 'django.template.backends.django.DjangoTemplates',
+            'DIRS': [self.bundle_dir / 'templates', *bundle.source_dirs(), self.source_dir],
+            'OPTIONS': {
+                'debug': False,
+                'loaders': [('django.template.loaders.cached.Loader', ['django.template.loaders.filesystem.Loader'])],
+            },
+        }]
+        with override_settings(TEMPLATES=templates):
+            html = render_to_string('pages/page.html', {'value': 'x'})
+            cart = render_to_string('booking/cart.html')
+        self.assertIn("var value = 'x';", html)
+        self.assertNotIn('p { color: red; }', html)
+        self.assertIn('/static/bundle/pages/page.', html)
+        for path in cart_assets:
+            self.assertIn(f'/static/{path}', cart)
+        self.assertNotIn('class FriendlySmartCart', cart)
+
+
+class DatabaseCheckTests(TestCase):
+    def test_tuned_database_reports_its_tuning_only(self):
+        messages = check_database_tuning(databases=['default'])
+        self.assertEqual([message.id for message in messages], ['foodsave.I001'])
+        self.assertIn('vendor=sqlite', messages[0].msg)
+
+    def test_connection_per_request_is_warned_about(self):
+        with mock.patch.dict(connection.settings_dict, {'CONN_MAX_AGE': 0}):
+            messages = check_database_tuning(databases=['default'])
+        self.assertEqual([message.id for message in messages], ['foodsave.I001', 'foodsave.W001'])
+        self.assertIn('conn_max_age=0', messages[0].msg)
+
+
+class PerfTests(TestCase):
+    VIEW = 'GET catalog:api_quick_sets'
+
+    def setUp(self):
+        metrics_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, metrics_dir)
+        settings = override_settings(PERF_METRICS_DIR=metrics_dir, PERF_SAMPLE_RATE=1, PERF_METRICS_TOKEN='secret')
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.addCleanup(perf.reset)
+        perf.reset()
+
+    def sample(self, count=1):
+        for _ in range(count):
+            self.assertEqual(self.client.get(reverse('catalog:api_quick_sets')).status_code, 200)
+
+    def test_sampled_requests_are_recorded_per_view(self):
+        self.sample(2)
+        stats = perf.collect()[self.VIEW]
+        self.assertEqual((stats.requests, stats.errors), (2, 0))
+        self.assertGreater(stats.histograms['queries'].total, 0)
+        self.assertGreater(stats.histograms['bytes'].total, 0)
+
+    def test_requests_are_not_sampled_at_rate_zero(self):
+        with override_settings(PERF_SAMPLE_RATE=0):
+            self.client = self.client_class()
+            self.sample()
+        self.assertEqual(perf.collect(), {})
+
+    def test_flushed_files_of_all_processes_are_merged(self):
+        self.sample()
+        perf.registry.flush()
+        other = perf.metrics_dir() / 'other-1.json'
+        other.write_text(perf.registry.path().read_text())
+        self.assertEqual(perf.collect(include_current=False)[self.VIEW].requests, 2)
+        # The current process counts once: from memory, not from its file
+        self.assertEqual(perf.collect()[self.VIEW].requests, 2)
+
+    def test_metrics_need_staff_or_the_token(self):
+        self.sample()
+        url = reverse('metrics')
+        self.assertEqual(self.client.get(url).status_code, 403)
+        self.assertEqual(self.client.get(url, HTTP_AUTHORIZATION='Bearer wrong').status_code, 403)
+        self.assertEqual(self.client.get(url, HTTP_AUTHORIZATION='Bearer secret').status_code, 200)
+        with override_settings(PERF_METRICS_TOKEN=''):
+            self.assertEqual(self.client.get(url, HTTP_AUTHORIZATION='Bearer ').status_code, 403)
+        staff = get_user_model().objects.create_user('staff', password='secret', is_staff=True)
+        self.client.force_login(staff)
+        self.assertEqual(self.client.get(url).status_code, 200)
+
+    def test_metrics_are_prometheus_histograms(self):
+        self.sample(3)
+        response = self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer secret')
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        lines = response.content.decode().splitlines()
+        self.assertIn('# TYPE foodsave_request_duration_ms histogram', lines)
+        self.assertIn(f'foodsave_request_duration_ms_bucket{{view="{self.VIEW}",le="+Inf"}} 3', lines)
+        self.assertIn(f'foodsave_request_duration_ms_count{{view="{self.VIEW}"}} 3', lines)
+        self.assertIn(f'foodsave_request_errors_total{{view="{self.VIEW}"}} 0', lines)
+        buckets = [int(line.rsplit(' ', 1)[1]) for line in lines
+                   if line.startswith(f'foodsave_request_queries_bucket{{view="{self.VIEW}"')]
+        self.assertEqual(buckets, sorted(buckets))
+
+    def test_report_reads_the_flushed_metrics(self):
+        output = io.StringIO()
+        call_command('perf_report', stdout=output)
+        self.assertIn('No metrics recorded', output.getvalue())
+
+        self.sample(2)
+        perf.registry.flush()
+        output = io.StringIO()
+        call_command('perf_report', '--sort', 'queries', stdout=output)
+        self.assertIn(self.VIEW, output.getvalue())
+
+        output = io.StringIO()
+        call_command('perf_report', '--json', '--reset', stdout=output)
+        report = json.loads(output.getvalue().rsplit('\n', 2)[0])
+        self.assertEqual(sum(report[self.VIEW]['histograms']['time_ms']['counts']), 2)
+        self.assertEqual(list(perf.metrics_dir().glob('*.json')), [])
+
+
+class NearestItemsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        owner = get_user_model().objects.create_user('owner', password='secret')
+        vendor = Vendor.objects.create(owner=owner, type='store', name='Vendor')
+        rng = random.Random(7)
+        points = [(41.311 + rng.uniform(-0.2, 0.2), 69.279 + rng.uniform(-0.2, 0.2)) for _ in range(60)]
+        # Both sides of a grid cell corner (0.05 degree cells)
+        points += [(41.35 + d_lat, 69.25 + d_lng) for d_lat in (-0.0002, 0.0002) for d_lng in (-0.0003, 0.0003)]
+        # Far from everything else: only the full scan finds them
+        points += [(43.0 + rng.uniform(0, 2), 72.0 + rng.uniform(0, 2)) for _ in range(5)]
+        for index, (lat, lng) in enumerate(points):
+            branch = Branch.objects.create(vendor=vendor, name=f'Branch {index}', address='Address', phone='1',
+                                           latitude=lat, longitude=lng)
+            # Some branches hold several items at the same distance
+            for copy in range(1 + index % 3 // 2):
+                Item.objects.create(vendor=vendor, branch=branch, title=f'Item {index}.{copy}')
+        Item.objects.filter(pk__in=Item.objects.order_by('pk').values('pk')[:3]).update(is_active=False)
+
+    @staticmethod
+    def haversine(lat, lng, other_lat, other_lng):
+        lat, lng, other_lat, other_lng = map(math.radians, (lat, lng, other_lat, other_lng))
+        a = (math.sin((other_lat - lat) / 2) ** 2
+             + math.cos(lat) * math.cos(other_lat) * math.sin((other_lng - lng) / 2) ** 2)
+        return 2 * 6371 * math.asin(math.sqrt(a))
+
+    def brute_force(self, lat, lng, limit):
+        items = Item.objects.filter(is_active=True).select_related('branch')
+        distances = sorted(
+            (self.haversine(lat, lng, item.branch.latitude, item.branch.longitude), item.pk) for item in items
+        )
+        return distances[:limit]
+
+    def assertNearest(self, lat, lng, limit=20):
+        expected = self.brute_force(lat, lng, limit)
+        nearest = find_nearest_items(lat, lng, limit=limit)
+        self.assertEqual([item.pk for item in nearest], [pk for _, pk in expected])
+        for item, (distance, _) in zip(nearest, expected):
+            self.assertAlmostEqual(item.distance, distance, places=6)
+
+    def test_dense_area(self):
+        self.assertNearest(41.311, 69.279)
+        self.assertNearest(41.2, 69.4, limit=5)
+
+    def test_point_next_to_a_cell_boundary(self):
+        for lat, lng in ((41.35, 69.25), (41.3499999, 69.2500001), (41.3500001, 69.2499999)):
+            with self.subTest(lat=lat, lng=lng):
+                self.assertNearest(lat, lng, limit=4)
+                self.assertNearest(lat, lng)
+
+    def test_sparse_area_falls_back_to_a_full_scan(self):
+        # The five far items are in range of no ring; the rest are over 100 km away
+        # Rings 0..MAP_MAX_RINGS, then the full scan
+        with self.assertNumQueries(views.MAP_MAX_RINGS + 2):
+            find_nearest_items(44.0, 73.0)
+        self.assertNearest(44.0, 73.0)
+        self.assertNearest(44.0, 73.0, limit=3)
+
+    def test_fewer_items_than_the_limit(self):
+        self.assertNearest(41.311, 69.279, limit=500)
+        self.assertEqual(len(find_nearest_items(41.311, 69.279, limit=500)),
+                         Item.objects.filter(is_active=True).count())
+
+
+class RecommendationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        owner = get_user_model().objects.create_user('owner', password='secret')
+        store = Vendor.objects.create(owner=owner, type='store', name='Store')
+        cafe = Vendor.objects.create(owner=owner, type='cafe', name='Cafe')
+        cls.discounts = {}
+        for vendor, discounts in ((store, list(range(21, 33)) + [5] * 8), (cafe, [40, 40, 40])):
+            branch = Branch.objects.create(vendor=vendor, name='Branch', address='Address', phone='1',
+                                           latitude=41.3, longitude=69.2)
+            for index, discount in enumerate(discounts):
+                item = Item.objects.create(vendor=vendor, branch=branch, title=f'{vendor.name} {index}')
+                Offer.objects.create(item=item, branch=branch, original_price=Decimal('10.00'),
+                                     discount_percent=discount, start_date=date.today())
+                cls.discounts[item.pk] = discount
+        # A second, smaller offer of the best store item
+        cls.best_store_item = max((pk for pk in cls.discounts if cls.discounts[pk] < 40), key=cls.discounts.get)
+        Offer.objects.create(item_id=cls.best_store_item, branch=branch, original_price=Decimal('10.00'),
+                             discount_percent=22, start_date=date.today())
+
+    def setUp(self):
+        cache.clear()
+        recommendations._local_pools.clear()
+        self.addCleanup(recommendations._local_pools.clear)
+
+    def test_pools_are_cached_per_segment_until_the_catalog_changes(self):
+        with self.assertNumQueries(1):
+            products = recommendations.get_pool('products')
+        with self.assertNumQueries(0):
+            self.assertIs(recommendations.get_pool('products'), products)
+        with self.assertNumQueries(1):
+            dishes = recommendations.get_pool('dishes')
+        self.assertEqual({entry['vendor_name'] for entry in products}, {'Store'})
+        self.assertEqual({entry['vendor_name'] for entry in dishes}, {'Cafe'})
+
+        # Another process finds the pool in the shared cache
+        recommendations._local_pools.clear()
+        with self.assertNumQueries(0):
+            self.assertEqual(recommendations.get_pool('products'), products)
+
+        bump_tags(('offer',))
+        with self.assertNumQueries(1):
+            self.assertIsNot(recommendations.get_pool('products'), products)
+
+    def test_high_discounts_come_first(self):
+        picks = recommendations.recommend()
+        discounts = [entry['discount_percent'] for entry in picks[:recommendations.HIGH_DISCOUNT_PICKS]]
+        self.assertEqual(discounts, [40, 40, 40, 32, 31, 30, 29, 28, 27, 26])
+
+        picks = recommendations.recommend(segment='products')
+        discounts = [entry['discount_percent'] for entry in picks[:recommendations.HIGH_DISCOUNT_PICKS]]
+        self.assertEqual(discounts, list(range(32, 22, -1)))
+
+    def test_picks_are_unique_and_fill_the_list(self):
+        for segment in ('all', 'products', 'unknown'):
+            for _ in range(20):
+                picks = recommendations.recommend(segment=segment)
+                item_ids = [entry['id'] for entry in picks]
+                with self.subTest(segment=segment):
+                    self.assertEqual(len(item_ids), recommendations.MAX_RECOMMENDATIONS)
+                    self.assertEqual(len(set(item_ids)), len(item_ids))
+        # Fewer candidates than requested: all of them, once
+        picks = recommendations.recommend(segment='dishes')
+        self.assertEqual(len({entry['id'] for entry in picks}), 3)
+        self.assertEqual(len(picks), 3)
+
+    def test_cart_items_are_skipped(self):
+        best = sorted(self.discounts, key=self.discounts.get, reverse=True)[:5]
+        for _ in range(20):
+            picks = recommendations.recommend(exclude_item_ids=best)
+            self.assertEqual(len(picks), recommendations.MAX_RECOMMENDATIONS)
+            self.assertFalse({entry['id'] for entry in picks} & set(best))
+            # The next best discounts move up
+            discounts = [entry['discount_percent'] for entry in picks[:recommendations.HIGH_DISCOUNT_PICKS]]
+            self.assertEqual(discounts, list(range(30, 20, -1)))
+
+
+class NearbyOffersTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        owner = get_user_model().objects.create_user('owner', password='secret')
+        vendor = Vendor.objects.create(owner=owner, type='store', name='Vendor')
+        cls.offers = []
+        # About 0, 1, 3 and 20 km north of the point
+        for km in (0, 1, 3, 20):
+            branch = Branch.objects.create(vendor=vendor, name=f'{km} km', address='Address', phone='1',
+                                           latitude=41.311 + km / 111.2, longitude=69.279)
+            item = Item.objects.create(vendor=vendor, branch=branch, title=f'Item {km}')
+            cls.offers.append(Offer.objects.create(item=item, branch=branch, original_price=Decimal('10.00'),
+                                                   start_date=date.today()))
+
+    def nearby(self, **params):
+        response = self.client.get(reverse('catalog:api_nearby_offers'), params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_radius_search_returns_the_closest_offers_first(self):
+        data = self.nearby(lat=41.311, lng=69.279, radius=5)
+        self.assertEqual([offer['id'] for offer in data['offers']], [offer.pk for offer in self.offers[:3]])
+        self.assertEqual([round(offer['distance']) for offer in data['offers']], [0, 1, 3])
+
+    def test_bbox_search_has_no_radius(self):
+        data = self.nearby(bbox='41.30,69.27,41.60,69.29', lat=41.311, lng=69.279)
+        self.assertEqual(data['count'], 4)
+
+    def test_missing_point_is_rejected(self):
+        response = self.client.get(reverse('catalog:api_nearby_offers'), {'radius': 5})
+        self.assertEqual(response.status_code, 400)
+
+
+class SearchBackendTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        owner = get_user_model().objects.create_user('owner', password='secret')
+        cls.dairy = Vendor.objects.create(owner=owner, type='store', name='Молочный двор')
+        bakery = Vendor.objects.create(owner=owner, type='store', name='Пекарня')
+        branches = {
+            vendor: Branch.objects.create(vendor=vendor, name='Branch', address='Address', phone='1',
+                                          latitude=41.3, longitude=69.2)
+            for vendor in (cls.dairy, bakery)
+        }
+        cls.milk = Item.objects.create(vendor=bakery, branch=branches[bakery], title='Молоко 3.2%')
+        cls.bread = Item.objects.create(vendor=bakery, branch=branches[bakery], title='Хлеб',
+                                        description='Пшеничный хлеб на молоке')
+        cls.cheese = Item.objects.create(vendor=cls.dairy, branch=branches[cls.dairy], title='Сыр')
+
+    def setUp(self):
+        self.backend = get_search_backend()
+
+    def search(self, query):
+        return self.backend.search(query)
+
+    def test_sqlite_uses_fts5(self):
+        self.assertIsInstance(self.backend, SQLiteFTSBackend)
+
+    def test_title_matches_rank_above_vendor_and_description_matches(self):
+        self.assertEqual(self.search('молок'), [self.milk.pk, self.bread.pk])
+        self.assertEqual(self.search('мол'), [self.milk.pk, self.cheese.pk, self.bread.pk])
+        self.assertEqual(self.search('хлеб'), [self.bread.pk])
+
+    def test_every_word_is_a_prefix_that_must_match(self):
+        self.assertEqual(self.search('Хле мол'), [self.bread.pk])
+        self.assertEqual(self.search('сыр мол'), [self.cheese.pk])
+        self.assertEqual(self.search('сыр хлеб'), [])
+        self.assertEqual(self.search('молоко*"'), [self.milk.pk])
+        self.assertEqual(self.search('  %% '), [])
+
+    def test_item_changes_update_the_index(self):
+        self.milk.title = 'Кефир'
+        self.milk.save()
+        self.assertEqual(self.search('кеф'), [self.milk.pk])
+        self.assertEqual(self.search('молок'), [self.bread.pk])
+
+        self.bread.is_active = False
+        self.bread.save()
+        self.assertEqual(self.search('хлеб'), [])
+
+        self.bread.is_active = True
+        self.bread.save()
+        self.assertEqual(self.search('хлеб'), [self.bread.pk])
+
+        bread_pk = self.bread.pk
+        self.bread.delete()
+        self.assertEqual(self.search('хлеб'), [])
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT COUNT(*) FROM {SQLiteFTSBackend.table} WHERE rowid = %s', [bread_pk])
+            self.assertEqual(cursor.fetchone()[0], 0)
+
+    def test_vendor_rename_reindexes_its_items(self):
+        self.dairy.name = 'Ферма'
+        self.dairy.save()
+        self.assertEqual(self.search('ферм'), [self.cheese.pk])
+        self.assertEqual(self.search('мол'), [self.milk.pk, self.bread.pk])
+
+
+class SuggestIndexTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        owner = get_user_model().objects.create_user('owner', password='secret')
+        cls.vendor = Vendor.objects.create(owner=owner, type='store', name='Молочный двор')
+        branch = Branch.objects.create(vendor=cls.vendor, name='Branch', address='Address', phone='1',
+                                       latitude=41.3, longitude=69.2)
+        cls.category = Category.objects.create(name='Молочные продукты', slug='dairy')
+        cls.items = [
+            Item.objects.create(vendor=cls.vendor, branch=branch, category=cls.category, title=title)
+            for title in ('Молоко 3.2%', 'Кефир', 'Свежее молоко')
+        ]
+
+    def setUp(self):
+        suggest._index = None
+        suggest._built_at = 0
+        self.addCleanup(setattr, suggest, '_index', None)
+
+    def texts(self, prefix):
+        return [suggestion['text'] for suggestion in suggest.get_suggest_index().lookup(prefix)]
+
+    def test_prefix_lookup_ranks_names_starting_with_the_prefix_first(self):
+        with self.assertNumQueries(3):
+            self.assertEqual(self.texts('мол'), ['Молочные продукты', 'Молочный двор', 'Молоко 3.2%', 'Свежее молоко'])
+        with self.assertNumQueries(0):
+            self.assertEqual(self.texts('кеф'), ['Кефир'])
+        self.assertEqual(self.texts('xyz'), [])
+
+    def test_load_sorts_once_and_stops_at_the_cap(self):
+        index = suggest.PrefixIndex(max_entries=3)
+        index.load([('item', 1, 'Сыр', '/1/'), ('item', 2, 'Хлеб белый', '/2/'), ('item', 3, 'Чай', '/3/')])
+        self.assertEqual(index.keys, sorted(index.keys))
+        self.assertEqual(len(index), 3)
+        self.assertEqual(sorted(pk for kind, pk in index.entries), [1, 2])
+
+    def test_committed_changes_patch_the_index(self):
+        self.assertEqual(self.texts('кеф'), ['Кефир'])
+        item = self.items[1]
+        with self.captureOnCommitCallbacks(execute=True):
+            item.title = 'Ряженка'
+            item.save()
+        self.assertEqual(self.texts('кеф'), [])
+        self.assertEqual(self.texts('ряж'), ['Ряженка'])
+        with self.captureOnCommitCallbacks(execute=True):
+            item.delete()
+        self.assertEqual(self.texts('ряж'), [])
+
+    def test_changes_committed_during_a_rebuild_are_kept(self):
+        build_index = suggest.build_index
+
+        def build_while_an_item_changes():
+            index = build_index()
+            suggest.patch('add', 'item', 999, 'Творог', '/999/')
+            return index
+
+        with mock.patch.object(suggest, 'build_index', build_while_an_item_changes):
+            suggest.rebuild()
+        self.assertEqual(self.texts('твор'), ['Творог'])
+
+    def test_stale_index_is_rebuilt_in_the_background(self):
+        old = suggest.get_suggest_index()
+        suggest._built_at = 0
+        release = threading.Event()
+        new = suggest.PrefixIndex()
+
+        def slow_build():
+            release.wait(5)
+            return new
+
+        with mock.patch.object(suggest, 'build_index', slow_build):
+            # The request is answered from the old index while the build runs
+            self.assertIs(suggest.get_suggest_index(), old)
+            self.assertIs(suggest.get_suggest_index(), old)
+            release.set()
+            with suggest._build_lock:
+                pass
+        self.assertIs(suggest.get_suggest_index(), new)
+
+    def test_api(self):
+        response = self.client.get(reverse('catalog:api_suggest'), {'q': 'молоко'})
+        self.assertEqual([s['text'] for s in response.json()['suggestions']], ['Молоко 3.2%', 'Свежее молоко'])
+
+
+class QuickSetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        QuickSet.objects.all().delete()
+        owner = get_user_model().objects.create_user('owner', password='secret')
+        vendor = Vendor.objects.create(owner=owner, type='store', name='Vendor')
+        cls.branch = Branch.objects.create(vendor=vendor, name='Branch', address='Address', phone='1',
+                                           latitude=41.3, longitude=69.2)
+        dairy = Category.objects.create(name='Молоко и сыр', slug='dairy')
+        bakery = Category.objects.create(name='Хлеб', slug='bakery')
+        cls.items = {}
+        for title, category, discount, tags in [
+            ('Молоко', dairy, 30, ['halal']),
+            ('Сыр', dairy, 10, []),
+            ('Кефир', dairy, 50, []),
+            ('Хлеб', bakery, 40, ['halal']),
+        ]:
+            item = Item.objects.create(vendor=vendor, branch=cls.branch, category=category, title=title, tags=tags)
+            Offer.objects.create(item=item, branch=cls.branch, original_price=Decimal('10.00'),
+                                 discount_percent=discount, start_date=date.today())
+            cls.items[title] = item
+        cls.dairy = QuickSet.objects.create(slug='dairy', name='Dairy', category_keyword='МОЛОКО', max_items=2)
+        cls.deals = QuickSet.objects.create(slug='deals', name='Deals', min_discount=35, max_items=5, order=1)
+        cls.halal = QuickSet.objects.create(slug='halal', name='Halal', tags=['Halal'], max_items=5, order=2)
+
+    def setUp(self):
+        cache.clear()
+
+    def titles(self):
+        response = self.client.get(reverse('catalog:api_quick_sets'))
+        return {quick_set['id']: [item['title'] for item in quick_set['items']]
+                for quick_set in response.json()['quick_sets']}
+
+    def test_rules(self):
+        quick_sets.refresh_quick_sets()
+        self.assertEqual(self.titles(), {
+            'dairy': ['Кефир', 'Молоко'],
+            'deals': ['Кефир', 'Хлеб'],
+            'halal': ['Хлеб', 'Молоко'],
+        })
+
+    def test_endpoint_only_reads_the_materialized_items(self):
+        quick_sets.refresh_quick_sets()
+        quick_sets.mark_stale()
+        # The stale flag is handled after the response, not inside the view
+        with self.assertNumQueries(1):
+            quick_sets.get_quick_sets_data()
+
+    def test_committed_changes_refresh_the_sets_after_the_next_response(self):
+        quick_sets.refresh_quick_sets()
+        with self.captureOnCommitCallbacks(execute=True):
+            Offer.objects.filter(item=self.items['Сыр']).update(discount_percent=90)
+            Offer.objects.get(item=self.items['Сыр']).save()
+        self.assertTrue(cache.get(quick_sets.STALE_KEY))
+        self.client.get(reverse('catalog:api_quick_sets'))
+        self.assertIsNone(cache.get(quick_sets.STALE_KEY))
+        self.assertEqual(self.titles()['deals'], ['Сыр', 'Кефир', 'Хлеб'])
+
+    def test_only_one_request_refreshes_at_a_time(self):
+        quick_sets.mark_stale()
+        cache.add(quick_sets.REFRESH_LOCK_KEY, True)
+        with mock.patch.object(quick_sets, 'refresh_quick_sets') as refresh:
+            self.assertFalse(quick_sets.refresh_if_stale())
+            refresh.assert_not_called()
+            # The set stays stale for the request that finishes after the refresh
+            cache.delete(quick_sets.REFRESH_LOCK_KEY)
+            self.assertTrue(quick_sets.refresh_if_stale())
+            refresh.assert_called_once()
+        self.assertFalse(quick_sets.refresh_if_stale())
+
+    def test_rule_changes_mark_the_sets_stale(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.deals.min_discount = 45
+            self.deals.save()
+        self.assertTrue(cache.get(quick_sets.STALE_KEY))
+        self.client.get(reverse('catalog:catalog'))
+        self.assertEqual(self.titles()['deals'], ['Кефир'])
+
+    def test_all_sets_are_read_with_one_offer_query(self):
+        with CaptureQueriesContext(connection) as queries:
+            quick_sets.refresh_quick_sets()
+        self.assertEqual(len([query for query in queries if 'FROM "catalog_offer"' in query['sql']]), 1)
+
+    def test_current_sets_are_skipped(self):
+        self.assertEqual(len(quick_sets.refresh_quick_sets()), 3)
+        # The sets and their categories, no offers
+        with self.assertNumQueries(2):
+            self.assertEqual(quick_sets.refresh_quick_sets(), [])
+        self.assertEqual(len(quick_sets.refresh_quick_sets(force=True)), 3)
+
+        # Category rules live in a separate table and still count as a change
+        self.halal.categories.add(Category.objects.get(slug='bakery'))
+        self.assertEqual(quick_sets.refresh_quick_sets(), [self.halal])
+        self.assertEqual(self.titles()['halal'], ['Хлеб'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Offer.objects.get(item=self.items['Сыр']).save()
+        self.assertEqual(len(quick_sets.refresh_quick_sets()), 3)
+
+    def test_scan_is_bounded_for_rarely_matching_rules(self):
+        rare = QuickSet.objects.create(slug='rare', name='Rare', tags=['kosher'])
+        with mock.patch.object(quick_sets, 'SCAN_LIMIT', 2), CaptureQueriesContext(connection) as queries:
+            quick_sets.refresh_quick_sets([rare])
+        offer_reads = [query['sql'] for query in queries if 'FROM "catalog_offer"' in query['sql']]
+        self.assertEqual(len(offer_reads), 1)
+        self.assertIn('LIMIT 2', offer_reads[0])
+        rare.refresh_from_db()
+        self.assertEqual(rare.items_data, [])
+
+
+class LifecycleTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        owner = get_user_model().objects.create_user('owner', password='secret')
+        vendor = Vendor.objects.create(owner=owner, type='store', name='Vendor')
+        cls.branch = Branch.objects.create(vendor=vendor, name='Branch', address='Address', phone='1',
+                                           latitude=41.3, longitude=69.2)
+        cls.today = date.today()
+        cls.item = Item.objects.create(vendor=vendor, branch=cls.branch, title='Item')
+        cls.ended = cls.offer(discount_percent=50, end_date=cls.today - timedelta(days=1))
+        cls.ends_today = cls.offer(discount_percent=10, end_date=cls.today)
+        # Limited stock all held in a cart, and unlimited offers with and without reservations
+        cls.held = cls.offer(quantity=0)
+        cls.unlimited = cls.offer(quantity=0)
+        cls.unlimited_in_cart = cls.offer(quantity=0)
+        cart = Cart.objects.create()
+        expires_at = timezone.now() + timedelta(minutes=15)
+        Reservation.objects.create(cart=cart, offer=cls.held, quantity=2, expires_at=expires_at)
+        Reservation.objects.create(cart=cart, offer=cls.unlimited_in_cart, quantity=1, holds_stock=False,
+                                   expires_at=expires_at)
+        Item.objects.all().refresh_card_data()
+
+    @classmethod
+    def offer(cls, item=None, **fields):
+        values = {'item': item or cls.item, 'branch': cls.branch, 'original_price': Decimal('100.00'),
+                  'quantity': 5, 'start_date': cls.today - timedelta(days=7)}
+        values.update(fields)
+        return Offer.objects.create(**values)
+
+    def statuses(self):
+        return dict(Offer.objects.values_list('pk', 'status'))
+
+    def test_ended_and_held_offers_move_on(self):
+        self.assertEqual(lifecycle.run_lifecycle(self.today), {'expired': 1, 'sold_out': 1})
+        statuses = self.statuses()
+        self.assertEqual(statuses.pop(self.ended.pk), 'expired')
+        self.assertEqual(statuses.pop(self.held.pk), 'sold_out')
+        self.assertEqual(set(statuses.values()), {'available'})
+
+        self.assertEqual(lifecycle.run_lifecycle(self.today), {'expired': 0, 'sold_out': 0})
+
+    def test_manual_statuses_are_not_expired_twice(self):
+        Offer.objects.filter(pk=self.ended.pk).update(status='expired')
+        self.assertEqual(lifecycle.run_lifecycle(self.today)['expired'], 0)
+
+    def test_batches(self):
+        items = [Item.objects.create(vendor=self.item.vendor, branch=self.branch, title=f'Old {i}') for i in range(4)]
+        for item in items:
+            self.offer(item, end_date=self.today - timedelta(days=2))
+        offers = lifecycle.transitions(self.today)[0][1]
+        with CaptureQueriesContext(connection) as queries:
+            updated, item_ids = lifecycle.apply_transition(offers, 'expired', batch_size=2)
+        self.assertEqual(updated, 5)
+        self.assertEqual(item_ids, {self.item.pk, *(item.pk for item in items)})
+        updates = [query for query in queries if query['sql'].startswith('UPDATE "catalog_offer"')]
+        self.assertEqual(len(updates), 3)
+        self.assertFalse(offers.exists())
+
+    def test_cards_and_caches_follow_a_run(self):
+        self.item.refresh_from_db()
+        self.assertEqual(self.item.max_discount, 50)
+        versions = tag_versions(('offer', 'item'))
+        with mock.patch.object(lifecycle, 'refresh_quick_sets') as refresh:
+            with self.captureOnCommitCallbacks(execute=True):
+                lifecycle.run_lifecycle(self.today)
+                # Cached pages are only invalidated once the new statuses are committed
+                self.assertEqual(tag_versions(('offer', 'item')), versions)
+            refresh.assert_called_once_with()
+        self.assertNotEqual(tag_versions(('offer', 'item')), versions)
+        self.item.refresh_from_db()
+        self.assertEqual((self.item.max_discount, self.item.active_offers_count), (10, 3))
+
+    def test_quiet_runs_leave_the_caches_alone(self):
+        lifecycle.run_lifecycle(self.today)
+        versions = tag_versions(('offer', 'item'))
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            lifecycle.run_lifecycle(self.today)
+        self.assertEqual(callbacks, [])
+        self.assertEqual(tag_versions(('offer', 'item')), versions)
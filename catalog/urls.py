@@ -1,5 +1,5 @@
 from django.urls import path
-from . import views
+from . import api, views
 
 app_name = 'catalog'
 
@@ -9,8 +9,13 @@ urlpatterns = [
     path('category/<slug:category_slug>/', views.CategoryView.as_view(), name='category'),
     path('item/<int:pk>/', views.ItemDetailView.as_view(), name='item_detail'),
     path('search/', views.SearchView.as_view(), name='search'),
+    path('api/v1/<slug:resource>/', api.catalog_api, name='api_v1'),
+    path('api/items/', views.get_catalog_page, name='api_catalog_page'),
+    path('api/suggest/', views.get_suggestions, name='api_suggest'),
+    path('api/nearby-offers/', views.get_nearby_offers, name='api_nearby_offers'),
     path('api/recommendations/', views.get_recommendations, name='api_recommendations'),
     path('api/quick-sets/', views.get_quick_sets, name='api_quick_sets'),
+    path('api/cache-stats/', views.get_cache_stats, name='api_cache_stats'),
     path('api/custom-sets/', views.get_custom_sets, name='api_custom_sets'),
     path('api/save-custom-set/', views.save_custom_set, name='api_save_custom_set'),
 ]
@@ -1,42 +1,62 @@
 from django.shortcuts import render, get_object_or_404
+from django.template.loader import render_to_string
 from django.views.generic import ListView, DetailView
-from django.db.models import Q
+from django.utils.decorators import method_decorator
+from django.db.models import Prefetch, Q, prefetch_related_objects
 from django.http import JsonResponse
-import math
+from django.contrib.admin.views.decorators import staff_member_required
+from django.core.paginator import Paginator
+import heapq
+from foodsave.pagination import CursorPaginationMixin, CursorPaginator, InvalidCursor
+from .caching import CATALOG_TAGS, active_categories, cache_stats
+from .conditional import category_last_modified, conditional, item_last_modified
 from .models import Item, Category, Offer
+from .quick_sets import get_quick_sets_data
+from .recommendations import recommend
+from .search import RankedResults, get_search_backend
+from .suggest import get_suggest_index
 from vendors.models import Vendor, Branch
+from booking.reservations import cart_item_ids
+from vendors.geo import batch_distances, bounding_box, distances_within, ring_cells, ring_radius_km
 from django.utils import timezone
 import json
 
 
-class CatalogView(ListView):
+def catalog_queryset(vendor_type=None):
+    """Active catalog items, optionally only products or only dishes"""
+    # Cards show no counts; without the aggregate the page query stops after LIMIT rows
+    queryset = Item.objects.filter(is_active=True).with_card_data(counts=False)
+    
+    # Filter by vendor type (products vs dishes)
+    if vendor_type == 'products':
+        # Products from stores
+        queryset = queryset.filter(vendor__type='store')
+    elif vendor_type == 'dishes':
+        # Dishes from restaurants and cafes
+        queryset = queryset.filter(vendor__type__in=['restaurant', 'cafe'])
+    
+    return queryset
+
+
+class CatalogView(CursorPaginationMixin, ListView):
     model = Item
     template_name = 'catalog/catalog.html'
     context_object_name = 'items'
     paginate_by = 12
     
     def get_queryset(self):
-        queryset = Item.objects.filter(is_active=True).select_related('vendor', 'category')
-        
-        # Filter by vendor type (products vs dishes)
-        vendor_type = self.request.GET.get('type')
-        if vendor_type == 'products':
-            # Products from stores
-            queryset = queryset.filter(vendor__type='store')
-        elif vendor_type == 'dishes':
-            # Dishes from restaurants and cafes
-            queryset = queryset.filter(vendor__type__in=['restaurant', 'cafe'])
-        
-        return queryset
+        return catalog_queryset(self.request.GET.get('type'))
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['categories'] = Category.objects.filter(is_active=True)
+        context['categories'] = active_categories()
         context['current_type'] = self.request.GET.get('type', '')
         return context
 
 
-class CategoryView(ListView):
+# Items leaving the category (moved, deactivated by bulk updates) only show in the tags
+@method_decorator(conditional(category_last_modified, tags=CATALOG_TAGS), name='dispatch')
+class CategoryView(CursorPaginationMixin, ListView):
     model = Item
     template_name = 'catalog/category.html'
     context_object_name = 'items'
@@ -44,15 +64,16 @@ class CategoryView(ListView):
     
     def get_queryset(self):
         self.category = get_object_or_404(Category, slug=self.kwargs['category_slug'])
-        return Item.objects.filter(category=self.category, is_active=True).select_related('vendor')
+        return Item.objects.filter(category=self.category, is_active=True).with_card_data(counts=False)
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context['category'] = self.category
-        context['categories'] = Category.objects.filter(is_active=True)
+        context['categories'] = active_categories()
         return context
 
 
+@method_decorator(conditional(item_last_modified), name='dispatch')
 class ItemDetailView(DetailView):
     model = Item
     template_name = 'catalog/item_detail.html'
@@ -77,12 +98,11 @@ class SearchView(ListView):
     def get_queryset(self):
         query = self.request.GET.get('q')
         if query:
-            return Item.objects.filter(
-                Q(title__icontains=query) | 
-                Q(description__icontains=query) |
-                Q(vendor__name__icontains=query),
-                is_active=True
-            ).select_related('vendor', 'category')
+            # Ranked by relevance; only the current page is loaded from the DB
+            return RankedResults(
+                get_search_backend().search(query),
+                Item.objects.with_card_data(counts=False)
+            )
         return Item.objects.none()
     
     def get_context_data(self, **kwargs):
@@ -91,19 +111,50 @@ class SearchView(ListView):
         return context
 
 
-def calculate_distance(lat1, lon1, lat2, lon2):
-    """Calculate distance between two points using Haversine formula"""
-    R = 6371  # Earth's radius in kilometers
-    
-    lat1_rad = math.radians(lat1)
-    lat2_rad = math.radians(lat2)
-    delta_lat = math.radians(lat2 - lat1)
-    delta_lon = math.radians(lon2 - lon1)
-    
-    a = math.sin(delta_lat/2)**2 + math.cos(lat1_rad) * math.cos(lat2_rad) * math.sin(delta_lon/2)**2
-    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1-a))
-    
-    return R * c
+# Rings of grid cells to scan before falling back to a full scan
+MAP_MAX_RINGS = 10
+
+
+def find_nearest_items(lat, lng, limit=20):
+    """Return the ``limit`` active items closest to a point.
+
+    Reads the branch grid cells ring by ring around the point and keeps a
+    bounded heap of the closest items, stopping as soon as no unread cell can
+    hold anything closer than the current worst match. Each returned item
+    carries its distance in km as ``item.distance``.
+    """
+    items = Item.objects.filter(is_active=True).select_related('vendor', 'branch', 'category')
+    heap = []  # max-heap of (-distance, -pk, item), at most ``limit`` long
+
+    def push(candidates):
+        candidates = [item for item in candidates if item.branch.latitude and item.branch.longitude]
+        distances = batch_distances(
+            lat, lng,
+            [item.branch.latitude for item in candidates],
+            [item.branch.longitude for item in candidates],
+        )
+        for item, distance in zip(candidates, distances):
+            entry = (-float(distance), -item.pk, item)
+            if len(heap) < limit:
+                heapq.heappush(heap, entry)
+            elif entry[:2] > heap[0][:2]:
+                heapq.heapreplace(heap, entry)
+
+    for ring in range(MAP_MAX_RINGS + 1):
+        push(items.filter(branch__geo_cell__in=ring_cells(lat, lng, ring)))
+        if len(heap) == limit and -heap[0][0] <= ring_radius_km(lat, ring):
+            break
+    else:
+        # Nothing close enough within the scanned rings: take everything else
+        heap.clear()
+        push(items)
+
+    nearest = []
+    for entry in sorted(heap, key=lambda entry: (-entry[0], -entry[1])):
+        item = entry[2]
+        item.distance = -entry[0]
+        nearest.append(item)
+    return nearest
 
 
 class MapView(ListView):
@@ -118,23 +169,8 @@ class MapView(ListView):
         if not user_lat or not user_lng:
             return Item.objects.none()
         
-        # Get all active items with their branches
-        items = Item.objects.filter(is_active=True).select_related('vendor', 'branch', 'category')
-        
-        # Calculate distances and sort by proximity
-        items_with_distance = []
-        for item in items:
-            if item.branch and item.branch.latitude and item.branch.longitude:
-                distance = calculate_distance(
-                    user_lat, user_lng,
-                    float(item.branch.latitude), 
-                    float(item.branch.longitude)
-                )
-                items_with_distance.append((item, distance))
-        
-        # Sort by distance and return closest 20 items
-        items_with_distance.sort(key=lambda x: x[1])
-        return [item for item, distance in items_with_distance[:20]]
+        # Closest 20 items, read from the branch spatial index
+        return find_nearest_items(user_lat, user_lng, limit=20)
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
@@ -144,105 +180,205 @@ class MapView(ListView):
         context['user_lat'] = user_lat
         context['user_lng'] = user_lng
         
-        # Prepare items with distances for the map
+        # Prepare items for the map (distances come from find_nearest_items)
+        prefetch_related_objects(context['nearby_items'], Prefetch(
+            'offers', queryset=Offer.objects.available().order_by(*Offer.CARD_ORDERING), to_attr='active_offers'
+        ))
         items_data = []
         for item in context['nearby_items']:
-            if item.branch and item.branch.latitude and item.branch.longitude:
-                distance = calculate_distance(
-                    float(user_lat), float(user_lng),
-                    float(item.branch.latitude), 
-                    float(item.branch.longitude)
-                )
-                items_data.append({
-                    'item': item,
-                    'distance': round(distance, 2),
-                    'lat': float(item.branch.latitude),
-                    'lng': float(item.branch.longitude)
-                })
+            items_data.append({
+                'item': item,
+                'distance': round(item.distance, 2),
+                'lat': float(item.branch.latitude),
+                'lng': float(item.branch.longitude)
+            })
         
         context['items_data'] = items_data
         return context
 
 
-def get_recommendations(request):
-    """API endpoint для получения рекомендаций товаров"""
-    from django.db.models import Count, Avg
-    from datetime import date
-    import random
-    
+SUGGEST_DEFAULT_LIMIT = 8
+SUGGEST_MAX_LIMIT = 20
+
+
+def get_catalog_page(request):
+    """API endpoint для бесконечной прокрутки каталога: следующая страница карточек по курсору"""
     try:
-        # Получаем активные предложения с товарами
-        offers = Offer.objects.filter(
-            is_active=True,
-            status='available',
-            item__is_active=True,
-            item__vendor__is_active=True,
-            start_date__lte=date.today()
-        ).select_related(
-            'item', 
-            'item__vendor', 
-            'item__category'
-        ).prefetch_related('item__images')
-        
-        # Исключаем товары, которые уже в корзине
-        cart_items = getattr(request, 'session', {}).get('cart', [])
-        cart_item_ids = [item.get('item_id') for item in cart_items if item.get('item_id')]
-        if cart_item_ids:
-            offers = offers.exclude(item_id__in=cart_item_ids)
-        
-        # Алгоритм рекомендаций
-        recommendations = []
-        
-        # 1. Товары с высокой скидкой
-        high_discount_items = offers.filter(
-            discount_percent__gte=20
-        ).order_by('-discount_percent')[:10]
-        
-        # 2. Случайные товары для разнообразия
-        random_items = list(offers.order_by('?')[:10])
-        
-        # Объединяем и убираем дубликаты
-        all_offers = list(high_discount_items) + list(random_items)
-        seen_items = set()
-        unique_offers = []
+        paginator = CursorPaginator(catalog_queryset(request.GET.get('type')), CatalogView.paginate_by)
+        try:
+            page = paginator.page(request.GET.get('cursor'))
+        except InvalidCursor:
+            return JsonResponse({
+                'success': False,
+                'error': 'Неверный курсор страницы'
+            }, status=400)
         
-        for offer in all_offers:
-            if offer.item_id not in seen_items and len(unique_offers) < 12:
-                unique_offers.append(offer)
-                seen_items.add(offer.item_id)
+        return JsonResponse({
+            'success': True,
+            'html': render_to_string('catalog/item_cards.html', {'items': page.object_list}, request=request),
+            'count': len(page),
+            'next_cursor': page.next_cursor
+        })
         
-        # Формируем ответ
-        recommendations_data = []
-        for offer in unique_offers:
+    except Exception as e:
+        return JsonResponse({
+            'success': False,
+            'error': str(e)
+        }, status=500)
+
+
+@conditional(tags=CATALOG_TAGS, per_user=False)
+def get_suggestions(request):
+    """API endpoint для подсказок при вводе поискового запроса (без обращения к БД)"""
+    try:
+        query = request.GET.get('q', '')
+        try:
+            limit = min(int(request.GET.get('limit', SUGGEST_DEFAULT_LIMIT)), SUGGEST_MAX_LIMIT)
+        except ValueError:
+            limit = SUGGEST_DEFAULT_LIMIT
+
+        return JsonResponse({
+            'success': True,
+            'suggestions': get_suggest_index().lookup(query, limit) if limit > 0 else []
+        })
+
+    except Exception as e:
+        return JsonResponse({
+            'success': False,
+            'error': str(e)
+        }, status=500)
+
+
+NEARBY_DEFAULT_RADIUS_KM = 5
+NEARBY_MAX_RADIUS_KM = 50
+NEARBY_PAGE_SIZE = 20
+NEARBY_MAX_PAGE_SIZE = 100
+
+
+@conditional(tags=CATALOG_TAGS, per_user=False)
+def get_nearby_offers(request):
+    """API endpoint для поиска доступных предложений рядом с точкой или в области карты
+
+    Параметры: ``lat``/``lng`` и ``radius`` (км) либо ``bbox=south,west,north,east``,
+    фильтры ``type``, ``category``, ``min_discount`` и пагинация ``page``/``page_size``.
+    """
+    try:
+        try:
+            lat = request.GET.get('lat')
+            lng = request.GET.get('lng')
+            lat = float(lat) if lat else None
+            lng = float(lng) if lng else None
+            radius = None
+            if request.GET.get('bbox'):
+                south, west, north, east = (float(v) for v in request.GET['bbox'].split(','))
+                if south > north or west > east:
+                    raise ValueError
+                if lat is None or lng is None:
+                    lat, lng = (south + north) / 2, (west + east) / 2
+            elif lat is not None and lng is not None:
+                radius = min(float(request.GET.get('radius', NEARBY_DEFAULT_RADIUS_KM)), NEARBY_MAX_RADIUS_KM)
+                if radius <= 0:
+                    raise ValueError
+                south, north, west, east = bounding_box(lat, lng, radius)
+            else:
+                raise ValueError
+            min_discount = float(request.GET.get('min_discount', 0))
+            page_size = min(int(request.GET.get('page_size', NEARBY_PAGE_SIZE)), NEARBY_MAX_PAGE_SIZE)
+            if page_size <= 0:
+                raise ValueError
+        except ValueError:
+            return JsonResponse({
+                'success': False,
+                'error': 'Укажите lat, lng и radius или bbox=south,west,north,east'
+            }, status=400)
+
+        offers = Offer.objects.live().filter(
+            branch__latitude__range=(south, north),
+            branch__longitude__range=(west, east),
+        )
+
+        vendor_type = request.GET.get('type')
+        if vendor_type == 'products':
+            offers = offers.filter(item__vendor__type='store')
+        elif vendor_type == 'dishes':
+            offers = offers.filter(item__vendor__type__in=['restaurant', 'cafe'])
+
+        category = request.GET.get('category')
+        if category:
+            offers = offers.filter(item__category__slug=category)
+
+        if min_discount > 0:
+            offers = offers.filter(discount_percent__gte=min_discount)
+
+        # Точные расстояния считаем только для того, что прошло фильтр в БД
+        rows = list(offers.values_list('id', 'branch__latitude', 'branch__longitude'))
+        lats = [row[1] for row in rows]
+        lngs = [row[2] for row in rows]
+        if radius is None:
+            indexes, distances = range(len(rows)), batch_distances(lat, lng, lats, lngs)
+        else:
+            indexes, distances = distances_within(lat, lng, lats, lngs, radius)
+        matches = sorted((float(distance), rows[index][0]) for index, distance in zip(indexes, distances))
+
+        paginator = Paginator(matches, page_size)
+        page = paginator.get_page(request.GET.get('page'))
+
+        page_offers = Offer.objects.filter(
+            id__in=[offer_id for _, offer_id in page]
+        ).select_related(
+            'item',
+            'item__vendor',
+            'item__category',
+            'branch'
+        ).in_bulk()
+
+        offers_data = []
+        for distance, offer_id in page:
+            offer = page_offers[offer_id]
             item = offer.item
-            try:
-                primary_image = item.images.filter(is_primary=True).first()
-                image_url = primary_image.image.url if primary_image else ''
-            except:
-                image_url = ''
-            
-            # Определяем тип бейджа
-            badge_type = 'discount'
-            badge_text = f'-{int(offer.discount_percent)}%'
-            
-            if offer.discount_percent >= 50:
-                badge_type = 'hot'
-                badge_text = 'ГОРЯЧЕЕ'
-            
-            recommendations_data.append({
-                'id': item.id,
-                'title': item.title or 'Без названия',
-                'vendor_name': item.vendor.name if item.vendor else 'Неизвестный продавец',
-                'original_price': float(offer.original_price),
+            offers_data.append({
+                'id': offer.id,
+                'item_id': item.id,
+                'title': item.title,
+                'vendor_name': item.vendor.name,
+                'branch_name': offer.branch.name,
+                'category': item.category.name if item.category else '',
                 'current_price': float(offer.current_price),
+                'original_price': float(offer.original_price),
                 'discount_percent': int(offer.discount_percent),
-                'image_url': image_url,
-                'badge_type': badge_type,
-                'badge_text': badge_text,
-                'unit': dict(item.UNIT_CHOICES).get(item.unit, item.unit) if hasattr(item, 'UNIT_CHOICES') else 'шт',
-                'category': item.category.name if item.category else '',
-                'description': (item.description[:100] + '...') if item.description and len(item.description) > 100 else (item.description or '')
+                'image_url': item.primary_image_url or '/static/images/placeholder.jpg',
+                'distance': round(distance, 2),
+                'lat': offer.branch.latitude,
+                'lng': offer.branch.longitude,
             })
+
+        return JsonResponse({
+            'success': True,
+            'offers': offers_data,
+            'count': paginator.count,
+            'page': page.number,
+            'num_pages': paginator.num_pages,
+            'has_next': page.has_next()
+        })
+
+    except Exception as e:
+        return JsonResponse({
+            'success': False,
+            'error': str(e)
+        }, status=500)
+
+
+def cart_items(request):
+    return ','.join(map(str, cart_item_ids(request)))
+
+
+@conditional(tags=CATALOG_TAGS, per_user=False, vary_on=cart_items, private=True)
+def get_recommendations(request):
+    """API endpoint для получения рекомендаций товаров"""
+    try:
+        # Исключаем товары, которые уже в корзине (список уже получен для ETag)
+        # Кандидаты берутся из кэшированного пула, без запросов к БД
+        recommendations_data = recommend(cart_item_ids(request), request.GET.get('type', 'all'))
         
         # Если нет рекомендаций, возвращаем пустой массив
         if not recommendations_data:
@@ -266,87 +402,9 @@ def get_recommendations(request):
 
 def get_quick_sets(request):
     """API endpoint для получения быстрых наборов товаров"""
-    from django.db.models import Count
-    from django.utils import timezone
-    from datetime import timedelta
-    
     try:
-        # Получаем активные предложения
-        offers = Offer.objects.filter(
-            is_active=True,
-            status='available',
-            item__is_active=True,
-            item__vendor__is_active=True,
-            start_date__lte=timezone.now().date()
-        ).select_related(
-            'item', 
-            'item__vendor', 
-            'item__category'
-        ).prefetch_related('item__images')
-        
-        # Создаем быстрые наборы на основе категорий
-        quick_sets = []
-        
-        # Набор 1: Молочные продукты
-        dairy_items = offers.filter(
-            item__category__name__icontains='молоко'
-        ).order_by('-discount_percent')[:3]
-        
-        if dairy_items.exists():
-            quick_sets.append({
-                'id': 'dairy',
-                'name': '🥛 Молочные продукты',
-                'description': 'Молоко, сыр, йогурт',
-                'items': [{
-                    'id': offer.item.id,
-                    'title': offer.item.title,
-                    'vendor_name': offer.item.vendor.name,
-                    'current_price': float(offer.current_price),
-                    'original_price': float(offer.original_price),
-                    'discount_percent': int(offer.discount_percent),
-                    'image_url': offer.item.images.filter(is_primary=True).first().image.url if offer.item.images.filter(is_primary=True).first() else '/static/images/placeholder.jpg'
-                } for offer in dairy_items]
-            })
-        
-        # Набор 2: Хлебобулочные изделия
-        bakery_items = offers.filter(
-            item__category__name__icontains='хлеб'
-        ).order_by('-discount_percent')[:3]
-        
-        if bakery_items.exists():
-            quick_sets.append({
-                'id': 'bakery',
-                'name': '🍞 Хлебобулочные',
-                'description': 'Хлеб, булочки, выпечка',
-                'items': [{
-                    'id': offer.item.id,
-                    'title': offer.item.title,
-                    'vendor_name': offer.item.vendor.name,
-                    'current_price': float(offer.current_price),
-                    'original_price': float(offer.original_price),
-                    'discount_percent': int(offer.discount_percent),
-                    'image_url': offer.item.images.filter(is_primary=True).first().image.url if offer.item.images.filter(is_primary=True).first() else '/static/images/placeholder.jpg'
-                } for offer in bakery_items]
-            })
-        
-        # Набор 3: Популярные товары (по скидкам)
-        popular_items = offers.order_by('-discount_percent')[:4]
-        
-        if popular_items.exists():
-            quick_sets.append({
-                'id': 'popular',
-                'name': '🔥 Горячие предложения',
-                'description': 'Самые выгодные скидки',
-                'items': [{
-                    'id': offer.item.id,
-                    'title': offer.item.title,
-                    'vendor_name': offer.item.vendor.name,
-                    'current_price': float(offer.current_price),
-                    'original_price': float(offer.original_price),
-                    'discount_percent': int(offer.discount_percent),
-                    'image_url': offer.item.images.filter(is_primary=True).first().image.url if offer.item.images.filter(is_primary=True).first() else '/static/images/placeholder.jpg'
-                } for offer in popular_items]
-            })
+        # Наборы материализованы в БД и пересобираются только после изменений каталога
+        quick_sets = get_quick_sets_data()
         
         return JsonResponse({
             'success': True,
@@ -360,6 +418,15 @@ def get_quick_sets(request):
         }, status=500)
 
 
+@staff_member_required
+def get_cache_stats(request):
+    """API endpoint со статистикой попаданий в кэш каталога (для персонала)"""
+    return JsonResponse({
+        'success': True,
+        'cache': cache_stats()
+    })
+
+
 def save_custom_set(request):
     """API endpoint для сохранения пользовательского набора"""
     from django.http import JsonResponse
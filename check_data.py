@@ -9,7 +9,6 @@ django.setup()
 
 from catalog.models import Item, Offer, Category
 from vendors.models import Vendor, Branch
-from django.utils import timezone
 
 def check_data():
     print("=== ПРОВЕРКА ДАННЫХ В БД ===")
@@ -24,13 +23,7 @@ def check_data():
     print()
     
     # Проверяем активные предложения
-    active_offers = Offer.objects.filter(
-        is_active=True,
-        status='available',
-        item__is_active=True,
-        item__vendor__is_active=True,
-        start_date__lte=timezone.now().date()
-    )
+    active_offers = Offer.objects.live()
     
     print(f"Активные предложения: {active_offers.count()}")
     print()
@@ -0,0 +1,8 @@
+from django.apps import AppConfig
+
+
+class FoodsaveConfig(AppConfig):
+    name = 'foodsave'
+
+    def ready(self):
+        from . import bundle, db  # noqa: F401
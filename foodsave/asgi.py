@@ -14,3 +14,8 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'foodsave.settings')
 
 application = get_asgi_application()
+
+# Offer lifecycle runs in-process only when CATALOG_LIFECYCLE_INTERVAL is set
+from catalog.lifecycle import start_scheduler  # noqa: E402
+
+start_scheduler()
@@ -0,0 +1,146 @@
+"""Template bundle: inline assets moved out of templates at build time.
+
+``manage.py build_templates`` copies every template with large inline
+``<style>`` or ``<script>`` blocks (``TEMPLATE_BUNDLE_MIN_LINES`` lines or
+more, no template syntax inside) to ``TEMPLATE_BUNDLE_DIR/templates``, with
+each block replaced by a ``<link>`` or ``<script src>`` to a content-hashed
+file in ``TEMPLATE_BUNDLE_DIR/static/bundle/``. Hashed names never change
+while the content is the same, so browsers and proxies can keep them for
+good and pages get that much smaller.
+
+The ``production`` template profile (``FOODSAVE_TEMPLATES``, see settings)
+looks in the bundle before the source templates and serves its assets as
+static files. Source templates stay as they are; ``manifest.json`` in the
+bundle records the source hashes it was built from, and
+``check_template_bundle`` warns when they no longer match.
+"""
+import hashlib
+import json
+import re
+import shutil
+from dataclasses import dataclass
+from pathlib import Path
+
+from django.conf import settings
+from django.core import checks
+
+PROFILE = getattr(settings, 'TEMPLATE_PROFILE', 'development')
+BUNDLE_DIR = Path(getattr(settings, 'TEMPLATE_BUNDLE_DIR', settings.BASE_DIR / 'build'))
+MIN_LINES = getattr(settings, 'TEMPLATE_BUNDLE_MIN_LINES', 20)
+
+# Only attribute-less blocks: anything else (type, nonce, media) stays inline
+INLINE_RE = re.compile(r'<(?P<tag>style|script)>(?P<body>.*?)</(?P=tag)>', re.DOTALL)
+TEMPLATE_SYNTAX_RE = re.compile(r'\{[{%#]')
+EXTENDS_RE = re.compile(r'\{%\s*extends\s[^%]*%\}')
+LOAD_STATIC_RE = re.compile(r'\{%\s*load\s[^%]*\bstatic\b[^%]*%\}')
+
+EXTENSIONS = {'style': 'css', 'script': 'js'}
+REFERENCES = {
+    'style': '<link rel="stylesheet" href="{{% static \'{path}\' %}}">',
+    'script': '<script src="{{% static \'{path}\' %}}"></script>',
+}
+
+
+@dataclass
+class Asset:
+    path: str        # relative to the bundle static directory
+    content: str
+
+
+def source_dirs():
+    return [Path(directory) for template in settings.TEMPLATES for directory in template.get('DIRS', ())
+            if Path(directory).resolve() != (BUNDLE_DIR / 'templates').resolve()]
+
+
+def source_templates(dirs=None):
+    """``{template name: path}`` of the source templates; earlier directories win"""
+    templates = {}
+    for directory in dirs if dirs is not None else source_dirs():
+        for path in sorted(Path(directory).rglob('*.html')):
+            templates.setdefault(path.relative_to(directory).as_posix(), path)
+    return templates
+
+
+def digest(text):
+    return hashlib.md5(text.encode()).hexdigest()[:12]
+
+
+def extract(name, source, min_lines=MIN_LINES):
+    """``source`` with large inline blocks replaced by static references, and the extracted assets"""
+    assets = []
+
+    def replace(match):
+        tag, body = match['tag'], match['body']
+        if body.count('\n') < min_lines or TEMPLATE_SYNTAX_RE.search(body):
+            return match.group(0)
+        extension = EXTENSIONS[tag]
+        same_kind = sum(asset.path.endswith(f'.{extension}') for asset in assets)
+        suffix = f'-{same_kind + 1}' if same_kind else ''
+        path = f'bundle/{name.removesuffix(".html")}{suffix}.{digest(body)}.{extension}'
+        assets.append(Asset(path, body.strip('\n') + '\n'))
+        return REFERENCES[tag].format(path=path)
+
+    text = INLINE_RE.sub(replace, source)
+    if assets and not LOAD_STATIC_RE.search(text):
+        # {% extends %} has to stay the first tag
+        extends = EXTENDS_RE.search(text)
+        head, tail = (text[:extends.end()] + '\n', text[extends.end():].lstrip('\n')) if extends else ('', text)
+        text = head + '{% load static %}\n' + tail
+    return text, assets
+
+
+def build(bundle_dir=BUNDLE_DIR, dirs=None, min_lines=MIN_LINES):
+    """Write the bundle from scratch; returns ``{template name: [assets]}`` of the rewritten templates"""
+    bundle_dir = Path(bundle_dir)
+    for part in ('templates', 'static'):
+        shutil.rmtree(bundle_dir / part, ignore_errors=True)
+    rewritten = {}
+    sources = {}
+    for name, path in source_templates(dirs).items():
+        source = path.read_text(encoding='utf-8')
+        sources[name] = digest(source)
+        text, assets = extract(name, source, min_lines)
+        if not assets:
+            continue
+        target = bundle_dir / 'templates' / name
+        target.parent.mkdir(parents=True, exist_ok=True)
+        target.write_text(text, encoding='utf-8')
+        for asset in assets:
+            asset_path = bundle_dir / 'static' / asset.path
+            asset_path.parent.mkdir(parents=True, exist_ok=True)
+            asset_path.write_text(asset.content, encoding='utf-8')
+        rewritten[name] = assets
+    manifest = {'min_lines': min_lines, 'sources': sources}
+    (bundle_dir / 'manifest.json').write_text(json.dumps(manifest, indent=2, sort_keys=True))
+    return rewritten
+
+
+def stale_templates(bundle_dir=BUNDLE_DIR, dirs=None):
+    """Names of source templates added, changed or removed since the bundle was built (None: no bundle)"""
+    try:
+        built = json.loads((Path(bundle_dir) / 'manifest.json').read_text())['sources']
+    except (OSError, ValueError, KeyError):
+        return None
+    current = {name: digest(path.read_text(encoding='utf-8')) for name, path in source_templates(dirs).items()}
+    return sorted(name for name in built.keys() | current.keys() if built.get(name) != current.get(name))
+
+
+@checks.register(checks.Tags.templates)
+def check_template_bundle(app_configs=None, **kwargs):
+    if PROFILE != 'production':
+        return []
+    stale = stale_templates()
+    if stale is None:
+        return [checks.Warning(
+            f'The production template profile is on but there is no template bundle in {BUNDLE_DIR}.',
+            hint='Run manage.py build_templates before collectstatic.',
+            id='foodsave.W003',
+        )]
+    if stale:
+        return [checks.Warning(
+            f'The template bundle is out of date for: {", ".join(stale[:10])}'
+            + (f' and {len(stale) - 10} more' if len(stale) > 10 else '') + '.',
+            hint='Run manage.py build_templates; the bundle would serve the old templates.',
+            id='foodsave.W004',
+        )]
+    return []
@@ -0,0 +1,73 @@
+"""Database profile tuning.
+
+The ``sqlite-tuned`` profile (``FOODSAVE_DB``, see settings) runs
+``SQLITE_PRAGMAS`` on every new SQLite connection through the
+``connection_created`` signal. ``check_database_tuning`` is a database
+system check: ``manage.py check --database default`` and ``migrate`` report
+what the connection actually runs with and warn about settings that open a
+connection per request or leave SQLite in rollback-journal mode.
+"""
+from django.conf import settings
+from django.core import checks
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+PROFILE = getattr(settings, 'DATABASE_PROFILE', 'sqlite')
+SQLITE_PRAGMAS = getattr(settings, 'SQLITE_PRAGMAS', {})
+
+
+@receiver(connection_created)
+def tune_sqlite(sender, connection, **kwargs):
+    if connection.vendor != 'sqlite' or PROFILE != 'sqlite-tuned':
+        return
+    with connection.cursor() as cursor:
+        for name, value in SQLITE_PRAGMAS.items():
+            cursor.execute(f'PRAGMA {name} = {value}')
+
+
+def describe(connection):
+    """The tuning a connection runs with, as ``{name: value}``"""
+    tuning = {
+        'profile': PROFILE,
+        'vendor': connection.vendor,
+        'conn_max_age': connection.settings_dict['CONN_MAX_AGE'],
+    }
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            for name in ('journal_mode', 'synchronous', 'busy_timeout', 'mmap_size', 'cache_size'):
+                cursor.execute(f'PRAGMA {name}')
+                row = cursor.fetchone()
+                # mmap_size has no value for in-memory databases
+                tuning[name] = row[0] if row else None
+        elif connection.vendor == 'postgresql':
+            cursor.execute('SHOW server_version')
+            tuning['server_version'] = cursor.fetchone()[0]
+            tuning['health_checks'] = connection.settings_dict['CONN_HEALTH_CHECKS']
+            pool = connection.settings_dict['OPTIONS'].get('pool')
+            tuning['pool'] = f"{pool['min_size']}:{pool['max_size']}" if pool else 'off'
+    return tuning
+
+
+@checks.register(checks.Tags.database)
+def check_database_tuning(app_configs=None, databases=None, **kwargs):
+    messages = []
+    for alias in databases or ():
+        connection = connections[alias]
+        tuning = describe(connection)
+        summary = ', '.join(f'{name}={value}' for name, value in tuning.items())
+        messages.append(checks.Info(f'Database "{alias}": {summary}', id='foodsave.I001'))
+        if not tuning['conn_max_age'] and tuning.get('pool', 'off') == 'off':
+            messages.append(checks.Warning(
+                f'Database "{alias}" opens a new connection for every request.',
+                hint='Set FOODSAVE_DB_CONN_MAX_AGE, or FOODSAVE_DB_POOL with the postgres profile.',
+                id='foodsave.W001',
+            ))
+        # In-memory databases (tests) have no journal to tune
+        if PROFILE == 'sqlite-tuned' and tuning.get('journal_mode') not in ('wal', 'memory'):
+            messages.append(checks.Warning(
+                f'Database "{alias}" is not in WAL mode (journal_mode={tuning["journal_mode"]}).',
+                hint='The database file may be on a filesystem without shared memory support.',
+                id='foodsave.W002',
+            ))
+    return messages
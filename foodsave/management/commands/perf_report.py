@@ -0,0 +1,49 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from foodsave.perf import collect, reset
+
+SORT_KEYS = {
+    'total': lambda stats: stats.histograms['time_ms'].total,
+    'p95': lambda stats: stats.histograms['time_ms'].quantile(0.95),
+    'queries': lambda stats: stats.histograms['queries'].mean(),
+    'duplicates': lambda stats: stats.histograms['duplicates'].mean(),
+    'requests': lambda stats: stats.requests,
+}
+
+
+class Command(BaseCommand):
+    help = 'Summarize the request metrics recorded by foodsave.perf.PerfMiddleware'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sort', choices=sorted(SORT_KEYS), default='total')
+        parser.add_argument('--limit', type=int, default=30)
+        parser.add_argument('--json', action='store_true', help='Print the merged metrics as JSON')
+        parser.add_argument('--reset', action='store_true', help='Delete the recorded metrics afterwards')
+
+    def handle(self, *args, **options):
+        views = collect(include_current=False)
+        rows = sorted(views.items(), key=lambda row: SORT_KEYS[options['sort']](row[1]), reverse=True)
+        rows = rows[:options['limit']]
+
+        if options['json']:
+            self.stdout.write(json.dumps({view: stats.as_dict() for view, stats in rows}, indent=2))
+        elif not rows:
+            self.stdout.write('No metrics recorded; is PERF_SAMPLE_RATE above 0?')
+        else:
+            self.stdout.write(f'{"view":<45} {"reqs":>6} {"err":>4} {"avg ms":>8} {"p50":>6} {"p95":>6} '
+                              f'{"queries":>8} {"sql ms":>7} {"dups":>6} {"avg KiB":>8}')
+            for view, stats in rows:
+                histograms = stats.histograms
+                self.stdout.write(
+                    f'{view[:45]:<45} {stats.requests:>6} {stats.errors:>4} {histograms["time_ms"].mean():>8.1f} '
+                    f'{histograms["time_ms"].quantile(0.5):>6} {histograms["time_ms"].quantile(0.95):>6} '
+                    f'{histograms["queries"].mean():>8.1f} {histograms["sql_ms"].mean():>7.1f} '
+                    f'{histograms["duplicates"].mean():>6.1f} {histograms["bytes"].mean() / 1024:>8.1f}'
+                )
+            self.stdout.write('p50/p95 are histogram bucket upper bounds')
+
+        if options['reset']:
+            reset()
+            self.stdout.write(self.style.SUCCESS('Metrics reset'))
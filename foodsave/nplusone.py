@@ -0,0 +1,160 @@
+"""N+1 query detection.
+
+Every SQL statement of a request is reduced to a fingerprint (its text with
+``IN (...)`` lists and literals collapsed; values are parameters already).
+Fingerprints executed ``NPLUSONE_THRESHOLD`` times or more, with the same
+or different parameters, are reported together with where they came from:
+the template and line being rendered, and the innermost frame of project
+code. Deliberate repeats are listed in ``NPLUSONE_IGNORE`` as
+``'<path> in <function>'`` of that frame.
+
+``NPlusOneMiddleware`` logs the report (or raises with
+``NPLUSONE_RAISE``) while ``NPLUSONE_DETECTOR`` is on, which defaults to
+``DEBUG``. Tests use ``assert_no_n_plus_one`` or ``NPlusOneAssertionsMixin``.
+"""
+import logging
+import re
+import sys
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.template.base import Node
+
+logger = logging.getLogger(__name__)
+
+THRESHOLD = getattr(settings, 'NPLUSONE_THRESHOLD', 3)
+IGNORE = set(getattr(settings, 'NPLUSONE_IGNORE', ()))
+
+IN_LIST_RE = re.compile(r'\bIN \((?:%s|\?)(?:, (?:%s|\?))*\)', re.IGNORECASE)
+STRING_RE = re.compile(r"'(?:[^']|'')*'")
+NUMBER_RE = re.compile(r'(?<![\w"])-?\d+(?:\.\d+)?\b')
+LINE_RE = re.compile(r':\d+ in ')
+
+PROJECT_DIR = str(Path(settings.BASE_DIR).resolve())
+# Frames that never explain a query: libraries and the instrumentation itself
+IGNORED_PATHS = ('site-packages', 'dist-packages', '/venv/', str(Path(__file__).with_name('perf.py')), __file__)
+
+
+def fingerprint(sql):
+    sql = IN_LIST_RE.sub('IN (...)', sql)
+    sql = STRING_RE.sub('?', sql)
+    return NUMBER_RE.sub('?', sql)
+
+
+def query_origin():
+    """Template line and project code frame that issued the current query"""
+    template = code = None
+    frame = sys._getframe(2)
+    while frame is not None and not (template and code):
+        if template is None and frame.f_code.co_name == 'render_annotated':
+            node = frame.f_locals.get('self')
+            if isinstance(node, Node) and node.origin is not None:
+                template = f'{node.origin.template_name or node.origin.name}:{node.token.lineno}'
+        if code is None:
+            filename = frame.f_code.co_filename
+            if filename.startswith(PROJECT_DIR) and not any(part in filename for part in IGNORED_PATHS):
+                code = f'{Path(filename).relative_to(PROJECT_DIR)}:{frame.f_lineno} in {frame.f_code.co_name}'
+        frame = frame.f_back
+    return template, code
+
+
+def ignored(origins):
+    return all(code and LINE_RE.sub(' in ', code) in IGNORE for template, code in origins)
+
+
+@dataclass
+class QueryGroup:
+    fingerprint: str
+    count: int
+    distinct_params: int
+    origins: Counter
+
+    def describe(self):
+        (template, code), _ = self.origins.most_common(1)[0]
+        where = ', '.join(part for part in (template, code) if part) or 'unknown origin'
+        return f'{self.count} queries ({self.distinct_params} parameter sets) from {where}: {self.fingerprint[:300]}'
+
+
+class QueryCollector:
+    """``execute_wrapper`` hook grouping statements by fingerprint"""
+
+    def __init__(self):
+        self.groups = {}
+
+    def __call__(self, execute, sql, params, many, context):
+        key = fingerprint(sql)
+        group = self.groups.get(key)
+        if group is None:
+            group = self.groups[key] = {'count': 0, 'params': set(), 'origins': Counter()}
+        group['count'] += 1
+        group['params'].add(repr(params))
+        group['origins'][query_origin()] += 1
+        return execute(sql, params, many, context)
+
+    def repeated(self, threshold=THRESHOLD):
+        """Groups run at least ``threshold`` times outside ``NPLUSONE_IGNORE``, worst first"""
+        groups = [
+            QueryGroup(key, group['count'], len(group['params']), group['origins'])
+            for key, group in self.groups.items()
+            if group['count'] >= threshold and not ignored(group['origins'])
+        ]
+        return sorted(groups, key=lambda group: group.count, reverse=True)
+
+
+@contextmanager
+def collect_queries():
+    collector = QueryCollector()
+    with ExitStack() as stack:
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(collector))
+        yield collector
+
+
+def report(groups):
+    return '\n'.join(f'  - {group.describe()}' for group in groups)
+
+
+class NPlusOneError(AssertionError):
+    pass
+
+
+@contextmanager
+def assert_no_n_plus_one(threshold=THRESHOLD):
+    """Fail when the block runs the same statement ``threshold`` times or more"""
+    with collect_queries() as collector:
+        yield collector
+    groups = collector.repeated(threshold)
+    if groups:
+        raise NPlusOneError(f'N+1 queries detected:\n{report(groups)}')
+
+
+class NPlusOneAssertionsMixin:
+    """``TestCase`` mixin: ``with self.assertNoNPlusOne(): self.client.get(...)``"""
+
+    def assertNoNPlusOne(self, threshold=THRESHOLD):
+        return assert_no_n_plus_one(threshold)
+
+
+class NPlusOneMiddleware:
+    def __init__(self, get_response):
+        if not getattr(settings, 'NPLUSONE_DETECTOR', settings.DEBUG):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.raise_errors = getattr(settings, 'NPLUSONE_RAISE', False)
+
+    def __call__(self, request):
+        with collect_queries() as collector:
+            response = self.get_response(request)
+        groups = collector.repeated()
+        if groups:
+            message = f'N+1 queries in {request.method} {request.path}:\n{report(groups)}'
+            if self.raise_errors:
+                raise NPlusOneError(message)
+            logger.warning(message)
+            response['X-NPlusOne-Groups'] = str(len(groups))
+        return response
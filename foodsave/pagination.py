@@ -0,0 +1,174 @@
+"""Keyset (cursor) pagination.
+
+A page is read with a range condition on an indexed ordering, e.g.
+``created_at <= :last AND NOT (created_at = :last AND id >= :last_id)``,
+instead of ``OFFSET``, so deep pages cost what the first one does. The total
+count runs only if something reads ``paginator.count``.
+
+Cursors are opaque URL-safe tokens holding the ordering values of the last
+(or first, going back) row, the direction and the page number; clients pass
+them back unchanged as ``?cursor=``.
+"""
+import base64
+import json
+from functools import cached_property
+from math import ceil
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from django.http import Http404
+
+DEFAULT_ORDERING = ('-created_at', '-id')
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(values, backwards, number):
+    payload = json.dumps([values, int(backwards), number], separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    try:
+        values, backwards, number = json.loads(base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)))
+    except (ValueError, TypeError):
+        raise InvalidCursor(token)
+    if not isinstance(values, list) or not isinstance(number, int) or number < 1:
+        raise InvalidCursor(token)
+    return values, bool(backwards), number
+
+
+def keyset_condition(keys, values, backwards):
+    """Rows after ``values`` in the ordering ``keys`` (before them when ``backwards``)"""
+    (first, first_descending), first_value = keys[0], values[0]
+    # The range on the leading key lets the database seek in the index
+    bound = 'lte' if first_descending != backwards else 'gte'
+    condition = Q()
+    equal = {}
+    for (name, descending), value in zip(keys, values):
+        beyond = 'lt' if descending != backwards else 'gt'
+        condition |= Q(**equal, **{f'{name}__{beyond}': value})
+        equal[name] = value
+    return Q(**{f'{first}__{bound}': first_value}) & condition
+
+
+class CursorPaginator:
+    def __init__(self, queryset, per_page, ordering=DEFAULT_ORDERING):
+        self.queryset = queryset
+        self.per_page = int(per_page)
+        self.ordering = tuple(ordering)
+        self.keys = [(name.lstrip('-'), name.startswith('-')) for name in self.ordering]
+        self.fields = [queryset.model._meta.get_field(name) for name, descending in self.keys]
+
+    @cached_property
+    def count(self):
+        """Total number of rows; queried only when a template asks for it"""
+        return self.queryset.count()
+
+    @cached_property
+    def num_pages(self):
+        return max(1, ceil(self.count / self.per_page))
+
+    def cursor(self, obj, backwards, number):
+        return encode_cursor([field.value_to_string(obj) for field in self.fields], backwards, number)
+
+    def page(self, cursor=None):
+        values, backwards, number = decode_cursor(cursor) if cursor else (None, False, 1)
+        queryset = self.queryset
+        if values is not None:
+            if len(values) != len(self.fields):
+                raise InvalidCursor(cursor)
+            try:
+                values = [field.to_python(value) for field, value in zip(self.fields, values)]
+            except ValidationError:
+                raise InvalidCursor(cursor)
+            queryset = queryset.filter(keyset_condition(self.keys, values, backwards))
+        ordering = [name[1:] if name.startswith('-') else f'-{name}' for name in self.ordering] if backwards else self.ordering
+        rows = list(queryset.order_by(*ordering)[:self.per_page + 1])
+        more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if backwards:
+            rows.reverse()
+            return CursorPage(rows, number, self, has_next=True, has_previous=more)
+        return CursorPage(rows, number, self, has_next=more, has_previous=values is not None)
+
+
+class CursorPage:
+    def __init__(self, object_list, number, paginator, has_next, has_previous, params=None):
+        self.object_list = object_list
+        self.number = number
+        self.paginator = paginator
+        self._has_next = has_next
+        self._has_previous = has_previous
+        self.params = params
+
+    def __repr__(self):
+        return f'<Cursor page {self.number}>'
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self._has_next and bool(self.object_list)
+
+    def has_previous(self):
+        return self._has_previous and self.number > 1
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+    @property
+    def next_cursor(self):
+        if self.has_next():
+            return self.paginator.cursor(self.object_list[-1], False, self.number + 1)
+        return None
+
+    @property
+    def previous_cursor(self):
+        if self.has_previous():
+            return self.paginator.cursor(self.object_list[0], True, self.number - 1)
+        return None
+
+    def querystring(self, cursor):
+        """Request parameters with ``cursor`` in place of any page or cursor"""
+        params = self.params.copy()
+        params.pop('page', None)
+        params.pop('cursor', None)
+        if cursor:
+            params['cursor'] = cursor
+        return params.urlencode()
+
+    @property
+    def first_querystring(self):
+        return self.querystring(None)
+
+    @property
+    def next_querystring(self):
+        return self.querystring(self.next_cursor)
+
+    @property
+    def previous_querystring(self):
+        # One step back from page 2 is the first page, which needs no cursor
+        return self.querystring(self.previous_cursor if self.number > 2 else None)
+
+
+class CursorPaginationMixin:
+    """``ListView`` mixin paging by ``cursor_ordering`` instead of ``?page=N``"""
+    cursor_ordering = DEFAULT_ORDERING
+
+    def paginate_queryset(self, queryset, page_size):
+        paginator = CursorPaginator(queryset, page_size, self.cursor_ordering)
+        try:
+            page = paginator.page(self.request.GET.get('cursor'))
+        except InvalidCursor:
+            raise Http404('Неверный курсор страницы')
+        page.params = self.request.GET
+        return paginator, page, page.object_list, page.has_other_pages()
@@ -0,0 +1,276 @@
+"""Request performance instrumentation.
+
+``PerfMiddleware`` samples ``PERF_SAMPLE_RATE`` of the requests. For each
+sampled request it records, under the resolved view name, the wall time,
+the number and total time of SQL queries (through
+``connection.execute_wrapper``), the number of exact duplicate queries and
+the response size, as fixed-bucket histograms. Requests that are not
+sampled cost one random number.
+
+Each process keeps its own aggregates and writes them every
+``PERF_FLUSH_SECONDS`` to a JSON file in ``PERF_METRICS_DIR``.
+``metrics_view`` (Prometheus text format) and the ``perf_report`` command
+merge the files of all processes.
+"""
+import atexit
+import hmac
+import json
+import os
+import random
+import socket
+import threading
+import time
+from bisect import bisect_left
+from contextlib import ExitStack
+from pathlib import Path
+
+from django.conf import settings
+from django.db import connections
+from django.http import HttpResponse, HttpResponseForbidden
+
+FLUSH_SECONDS = getattr(settings, 'PERF_FLUSH_SECONDS', 10)
+
+# Files of processes that stopped writing are ignored after this long
+STALE_SECONDS = 24 * 60 * 60
+
+# Upper bounds of the histogram buckets; the last bucket is unbounded
+BUCKETS = {
+    'time_ms': (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000),
+    'queries': (1, 2, 5, 10, 20, 50, 100, 200),
+    'sql_ms': (1, 5, 10, 25, 50, 100, 250, 500, 1000),
+    'duplicates': (0, 1, 2, 5, 10, 50),
+    'bytes': (1000, 10000, 50000, 100000, 500000, 1000000, 5000000),
+}
+
+
+def metrics_dir():
+    return Path(getattr(settings, 'PERF_METRICS_DIR', settings.BASE_DIR / 'perf'))
+
+
+class Histogram:
+    def __init__(self, bounds, counts=None, total=0.0):
+        self.bounds = bounds
+        self.counts = counts or [0] * (len(bounds) + 1)
+        self.total = total
+
+    def add(self, value):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.total += value
+
+    def merge(self, other):
+        self.counts = [mine + theirs for mine, theirs in zip(self.counts, other['counts'])]
+        self.total += other['total']
+
+    @property
+    def count(self):
+        return sum(self.counts)
+
+    def mean(self):
+        return self.total / self.count if self.count else 0.0
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding the ``q`` quantile (inf for the last bucket)"""
+        if not self.count:
+            return 0.0
+        threshold = q * self.count
+        cumulative = 0
+        for bound, count in zip(self.bounds + (float('inf'),), self.counts):
+            cumulative += count
+            if cumulative >= threshold:
+                return bound
+        return float('inf')
+
+    def as_dict(self):
+        return {'counts': self.counts, 'total': self.total}
+
+
+class ViewStats:
+    def __init__(self):
+        self.errors = 0
+        self.histograms = {name: Histogram(bounds) for name, bounds in BUCKETS.items()}
+
+    def add(self, sample, status):
+        if status >= 500:
+            self.errors += 1
+        for name, value in sample.items():
+            self.histograms[name].add(value)
+
+    def merge(self, data):
+        self.errors += data['errors']
+        for name, histogram in data['histograms'].items():
+            self.histograms[name].merge(histogram)
+
+    @property
+    def requests(self):
+        return self.histograms['time_ms'].count
+
+    def as_dict(self):
+        return {'errors': self.errors, 'histograms': {name: h.as_dict() for name, h in self.histograms.items()}}
+
+
+class QueryRecorder:
+    """``execute_wrapper`` hook counting queries, their time and exact repeats"""
+
+    def __init__(self):
+        self.queries = 0
+        self.duplicates = 0
+        self.seconds = 0.0
+        self.seen = set()
+
+    def __call__(self, execute, sql, params, many, context):
+        key = (sql, repr(params))
+        if key in self.seen:
+            self.duplicates += 1
+        else:
+            self.seen.add(key)
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.seconds += time.perf_counter() - started
+            self.queries += 1
+
+
+class Registry:
+    """Aggregates of this process, flushed to ``PERF_METRICS_DIR`` periodically"""
+
+    def __init__(self):
+        self.views = {}
+        self.lock = threading.Lock()
+        self.flushed_at = time.monotonic()
+        self.started_at = time.time()
+
+    def record(self, view, sample, status):
+        with self.lock:
+            self.views.setdefault(view, ViewStats()).add(sample, status)
+            due = time.monotonic() - self.flushed_at >= FLUSH_SECONDS
+        if due:
+            self.flush()
+
+    def snapshot(self):
+        with self.lock:
+            return {view: stats.as_dict() for view, stats in self.views.items()}
+
+    def path(self):
+        return metrics_dir() / f'{socket.gethostname()}-{os.getpid()}.json'
+
+    def flush(self):
+        self.flushed_at = time.monotonic()
+        views = self.snapshot()
+        if not views:
+            return
+        try:
+            path = self.path()
+            path.parent.mkdir(parents=True, exist_ok=True)
+            temporary = path.with_suffix('.tmp')
+            temporary.write_text(json.dumps({'started_at': self.started_at, 'views': views}))
+            os.replace(temporary, path)
+        except OSError:
+            # Metrics must never break requests
+            pass
+
+
+registry = Registry()
+atexit.register(registry.flush)
+
+
+def collect(include_current=True):
+    """Merge the metrics of all processes into ``{view: ViewStats}``"""
+    merged = {}
+    current = registry.path()
+    snapshots = []
+    if current.parent.exists():
+        cutoff = time.time() - STALE_SECONDS
+        for path in current.parent.glob('*.json'):
+            if include_current and path == current:
+                continue
+            try:
+                if path.stat().st_mtime >= cutoff:
+                    snapshots.append(json.loads(path.read_text())['views'])
+            except (OSError, ValueError, KeyError):
+                continue
+    if include_current:
+        snapshots.append(registry.snapshot())
+    for views in snapshots:
+        for view, data in views.items():
+            merged.setdefault(view, ViewStats()).merge(data)
+    return merged
+
+
+def reset():
+    """Forget all recorded metrics"""
+    with registry.lock:
+        registry.views.clear()
+    directory = metrics_dir()
+    if directory.exists():
+        for path in directory.glob('*.json'):
+            path.unlink(missing_ok=True)
+
+
+class PerfMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.sample_rate = getattr(settings, 'PERF_SAMPLE_RATE', 0.0)
+
+    def __call__(self, request):
+        if not self.sample_rate or random.random() >= self.sample_rate:
+            return self.get_response(request)
+
+        recorder = QueryRecorder()
+        started = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(recorder))
+            response = self.get_response(request)
+        elapsed = time.perf_counter() - started
+
+        match = getattr(request, 'resolver_match', None)
+        view = match.view_name if match else 'unresolved'
+        size = 0 if response.streaming else len(response.content)
+        registry.record(f'{request.method} {view}', {
+            'time_ms': elapsed * 1000,
+            'queries': recorder.queries,
+            'sql_ms': recorder.seconds * 1000,
+            'duplicates': recorder.duplicates,
+            'bytes': size,
+        }, response.status_code)
+        return response
+
+
+def prometheus_text(views):
+    lines = []
+    names = {
+        'time_ms': ('foodsave_request_duration_ms', 'Wall time of sampled requests'),
+        'queries': ('foodsave_request_queries', 'SQL queries per sampled request'),
+        'sql_ms': ('foodsave_request_sql_ms', 'SQL time per sampled request'),
+        'duplicates': ('foodsave_request_duplicate_queries', 'Exact duplicate SQL queries per sampled request'),
+        'bytes': ('foodsave_response_bytes', 'Response size of sampled requests'),
+    }
+    for key, (metric, description) in names.items():
+        lines.append(f'# HELP {metric} {description}')
+        lines.append(f'# TYPE {metric} histogram')
+        for view, stats in sorted(views.items()):
+            histogram = stats.histograms[key]
+            label = view.replace('\\', '\\\\').replace('"', '\\"')
+            cumulative = 0
+            for bound, count in zip(histogram.bounds + ('+Inf',), histogram.counts):
+                cumulative += count
+                lines.append(f'{metric}_bucket{{view="{label}",le="{bound}"}} {cumulative}')
+            lines.append(f'{metric}_sum{{view="{label}"}} {histogram.total:.3f}')
+            lines.append(f'{metric}_count{{view="{label}"}} {histogram.count}')
+    lines.append('# HELP foodsave_request_errors_total Sampled requests answered with a 5xx status')
+    lines.append('# TYPE foodsave_request_errors_total counter')
+    for view, stats in sorted(views.items()):
+        label = view.replace('\\', '\\\\').replace('"', '\\"')
+        lines.append(f'foodsave_request_errors_total{{view="{label}"}} {stats.errors}')
+    return '\n'.join(lines) + '\n'
+
+
+def metrics_view(request):
+    """Aggregated request metrics of all processes in Prometheus text format"""
+    token = request.headers.get('Authorization', '').removeprefix('Bearer ')
+    expected = getattr(settings, 'PERF_METRICS_TOKEN', '')
+    is_staff = request.user.is_authenticated and request.user.is_staff
+    if not is_staff and not (expected and hmac.compare_digest(token, expected)):
+        return HttpResponseForbidden()
+    return HttpResponse(prometheus_text(collect()), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -10,8 +10,12 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/4.2/ref/settings/
 """
 
+import os
+import sys
 from pathlib import Path
 
+from django.core.exceptions import ImproperlyConfigured
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -45,10 +49,13 @@ INSTALLED_APPS = [
     'booking',
     'orders',
     'notifications',
+    'foodsave',
 ]
 AUTH_USER_MODEL = 'users.User'
 
 MIDDLEWARE = [
+    'foodsave.perf.PerfMiddleware',
+    'foodsave.nplusone.NPlusOneMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -76,20 +83,160 @@ TEMPLATES = [
     },
 ]
 
+# FOODSAVE_TEMPLATES selects the template profile:
+#   development - templates as above (Django caches compiled templates and
+#                 reloads them when they change)
+#   production  - the template bundle first (`manage.py build_templates`:
+#                 large inline <style>/<script> blocks moved into hashed
+#                 static files), the cached loader, no template debug data
+TEMPLATE_PROFILE = os.environ.get('FOODSAVE_TEMPLATES', 'development')
+TEMPLATE_BUNDLE_DIR = Path(os.environ.get('FOODSAVE_TEMPLATE_BUNDLE_DIR', BASE_DIR / 'build'))
+# Smaller inline blocks stay inline: a separate request would cost more
+TEMPLATE_BUNDLE_MIN_LINES = 20
+
+if TEMPLATE_PROFILE == 'production':
+    TEMPLATES[0].update({
+        'DIRS': [TEMPLATE_BUNDLE_DIR / 'templates', *TEMPLATES[0]['DIRS']],
+        'APP_DIRS': False,
+    })
+    TEMPLATES[0]['OPTIONS'].update({
+        'debug': False,
+        'loaders': [
+            ('django.template.loaders.cached.Loader', [
+                'django.template.loaders.filesystem.Loader',
+                'django.template.loaders.app_directories.Loader',
+            ]),
+        ],
+    })
+elif TEMPLATE_PROFILE != 'development':
+    raise ImproperlyConfigured(f'Unknown FOODSAVE_TEMPLATES profile: {TEMPLATE_PROFILE}')
+
 WSGI_APPLICATION = 'foodsave.wsgi.application'
 
 
 # Database
 # https://docs.djangoproject.com/en/4.2/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+# FOODSAVE_DB selects the profile:
+#   sqlite        - the development file, default SQLite settings
+#   sqlite-tuned  - WAL journal and the SQLITE_PRAGMAS below, applied to every
+#                   connection by foodsave.db
+#   postgres      - FOODSAVE_DB_NAME/USER/PASSWORD/HOST/PORT; persistent
+#                   connections, or a psycopg pool with FOODSAVE_DB_POOL=min:max
+# `manage.py check --database default` (also run by migrate) reports the
+# active tuning and warns about a misconfigured profile.
+
+DATABASE_PROFILE = os.environ.get('FOODSAVE_DB', 'sqlite')
+# Seconds a connection is kept between requests (0 = one per request)
+DATABASE_CONN_MAX_AGE = int(os.environ.get('FOODSAVE_DB_CONN_MAX_AGE', '60'))
+
+if DATABASE_PROFILE == 'postgres':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ.get('FOODSAVE_DB_NAME', 'foodsave'),
+            'USER': os.environ.get('FOODSAVE_DB_USER', 'foodsave'),
+            'PASSWORD': os.environ.get('FOODSAVE_DB_PASSWORD', ''),
+            'HOST': os.environ.get('FOODSAVE_DB_HOST', 'localhost'),
+            'PORT': os.environ.get('FOODSAVE_DB_PORT', '5432'),
+            'CONN_MAX_AGE': DATABASE_CONN_MAX_AGE,
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {},
+        }
+    }
+    if os.environ.get('FOODSAVE_DB_POOL'):
+        # Pooled connections replace persistent ones; Django requires CONN_MAX_AGE = 0
+        min_size, _, max_size = os.environ['FOODSAVE_DB_POOL'].partition(':')
+        DATABASES['default']['OPTIONS']['pool'] = {
+            'min_size': int(min_size),
+            'max_size': int(max_size or min_size),
+            'timeout': 10,
+        }
+        DATABASES['default']['CONN_MAX_AGE'] = 0
+elif DATABASE_PROFILE in ('sqlite', 'sqlite-tuned'):
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.environ.get('FOODSAVE_DB_NAME', BASE_DIR / 'db.sqlite3'),
+            'CONN_MAX_AGE': DATABASE_CONN_MAX_AGE,
+        }
     }
+else:
+    raise ImproperlyConfigured(f'Unknown FOODSAVE_DB profile: {DATABASE_PROFILE}')
+
+# PRAGMAs run on every new connection of the sqlite-tuned profile
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',         # readers no longer block the writer
+    'synchronous': 'NORMAL',       # fsync at checkpoints only; safe with WAL
+    'busy_timeout': 5000,          # ms to wait for the write lock instead of failing
+    'mmap_size': 256 * 1024 ** 2,  # read pages through the OS page cache
+    'cache_size': -20000,          # 20 MB page cache per connection
+    'temp_store': 'MEMORY',
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/4.2/topics/cache/
+# FOODSAVE_CACHE=file shares cached data between worker processes via disk.
+# The default LocMemCache is per process: catalog cache invalidation (tag
+# versions, see catalog.caching) does not reach other workers, which serve
+# their copies for up to CATALOG_CACHE_TIMEOUT seconds. Use a shared backend
+# whenever more than one worker process runs.
+
+if os.environ.get('FOODSAVE_CACHE') == 'file':
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.environ.get('FOODSAVE_CACHE_DIR', BASE_DIR / 'cache'),
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'foodsave',
+        }
+    }
+
+# Seconds catalog API responses stay cached when nothing changes
+CATALOG_CACHE_TIMEOUT = 300
+# Seconds rendered item cards stay cached; a changed item gets a new key at once
+CATALOG_CARD_CACHE_TIMEOUT = 60 * 60
+
+# Seconds a shared cache (reverse proxy) may serve anonymous catalog pages and
+# API responses before revalidating; browsers always revalidate
+CATALOG_SHARED_MAX_AGE = 30
+
+# Share of requests measured by foodsave.perf.PerfMiddleware (0 = off);
+# see /metrics/ and `manage.py perf_report`. Test runs never sample, so they
+# leave no metrics files behind
+TESTING = sys.argv[1:2] == ['test']
+PERF_SAMPLE_RATE = float(os.environ.get('FOODSAVE_PERF_SAMPLE_RATE', '0' if TESTING else '0.01'))
+PERF_METRICS_DIR = Path(os.environ.get('FOODSAVE_PERF_DIR', BASE_DIR / 'perf'))
+# Bearer token that lets a metrics scraper read /metrics/ without a staff login
+PERF_METRICS_TOKEN = os.environ.get('FOODSAVE_PERF_TOKEN', '')
+
+# Log statements run this often in one request (N+1 queries) while DEBUG is
+# on; NPLUSONE_RAISE turns reports into errors
+NPLUSONE_DETECTOR = DEBUG
+NPLUSONE_THRESHOLD = 3
+NPLUSONE_RAISE = False
+NPLUSONE_IGNORE = [
+    'catalog/views.py in push',  # map: one query per search ring, at most MAP_MAX_RINGS
+]
+
+# Seconds cart reservations hold stock after the last cart activity;
+# run `manage.py release_reservations` every minute to give expired units back
+BOOKING_RESERVATION_TTL = 15 * 60
+
+# Seconds between in-process offer lifecycle runs (0 = off; use cron with
+# `manage.py update_offer_statuses` instead)
+CATALOG_LIFECYCLE_INTERVAL = 0
+
+# Fee added to orders with delivery_type 'delivery'
+BOOKING_DELIVERY_FEE = '5.00'
+
+
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
 
@@ -128,6 +275,8 @@ STATIC_URL = 'static/'
 STATICFILES_DIRS = [
     BASE_DIR / "static",
 ]
+if TEMPLATE_PROFILE == 'production':
+    STATICFILES_DIRS.append(TEMPLATE_BUNDLE_DIR / 'static')
 STATIC_ROOT = BASE_DIR / 'staticfiles'
 
 # Media files
@@ -4,6 +4,8 @@ from django.conf import settings
 from django.conf.urls.static import static
 from django.views.generic import TemplateView
 
+from .perf import metrics_view
+
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('', TemplateView.as_view(template_name='home.html'), name='home'),
@@ -11,6 +13,7 @@ urlpatterns = [
     path('catalog/', include('catalog.urls')),
     path('vendors/', include('vendors.urls')),
     path('orders/', include('booking.urls')),
+    path('metrics/', metrics_view, name='metrics'),
 ]
 
 # Serve media files in development
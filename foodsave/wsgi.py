@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'foodsave.settings')
 
 application = get_wsgi_application()
+
+# Offer lifecycle runs in-process only when CATALOG_LIFECYCLE_INTERVAL is set
+from catalog.lifecycle import start_scheduler  # noqa: E402
+
+start_scheduler()
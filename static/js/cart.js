@@ -0,0 +1,187 @@
+// Server cart for FoodSave
+//
+// Every page adds and removes offers through the booking cart API, which
+// reserves the units on the server. The API URLs come from the data
+// attributes of the script tag (see base.html). After each change the cart is
+// sent with a `cartUpdated` window event and the `.cart-counter` badges are
+// updated.
+
+const FoodSaveCart = (function() {
+    const urls = {
+        cart: document.currentScript.dataset.cartUrl,
+        add: document.currentScript.dataset.addUrl,
+        remove: document.currentScript.dataset.removeUrl,
+    };
+
+    // Carts kept in the browser before the server cart existed
+    const LEGACY_KEYS = ['foodsave_cart', 'cart'];
+
+    let current = null;
+
+    function csrfToken() {
+        const match = document.cookie.match(/(?:^|;\s*)csrftoken=([^;]*)/);
+        return match ? decodeURIComponent(match[1]) : null;
+    }
+
+    function update(cart) {
+        current = cart;
+        const count = cart.items.reduce((sum, line) => sum + line.quantity, 0);
+        document.querySelectorAll('.cart-counter').forEach(counter => {
+            counter.textContent = count;
+            counter.style.display = count > 0 ? 'inline' : 'none';
+        });
+        window.dispatchEvent(new CustomEvent('cartUpdated', { detail: cart }));
+        return cart;
+    }
+
+    async function send(url, options) {
+        const response = await fetch(url, { credentials: 'same-origin', ...options });
+        const data = await response.json().catch(() => ({}));
+        if (!response.ok || !data.success) {
+            throw new Error(data.error || 'Произошла ошибка. Попробуйте еще раз.');
+        }
+        return update(data.cart);
+    }
+
+    function load() {
+        return send(urls.cart, { headers: { 'X-Requested-With': 'XMLHttpRequest' } });
+    }
+
+    async function post(url, payload) {
+        // The cart API sets the CSRF cookie for pages rendered without a form
+        if (!csrfToken()) {
+            await load();
+        }
+        return send(url, {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json', 'X-CSRFToken': csrfToken() },
+            body: JSON.stringify(payload),
+        });
+    }
+
+    function add(offerId, quantity = 1) {
+        return post(urls.add, { offer_id: offerId, quantity: quantity });
+    }
+
+    // Without a quantity the whole line is removed
+    function remove(offerId, quantity = null) {
+        const payload = { offer_id: offerId };
+        if (quantity !== null) {
+            payload.quantity = quantity;
+        }
+        return post(urls.remove, payload);
+    }
+
+    function clear() {
+        return post(urls.remove, {});
+    }
+
+    function setQuantity(offerId, quantity) {
+        const line = current && current.items.find(line => line.offer_id === offerId);
+        const reserved = line ? line.quantity : 0;
+        if (quantity < 1) {
+            return remove(offerId);
+        }
+        if (quantity > reserved) {
+            return add(offerId, quantity - reserved);
+        }
+        if (quantity < reserved) {
+            return remove(offerId, reserved - quantity);
+        }
+        return Promise.resolve(current);
+    }
+
+    // Lines saved with an offer id are reserved on the server once; lines
+    // of item ids only can not be matched to an offer and are dropped
+    async function migrateLegacyCart() {
+        const lines = [];
+        LEGACY_KEYS.forEach(key => {
+            try {
+                lines.push(...(JSON.parse(localStorage.getItem(key)) || []));
+            } catch (error) {
+                // Unreadable leftovers are dropped with the key
+            }
+            localStorage.removeItem(key);
+        });
+        let failed = 0;
+        for (const line of lines) {
+            const offerId = parseInt(line.offerId || line.offer_id);
+            if (!offerId) {
+                continue;
+            }
+            try {
+                await add(offerId, Math.max(1, parseInt(line.quantity) || 1));
+            } catch (error) {
+                failed += 1;
+            }
+        }
+        if (failed) {
+            notify('Часть товаров из сохраненной корзины больше недоступна', 'warning');
+        }
+    }
+
+    function notify(message, type = 'info') {
+        const notification = document.createElement('div');
+        notification.className = `alert alert-${type} alert-dismissible fade show position-fixed`;
+        notification.style.cssText = 'top: 20px; right: 20px; z-index: 9999; min-width: 300px;';
+        notification.textContent = message;
+        const close = document.createElement('button');
+        close.type = 'button';
+        close.className = 'btn-close';
+        close.dataset.bsDismiss = 'alert';
+        notification.appendChild(close);
+        document.body.appendChild(notification);
+        setTimeout(() => notification.remove(), 3000);
+    }
+
+    // Buttons with the add-to-cart class and a data-offer-id, also those
+    // added to the page later (infinite scroll)
+    async function addFromButton(button) {
+        const originalHtml = button.innerHTML;
+        button.innerHTML = '<i class="fas fa-spinner fa-spin"></i>';
+        button.disabled = true;
+        try {
+            await add(parseInt(button.dataset.offerId), parseInt(button.dataset.quantity) || 1);
+            const cartModal = document.getElementById('cartModal');
+            if (cartModal) {
+                bootstrap.Modal.getOrCreateInstance(cartModal).show();
+            } else {
+                notify('Товар добавлен в корзину!', 'success');
+            }
+        } catch (error) {
+            notify(error.message, 'danger');
+        } finally {
+            button.innerHTML = originalHtml;
+            button.disabled = false;
+        }
+    }
+
+    document.addEventListener('click', event => {
+        const button = event.target.closest('.add-to-cart[data-offer-id]');
+        if (button && button.dataset.offerId) {
+            event.preventDefault();
+            addFromButton(button);
+        }
+    });
+
+    document.addEventListener('DOMContentLoaded', async () => {
+        if (LEGACY_KEYS.some(key => localStorage.getItem(key) !== null)) {
+            await migrateLegacyCart();
+        }
+        if (current === null && document.querySelector('.cart-counter')) {
+            load().catch(error => console.error('Cart request failed:', error));
+        }
+    });
+
+    return {
+        add,
+        remove,
+        clear,
+        setQuantity,
+        load,
+        notify,
+        get current() {
+            return current;
+        },
+    };
+})();
@@ -39,13 +39,7 @@ document.addEventListener('DOMContentLoaded', function() {
         }
     }
 
-    // Add to cart functionality
-    document.querySelectorAll('.add-to-cart').forEach(button => {
-        button.addEventListener('click', function() {
-            const offerId = this.dataset.offerId;
-            addToCart(offerId, this);
-        });
-    });
+    // Add to cart buttons are handled by cart.js
 
     // Quantity controls
     document.querySelectorAll('.quantity-control').forEach(control => {
@@ -114,74 +108,6 @@ document.addEventListener('DOMContentLoaded', function() {
     }, 5000);
 });
 
-// Shopping cart functionality
-let cart = JSON.parse(localStorage.getItem('foodsave_cart')) || [];
-
-function addToCart(offerId, buttonElement) {
-    // Show loading state
-    const originalText = buttonElement.innerHTML;
-    buttonElement.innerHTML = '<i class="fas fa-spinner fa-spin me-2"></i>Добавляем...';
-    buttonElement.disabled = true;
-
-    // Simulate API call (replace with actual AJAX when backend is ready)
-    setTimeout(() => {
-        // Add to local cart
-        const existingItem = cart.find(item => item.offerId === offerId);
-        if (existingItem) {
-            existingItem.quantity += 1;
-        } else {
-            cart.push({
-                offerId: offerId,
-                quantity: 1,
-                addedAt: new Date().toISOString()
-            });
-        }
-
-        // Save to localStorage
-        localStorage.setItem('foodsave_cart', JSON.stringify(cart));
-
-        // Update cart counter
-        updateCartCounter();
-
-        // Show success message
-        showNotification('Товар добавлен в корзину!', 'success');
-
-        // Reset button
-        buttonElement.innerHTML = originalText;
-        buttonElement.disabled = false;
-
-        // Show cart modal if exists
-        const cartModal = document.getElementById('cartModal');
-        if (cartModal) {
-            const modal = new bootstrap.Modal(cartModal);
-            modal.show();
-        }
-    }, 1000);
-}
-
-function updateCartCounter() {
-    const cartCounter = document.querySelector('.cart-counter');
-    if (cartCounter) {
-        const totalItems = cart.reduce((sum, item) => sum + item.quantity, 0);
-        cartCounter.textContent = totalItems;
-        cartCounter.style.display = totalItems > 0 ? 'inline' : 'none';
-    }
-}
-
-function removeFromCart(offerId) {
-    cart = cart.filter(item => item.offerId !== offerId);
-    localStorage.setItem('foodsave_cart', JSON.stringify(cart));
-    updateCartCounter();
-    showNotification('Товар удален из корзины', 'info');
-}
-
-function clearCart() {
-    cart = [];
-    localStorage.removeItem('foodsave_cart');
-    updateCartCounter();
-    showNotification('Корзина очищена', 'info');
-}
-
 // Notification system
 function showNotification(message, type = 'info') {
     const notification = document.createElement('div');
@@ -232,9 +158,6 @@ function formatDate(dateString) {
     }).format(new Date(dateString));
 }
 
-// Initialize cart counter on page load
-document.addEventListener('DOMContentLoaded', updateCartCounter);
-
 // AJAX helper function
 function makeRequest(url, options = {}) {
     const defaultOptions = {
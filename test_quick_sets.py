@@ -16,7 +16,7 @@ print(f'Categories: {Category.objects.count()}')
 print(f'Vendors: {Vendor.objects.count()}')
 
 # Проверяем активные предложения
-active_offers = Offer.objects.filter(is_active=True, status='available')
+active_offers = Offer.objects.live()
 print(f'Active offers: {active_offers.count()}')
 
 for offer in active_offers[:3]:
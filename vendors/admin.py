@@ -1,5 +1,7 @@
 from django.contrib import admin
+from django.utils import timezone
 from django.utils.html import format_html
+from catalog.caching import invalidate_tags
 from .models import Vendor, Branch
 
 
@@ -46,12 +48,14 @@ class VendorAdmin(admin.ModelAdmin):
     actions = ['activate_vendors', 'deactivate_vendors']
     
     def activate_vendors(self, request, queryset):
-        updated = queryset.update(is_active=True)
+        updated = queryset.update(is_active=True, updated_at=timezone.now())
+        invalidate_tags('vendor')
         self.message_user(request, f'{updated} vendors were successfully activated.')
     activate_vendors.short_description = "Activate selected vendors"
     
     def deactivate_vendors(self, request, queryset):
-        updated = queryset.update(is_active=False)
+        updated = queryset.update(is_active=False, updated_at=timezone.now())
+        invalidate_tags('vendor')
         self.message_user(request, f'{updated} vendors were successfully deactivated.')
     deactivate_vendors.short_description = "Deactivate selected vendors"
 
@@ -98,10 +102,12 @@ class BranchAdmin(admin.ModelAdmin):
     
     def activate_branches(self, request, queryset):
         updated = queryset.update(is_active=True)
+        invalidate_tags('vendor')
         self.message_user(request, f'{updated} branches were successfully activated.')
     activate_branches.short_description = "Activate selected branches"
     
     def deactivate_branches(self, request, queryset):
         updated = queryset.update(is_active=False)
+        invalidate_tags('vendor')
         self.message_user(request, f'{updated} branches were successfully deactivated.')
     deactivate_branches.short_description = "Deactivate selected branches"
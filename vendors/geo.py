@@ -0,0 +1,125 @@
+"""Grid-based spatial index helpers for branch coordinates.
+
+Branches are bucketed into fixed-size latitude/longitude cells. The cell key is
+stored on ``Branch.geo_cell`` so nearest-neighbour lookups only read the cells
+around a point instead of scanning every branch.
+
+Distances are computed in batches: NumPy is used when it is installed,
+otherwise the same math runs over ``array('d')`` buffers.
+"""
+import math
+from array import array
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional
+    np = None
+
+EARTH_RADIUS_KM = 6371
+
+# Cell size in degrees (~5.5 km of latitude)
+GRID_CELL_DEGREES = 0.05
+
+
+def grid_position(lat, lng):
+    """Return the (row, col) grid position of a point"""
+    return (
+        math.floor(lat / GRID_CELL_DEGREES),
+        math.floor(lng / GRID_CELL_DEGREES),
+    )
+
+
+def cell_key(row, col):
+    return f"{row}:{col}"
+
+
+def grid_cell(lat, lng):
+    """Return the cell key for a point, or '' if coordinates are missing"""
+    if not lat or not lng:
+        return ''
+    return cell_key(*grid_position(lat, lng))
+
+
+def ring_cells(lat, lng, ring):
+    """Return the cell keys lying exactly ``ring`` cells away from a point"""
+    row, col = grid_position(lat, lng)
+    if ring == 0:
+        return [cell_key(row, col)]
+
+    cells = []
+    for d in range(-ring, ring + 1):
+        cells.append(cell_key(row - ring, col + d))
+        cells.append(cell_key(row + ring, col + d))
+    for d in range(-ring + 1, ring):
+        cells.append(cell_key(row + d, col - ring))
+        cells.append(cell_key(row + d, col + ring))
+    return cells
+
+
+def ring_radius_km(lat, ring):
+    """Distance (km) within which every point is covered by rings 0..ring.
+
+    Any point outside those rings is at least ``ring`` cells away in latitude
+    or longitude from the cell containing ``lat``, so it is at least this far.
+    """
+    span = math.radians(ring * GRID_CELL_DEGREES)
+    lat_km = EARTH_RADIUS_KM * span
+    lng_km = EARTH_RADIUS_KM * math.asin(min(1.0, math.cos(math.radians(lat)) * math.sin(min(span, math.pi / 2))))
+    return min(lat_km, lng_km)
+
+
+def bounding_box(lat, lng, radius_km):
+    """Return (min_lat, max_lat, min_lng, max_lng) enclosing a circle"""
+    lat_delta = math.degrees(radius_km / EARTH_RADIUS_KM)
+    cos_lat = math.cos(math.radians(lat))
+    if cos_lat < 1e-6 or abs(lat) + lat_delta >= 90:
+        lng_delta = 180.0
+    else:
+        lng_delta = math.degrees(math.asin(min(1.0, math.sin(radius_km / EARTH_RADIUS_KM) / cos_lat)))
+    return lat - lat_delta, lat + lat_delta, lng - lng_delta, lng + lng_delta
+
+
+def batch_distances(lat, lng, lats, lngs):
+    """Haversine distances (km) from one point to many points in one pass"""
+    if np is not None:
+        lats = np.radians(np.asarray(lats, dtype=np.float64))
+        lngs = np.radians(np.asarray(lngs, dtype=np.float64))
+        lat_rad = math.radians(lat)
+        a = (np.sin((lats - lat_rad) / 2) ** 2
+             + math.cos(lat_rad) * np.cos(lats) * np.sin((lngs - math.radians(lng)) / 2) ** 2)
+        return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+    lat_rad = math.radians(lat)
+    lng_rad = math.radians(lng)
+    cos_lat = math.cos(lat_rad)
+    sin, cos, asin, sqrt, radians = math.sin, math.cos, math.asin, math.sqrt, math.radians
+    distances = array('d')
+    for other_lat, other_lng in zip(lats, lngs):
+        other_lat = radians(other_lat)
+        a = sin((other_lat - lat_rad) / 2) ** 2 + cos_lat * cos(other_lat) * sin((radians(other_lng) - lng_rad) / 2) ** 2
+        distances.append(2 * EARTH_RADIUS_KM * asin(sqrt(min(a, 1.0))))
+    return distances
+
+
+def distances_within(lat, lng, lats, lngs, radius_km):
+    """Return (indexes, distances) of the points within ``radius_km``.
+
+    Points outside the bounding box of the circle are dropped before any
+    trigonometry is done.
+    """
+    min_lat, max_lat, min_lng, max_lng = bounding_box(lat, lng, radius_km)
+    if np is not None:
+        lats = np.asarray(lats, dtype=np.float64)
+        lngs = np.asarray(lngs, dtype=np.float64)
+        indexes = np.flatnonzero((lats >= min_lat) & (lats <= max_lat) & (lngs >= min_lng) & (lngs <= max_lng))
+        distances = batch_distances(lat, lng, lats[indexes], lngs[indexes])
+        keep = distances <= radius_km
+        return indexes[keep].tolist(), distances[keep].tolist()
+
+    indexes = [
+        i for i, (other_lat, other_lng) in enumerate(zip(lats, lngs))
+        if min_lat <= other_lat <= max_lat and min_lng <= other_lng <= max_lng
+    ]
+    distances = batch_distances(lat, lng, [lats[i] for i in indexes], [lngs[i] for i in indexes])
+    pairs = [(i, d) for i, d in zip(indexes, distances) if d <= radius_km]
+    return [i for i, _ in pairs], [d for _, d in pairs]
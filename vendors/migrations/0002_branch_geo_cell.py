@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-18 05:06
+
+from django.db import migrations, models
+
+from vendors.geo import grid_cell
+
+
+def populate_geo_cells(apps, schema_editor):
+    Branch = apps.get_model('vendors', 'Branch')
+    branches = list(Branch.objects.only('id', 'latitude', 'longitude'))
+    for branch in branches:
+        branch.geo_cell = grid_cell(branch.latitude, branch.longitude)
+    Branch.objects.bulk_update(branches, ['geo_cell'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vendors', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='branch',
+            name='geo_cell',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=32),
+        ),
+        migrations.RunPython(populate_geo_cells, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-18 05:34
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vendors', '0002_branch_geo_cell'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='vendor',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['-created_at', '-id'], name='vendors_vendor_active_new_idx'),
+        ),
+    ]
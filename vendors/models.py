@@ -1,5 +1,6 @@
 from django.db import models
 from users.models import User
+from .geo import grid_cell
 
 # Create your models here.
 
@@ -20,6 +21,13 @@ class Vendor(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            # Keyset pages of the vendor list (foodsave.pagination)
+            models.Index(fields=['-created_at', '-id'], condition=models.Q(is_active=True),
+                         name='vendors_vendor_active_new_idx'),
+        ]
+
     def __str__(self):
         return f"{self.name} ({self.get_type_display()})"
 
@@ -32,7 +40,16 @@ class Branch(models.Model):
     phone = models.CharField(max_length=20)
     opening_hours = models.JSONField(default=dict)  # {"monday": "09:00-22:00", ...}
     is_active = models.BooleanField(default=True)
+    geo_cell = models.CharField(max_length=32, blank=True, db_index=True, editable=False)  # see vendors.geo
     created_at = models.DateTimeField(auto_now_add=True)
 
+    def save(self, *args, **kwargs):
+        # Keep the spatial index cell in sync with the coordinates
+        self.geo_cell = grid_cell(self.latitude, self.longitude)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'latitude', 'longitude'} & set(update_fields):
+            kwargs['update_fields'] = {*update_fields, 'geo_cell'}
+        super().save(*args, **kwargs)
+
     def __str__(self):
         return f"{self.vendor.name} - {self.name}"
\ No newline at end of file
@@ -1,3 +1,76 @@
+from datetime import date
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
 from django.test import TestCase
+from django.urls import reverse
+
+from catalog.models import Item, ItemImage, Offer
+from foodsave.nplusone import NPlusOneAssertionsMixin
+from . import geo
+from .models import Branch, Vendor
+
+
+class NPlusOneTests(NPlusOneAssertionsMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = get_user_model().objects.create_user('owner', password='secret')
+        for v in range(3):
+            vendor = Vendor.objects.create(owner=cls.owner, type='store', name=f'Vendor {v}')
+            for b in range(2):
+                branch = Branch.objects.create(vendor=vendor, name=f'Branch {b}', address='Address', phone='1',
+                                               latitude=41.3 + v / 100, longitude=69.2 + b / 100)
+                for i in range(3):
+                    item = Item.objects.create(vendor=vendor, branch=branch, title=f'Item {v}-{b}-{i}')
+                    ItemImage.objects.create(item=item, image='item_images/test.jpg', is_primary=True)
+                    Offer.objects.create(item=item, branch=branch, original_price=Decimal('100.00'),
+                                         quantity=5, start_date=date.today())
+        cls.vendor = Vendor.objects.first()
+        cls.item = Item.objects.filter(vendor=cls.vendor).first()
+
+    def test_vendor_views(self):
+        self.client.force_login(self.owner)
+        urls = [
+            reverse('vendors:vendor_list'),
+            reverse('vendors:vendor_detail', args=[self.vendor.pk]),
+            reverse('vendors:vendor_dashboard'),
+            reverse('vendors:manage_items', args=[self.vendor.pk]),
+            reverse('vendors:add_item', args=[self.vendor.pk]),
+            reverse('vendors:add_offer', args=[self.item.pk]),
+        ]
+        for url in urls:
+            with self.subTest(url=url), self.assertNoNPlusOne():
+                self.assertEqual(self.client.get(url).status_code, 200)
+
+    def test_vendor_detail_revalidates(self):
+        url = reverse('vendors:vendor_detail', args=[self.vendor.pk])
+        etag = self.client.get(url)['ETag']
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        Item.objects.filter(vendor=self.vendor).first().save()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+
+class GeoTests(TestCase):
+    CENTER = (41.311, 69.279)
+
+    def test_distances_within_keeps_points_inside_the_radius(self):
+        lats = [41.311, 41.320, 41.400, 40.000, 41.311]
+        lngs = [69.279, 69.279, 69.279, 69.279, 69.300]
+        indexes, distances = geo.distances_within(*self.CENTER, lats, lngs, radius_km=5)
+        self.assertEqual(indexes, [0, 1, 4])
+        expected = geo.batch_distances(*self.CENTER, [lats[i] for i in indexes], [lngs[i] for i in indexes])
+        for distance, exact in zip(distances, expected):
+            self.assertAlmostEqual(distance, exact)
+        self.assertAlmostEqual(distances[1], 1.0, delta=0.05)  # 0.009 degrees of latitude
 
-# Create your tests here.
+    def test_rings_cover_their_radius(self):
+        lat, lng = self.CENTER
+        for ring in range(4):
+            radius = geo.ring_radius_km(lat, ring)
+            covered = {cell for r in range(ring + 1) for cell in geo.ring_cells(lat, lng, r)}
+            min_lat, max_lat, min_lng, max_lng = geo.bounding_box(lat, lng, radius * 0.99)
+            for corner_lat in (min_lat, max_lat):
+                for corner_lng in (min_lng, max_lng):
+                    self.assertIn(geo.grid_cell(corner_lat, corner_lng), covered)
@@ -5,15 +5,20 @@ from django.contrib.auth.decorators import login_required
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.contrib import messages
 from django.urls import reverse_lazy
+from django.utils.decorators import method_decorator
 from django.http import JsonResponse
+from django.db.models import Count, Prefetch
 from .models import Vendor, Branch
 from .forms import VendorForm, BranchForm, OwnerForm
 from catalog.models import Item, Category, ItemImage, Offer
 from catalog.forms import ItemForm, ItemImageFormSet, OfferForm
+from catalog.caching import active_categories
+from catalog.conditional import conditional, vendor_last_modified
+from foodsave.pagination import CursorPaginationMixin
 from django import forms
 
 
-class VendorListView(ListView):
+class VendorListView(CursorPaginationMixin, ListView):
     model = Vendor
     template_name = 'vendors/vendor_list.html'
     context_object_name = 'vendors'
@@ -23,17 +28,18 @@ class VendorListView(ListView):
         return Vendor.objects.filter(is_active=True).prefetch_related('branches')
 
 
+@method_decorator(conditional(vendor_last_modified, tags=('vendor',)), name='dispatch')
 class VendorDetailView(DetailView):
     model = Vendor
     template_name = 'vendors/vendor_detail.html'
     context_object_name = 'vendor'
     
     def get_queryset(self):
-        return Vendor.objects.filter(is_active=True).prefetch_related('branches', 'items')
+        return Vendor.objects.filter(is_active=True)
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['items'] = self.object.items.filter(is_active=True)[:12]
+        context['items'] = self.object.items.filter(is_active=True).with_card_data(counts=False)[:12]
         context['branches'] = self.object.branches.filter(is_active=True)
         return context
 
@@ -41,7 +47,17 @@ class VendorDetailView(DetailView):
 @login_required
 def vendor_dashboard(request):
     """Vendor dashboard showing their businesses"""
-    user_vendors = Vendor.objects.filter(owner=request.user).prefetch_related('branches', 'items')
+    user_vendors = Vendor.objects.filter(owner=request.user).annotate(
+        items_count=Count('items', distinct=True),
+        branches_count=Count('branches', distinct=True),
+    ).prefetch_related(
+        'branches',
+        Prefetch(
+            'items',
+            queryset=Item.objects.with_card_data(counts=False).order_by('-created_at')[:3],
+            to_attr='recent_items'
+        )
+    )
     return render(request, 'vendors/dashboard.html', {'vendors': user_vendors})
 
 
@@ -135,7 +151,9 @@ def add_offer(request, item_id):
 def manage_items(request, vendor_id):
     """Manage vendor items"""
     vendor = get_object_or_404(Vendor, id=vendor_id, owner=request.user)
-    items = Item.objects.filter(vendor=vendor).select_related('category', 'branch').prefetch_related('images', 'offers')
+    items = Item.objects.filter(vendor=vendor).with_card_data().prefetch_related(
+        Prefetch('offers', queryset=Offer.objects.select_related('branch'))
+    )
     
     # Handle search and filtering
     search_query = request.GET.get('search', '')
@@ -154,8 +172,7 @@ def manage_items(request, vendor_id):
         items = items.filter(is_active=False)
     
     # Get categories for filter dropdown
-    from catalog.models import Category
-    categories = Category.objects.filter(is_active=True)
+    categories = active_categories()
     
     return render(request, 'vendors/manage_items.html', {
         'vendor': vendor,